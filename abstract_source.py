@@ -1,78 +1,62 @@
-# AbstractSource class - creates a unified interface for all data sources
-# LogMeta metaclass - logs all method calls
-# log_method_call decorator - logs method calls and exceptions
-# send_notification function - sends a notification to a Telegram chat
+# AbstractSource class - creates a unified interface for all data sources (streaming batches or a single list)
+# Public methods are timed through InstrumentedMeta, see instrumentation.py
 
 import logging
-from functools import wraps
+import contextvars
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import asyncio
-from telegram import Bot
 from abc import abstractmethod
+from instrumentation import InstrumentedMeta
+import raw_archive
+from columnar import ColumnBatch
+from http_transport import get_session, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from token_cache import token_rejected
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Telegram bot setup
-async def send_notification_async(bot, chat_id, message):
-    try:
-        # Escape the message
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
-    except Exception as e:
-        logger.error(f"Failed to send notification: {str(e)}")
-
-def send_notification(message):
-    bot = Bot(token='')
-    chat_id = ''
-    try:
-        loop = asyncio.get_running_loop()
-        if loop and loop.is_running():
-            # If there's an existing event loop, create a task for the coroutine
-            loop.create_task(send_notification_async(bot, chat_id, message))
-        else:
-            # If there's no running event loop, use asyncio.run
-            asyncio.run(send_notification_async(bot, chat_id, message))
-    except RuntimeError:
-        # If there's no running event loop, use asyncio.run
-        asyncio.run(send_notification_async(bot, chat_id, message))
-        
-# Enable automatic logging of each method invocation
-def log_method_call(class_name, method_name):
+def cached_schema(*config_fields):
     """
-    Decorator for logging method calls and exceptions.
+    Decorator for bq_schema: the schema is built once per connector class and values of config_fields (the
+    fields it depends on, e.g. the report), and returned as the same tuple afterwards, so its row converter
+    (see columnar.row_converter) is compiled once too.
     """
-    
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            logger.info(f"{class_name}: Starting execution of method: {method_name}")
-            try:
-                result = func(*args, **kwargs)
-                logger.info(f"{class_name}: Successful completion of method: {method_name}")
-                return result
-            except Exception as e:
-                logger.error(f"{class_name}: Error in method: {method_name}. Error: {str(e)}")
-                raise
+    def decorator(method):
+        schemas = {}
+
+        @functools.wraps(method)
+        def wrapper(self):
+            key = (type(self), tuple(repr(self.config.get(field)) for field in config_fields))
+            schema = schemas.get(key)
+            if schema is None:
+                schema = schemas.setdefault(key, tuple(method(self)))
+            return schema
         return wrapper
     return decorator
 
-class LogMeta(type):
-    """
-    Metaclass for logging all methods.
-    """
-    
-    def __new__(cls, name, bases, attrs):
-        for key, value in attrs.items():
-            if callable(value) and not key.startswith('__'):
-                attrs[key] = log_method_call(name, key)(value)
-        return super(LogMeta, cls).__new__(cls, name, bases, attrs)
-
-class AbstractSource(metaclass=LogMeta):
+class AbstractSource(metaclass=InstrumentedMeta):
     """
     Abstract class for all data sources, to have universal
     logging and error handling, and to standardize the ETL process.
     """
+
+    # Date range chunking capabilities, see date_chunks and map_date_chunks.
+    # max_days_per_request: longest date range one request can cover (None - the whole range at once)
+    # parallel_chunks: whether the chunks may be fetched concurrently
+    max_days_per_request = None
+    parallel_chunks = False
+
+    # Whether the raw responses can be archived and replayed: all requests go through self.http, see raw_archive.py
+    replayable = True
+
+    # Config fields the connector requires, from its entry in connector_specs.CONNECTORS
+    required_fields = ()
+
+    # ChunkCheckpoint of a checkpointed run, set by the pipeline, see checkpoints.py
+    checkpoint = None
     
     def __init__(self, config):
         self.config = config
@@ -80,19 +64,136 @@ class AbstractSource(metaclass=LogMeta):
         self.config.setdefault('date_to', datetime.strftime(datetime.now() - timedelta(days=1), '%Y-%m-%d'))
         self.config.setdefault('utc_offset_hours', 0)
         self.config.setdefault('dataset_location', 'US')
+        self.config.setdefault('batch_size', 10000)
+        self.config.setdefault('http_pool_size', DEFAULT_POOL_SIZE)
+        self.config.setdefault('http_timeout', DEFAULT_TIMEOUT)
+        self.config.setdefault('chunk_workers', 4)
+        if str(self.config.get('replay', '')).lower() == 'true' and not self.replayable:
+            raise ValueError(f"{self.__class__.__name__} connector doesn't support replay from the raw archive.")
+
+    @property
+    def http(self):
+        """
+        Shared pooled HTTP session, all REST requests of the connectors go through it.
+        """
+        return get_session(pool_size=self.config['http_pool_size'], timeout=self.config['http_timeout'])
+
+    def date_chunks(self):
+        """
+        Splits date_from..date_to into chunks of at most max_days_per_request days,
+        or chunk_days from the config, if that is smaller. Returns a list of (date_from, date_to) strings.
+        """
+        days = self.max_days_per_request
+        if self.config.get('chunk_days'):
+            days = min(int(self.config['chunk_days']), days or int(self.config['chunk_days']))
+        if not days:
+            return [(self.config['date_from'], self.config['date_to'])]
+
+        start = datetime.strptime(self.config['date_from'], '%Y-%m-%d').date()
+        end = datetime.strptime(self.config['date_to'], '%Y-%m-%d').date()
+        chunks = []
+        while start <= end:
+            chunk_end = min(start + timedelta(days=days - 1), end)
+            chunks.append((start.isoformat(), chunk_end.isoformat()))
+            start = chunk_end + timedelta(days=1)
+
+        return chunks
+
+    def map_date_chunks(self, fetch_chunk):
+        """
+        Calls fetch_chunk(date_from, date_to) for every date chunk and yields the batches it returns, in date order.
+        Parallel-safe connectors fetch up to chunk_workers chunks at once; to keep memory bounded,
+        at most twice that many chunks are fetched ahead of the consumer.
+        """
+        chunks = self.date_chunks()
+        workers = int(self.config['chunk_workers']) if self.parallel_chunks else 1
+        if workers <= 1 or len(chunks) == 1:
+            for chunk in chunks:
+                with raw_archive.chunk(*chunk):
+                    yield from fetch_chunk(*chunk)
+            return
+
+        def fetch_chunk_batches(date_from, date_to):
+            with raw_archive.chunk(date_from, date_to):
+                return list(fetch_chunk(date_from, date_to))
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'{self.__class__.__name__}-chunks')
+        pending = deque()
+        try:
+            for chunk in chunks:
+                # Each chunk runs in a copy of the current context, so its spans go to this run's trace
+                pending.append(executor.submit(contextvars.copy_context().run, fetch_chunk_batches, *chunk))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def with_token(self, request):
+        """
+        Returns request(token) with the access token of authenticate(). A token the API rejects (401 or 403) is
+        dropped from the token cache and the request is retried once with a new one, see token_cache.py.
+        """
+        try:
+            return request(self.authenticate())
+        except Exception as e:
+            if not token_rejected(e):
+                raise
+            logger.warning(f"{self.__class__.__name__}: Access token was rejected, retrying with a new one: {str(e)}")
+            return request(self.authenticate(refresh=True))
+
+    def resume_cursor(self, default=None):
+        """
+        Returns the pagination cursor to start from: the cursor after the last loaded page
+        when a checkpointed run is resumed, otherwise default.
+        """
+        if self.checkpoint is None or self.checkpoint.cursor is None:
+            return default
+        return self.checkpoint.cursor
+
+    def save_cursor(self, cursor):
+        """
+        Records the cursor of the next page before the current page is yielded.
+        It's committed once the yielded batch is loaded to BigQuery.
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.stage(cursor)
 
-    @abstractmethod
     def validate_input(self):
-        pass
+        """
+        Checks that the config has the required_fields of the connector.
+        """
+        for field in self.required_fields:
+            if field not in self.config:
+                raise ValueError(f"Missing required field: {field}")
     
     @abstractmethod
     def authenticate(self):
         pass
 
     @abstractmethod
-    def fetch_all_data(self):
+    def fetch_batches(self):
+        """
+        Yields transformed data as lists of rows (pages, days, file chunks), so the
+        whole result doesn't have to be held in memory at once.
+        """
         pass
 
+    def fetch_all_data(self):
+        """
+        Fetches all data as a single list of rows, or a single ColumnBatch when the connector yields ColumnBatches.
+        """
+        batches = list(self.fetch_batches())
+        if batches and all(isinstance(batch, ColumnBatch) for batch in batches):
+            return ColumnBatch.concat(batches)
+
+        data = []
+        for batch in batches:
+            data.extend(batch)
+
+        return data
+
     @abstractmethod
     def fetch_data(self):
         pass
@@ -0,0 +1,293 @@
+# In-memory stand-ins for the BigQuery client and the Storage Write API client, to run BigQueryDestination
+# (all load strategies and load modes) without BigQuery in benchmarks, like the vendor stand-ins of vendor_stubs.py:
+#   client = FakeClient(job_latency=2)
+#   BigQueryDestination(..., client=client, write_client=FakeWriteClient(client))
+# Only the calls BigQueryDestination makes are implemented; queries are limited to the DELETE of delete_append,
+# so skip_unchanged needs hash_store='local' (the BigQuery hash store reads its table with a SELECT). Tables keep their rows as dicts, DATE values as ISO strings;
+# every call is recorded in client.calls as (method, destination).
+# job_latency (seconds) is added to every load and query job, like the scheduling of a real job.
+
+import io
+import itertools
+import json
+import threading
+import time
+from datetime import timedelta
+from google.cloud import bigquery
+from google.cloud.exceptions import NotFound
+from destinations.write_api import EPOCH, EPOCH_UTC, message_class
+
+class FakeJob:
+    def __init__(self, job_id, output_rows=0, latency=0, error=None):
+        self.job_id = job_id
+        self.output_rows = output_rows
+        self.num_dml_affected_rows = output_rows
+        self.ready_at = time.monotonic() + latency
+        self.error = error
+
+    def done(self):
+        return time.monotonic() >= self.ready_at
+
+    def result(self):
+        time.sleep(max(0, self.ready_at - time.monotonic()))
+        if self.error is not None:
+            raise self.error
+        return self
+
+class FakeClient:
+    def __init__(self, job_latency=0):
+        self.job_latency = job_latency
+        self.datasets = {}
+        # table_ref: (bigquery.Table, rows)
+        self.tables = {}
+        self.calls = []
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+
+    def record(self, method, destination):
+        with self.lock:
+            self.calls.append((method, str(destination)))
+
+    @staticmethod
+    def split_ref(ref):
+        table_ref, _, decorator = str(ref).partition('$')
+        day = f'{decorator[:4]}-{decorator[4:6]}-{decorator[6:8]}' if decorator else None
+        return table_ref, day
+
+    def table_entry(self, table_ref):
+        if table_ref not in self.tables:
+            raise NotFound(f'Not found: Table {table_ref}')
+        return self.tables[table_ref]
+
+    @staticmethod
+    def partition_day(table, row):
+        value = row.get(table.time_partitioning.field) if table.time_partitioning else None
+        return None if value is None else str(value)[:10]
+
+    def rows(self, table_ref):
+        """
+        Returns the rows of a table.
+        """
+        return list(self.table_entry(table_ref)[1])
+
+    # Datasets and tables
+
+    def get_dataset(self, dataset_ref):
+        self.record('get_dataset', dataset_ref)
+        if dataset_ref not in self.datasets:
+            raise NotFound(f'Not found: Dataset {dataset_ref}')
+        return self.datasets[dataset_ref]
+
+    def create_dataset(self, dataset):
+        self.record('create_dataset', dataset.dataset_id)
+        dataset_ref = f'{dataset.project}.{dataset.dataset_id}'
+        self.datasets[dataset_ref] = dataset
+        return dataset
+
+    def get_table(self, ref):
+        self.record('get_table', ref)
+        table_ref, day = self.split_ref(ref)
+        table, rows = self.table_entry(table_ref)
+        if day is None:
+            table._properties['numRows'] = str(len(rows))
+            return table
+        partition = bigquery.Table(ref, schema=table.schema)
+        partition._properties['numRows'] = str(sum(1 for row in rows if self.partition_day(table, row) == day))
+        return partition
+
+    def create_table(self, table, exists_ok=False):
+        self.record('create_table', table.reference)
+        table_ref = f'{table.project}.{table.dataset_id}.{table.table_id}'
+        with self.lock:
+            if table_ref in self.tables:
+                if exists_ok:
+                    return self.tables[table_ref][0]
+                raise Exception(f'Already Exists: Table {table_ref}')
+            table._properties['creationTime'] = str(int(time.time() * 1000))
+            self.tables[table_ref] = (table, [])
+        return table
+
+    def update_table(self, table, fields):
+        self.record('update_table', table.reference)
+        table_ref = f'{table.project}.{table.dataset_id}.{table.table_id}'
+        stored, rows = self.table_entry(table_ref)
+        for field in fields:
+            setattr(stored, field, getattr(table, field))
+        return stored
+
+    def delete_table(self, ref, not_found_ok=False):
+        self.record('delete_table', ref)
+        table_ref, day = self.split_ref(ref)
+        with self.lock:
+            if table_ref not in self.tables:
+                if not_found_ok:
+                    return
+                raise NotFound(f'Not found: Table {table_ref}')
+            table, rows = self.tables[table_ref]
+            if day is None:
+                del self.tables[table_ref]
+            else:
+                rows[:] = [row for row in rows if self.partition_day(table, row) != day]
+
+    # Jobs
+
+    def query(self, query, job_config=None):
+        """
+        Runs the DELETE of a date range of delete_append, other queries aren't supported.
+        """
+        self.record('query', query.split('`')[1] if '`' in query else '')
+        statement = ' '.join(query.split())
+        if not statement.startswith('DELETE FROM'):
+            raise NotImplementedError(f'FakeClient runs only DELETE statements: {statement[:80]}')
+        table_ref = statement.split('`')[1]
+        field = statement.split('WHERE ')[1].split()[0]
+        parameters = {parameter.name: str(parameter.value) for parameter in job_config.query_parameters}
+        with self.lock:
+            table, rows = self.table_entry(table_ref)
+            kept = [row for row in rows if not (parameters['date_from'] <= str(row.get(field))[:10] <= parameters['date_to'])]
+            deleted = len(rows) - len(kept)
+            rows[:] = kept
+        return FakeJob(f'query_{next(self.job_ids)}', deleted, self.job_latency)
+
+    def write_rows(self, ref, new_rows, write_disposition):
+        table_ref, day = self.split_ref(ref)
+        with self.lock:
+            table, rows = self.table_entry(table_ref)
+            if day is not None and any(self.partition_day(table, row) != day for row in new_rows):
+                raise ValueError(f'Some rows belong to a different partition than {ref}')
+            if write_disposition == bigquery.WriteDisposition.WRITE_TRUNCATE:
+                rows[:] = [row for row in rows if day is not None and self.partition_day(table, row) != day]
+            rows.extend(new_rows)
+
+    def load_table_from_json(self, json_rows, destination, job_config=None):
+        self.record('load_table_from_json', destination)
+        # Round trip, like the JSON sent to the load job
+        new_rows = [json.loads(json.dumps(row, default=str)) for row in json_rows]
+        return self.load_job(new_rows, destination, job_config)
+
+    def load_table_from_file(self, file_obj, destination, job_config=None):
+        self.record('load_table_from_file', destination)
+        if job_config.source_format == bigquery.SourceFormat.PARQUET:
+            import pyarrow.parquet as pq
+            new_rows = pq.read_table(file_obj).to_pylist()
+        else:
+            import fastavro
+            new_rows = list(fastavro.reader(io.BytesIO(file_obj.read())))
+        return self.load_job([normalized_row(row) for row in new_rows], destination, job_config)
+
+    def load_job(self, new_rows, destination, job_config):
+        job_id = f'load_{next(self.job_ids)}'
+        try:
+            self.write_rows(destination, new_rows, job_config.write_disposition)
+        except Exception as e:
+            return FakeJob(job_id, 0, self.job_latency, error=e)
+        return FakeJob(job_id, len(new_rows), self.job_latency)
+
+def normalized_row(row):
+    # Dates and datetimes read from Parquet/Avro are stored as ISO strings, like JSON-loaded ones
+    return {name: value.isoformat() if hasattr(value, 'isoformat') else value for name, value in row.items()}
+
+class FakeWriteStream:
+    def __init__(self, name, table_ref):
+        self.name = name
+        self.table_ref = table_ref
+        self.rows = []
+        self.finalized = False
+        self.commit_time = None
+
+class FakeWriteClient:
+    """
+    Storage Write API stand-in writing to the tables of a FakeClient: pending streams only.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.streams = {}
+        self.stream_ids = itertools.count(1)
+
+    @staticmethod
+    def table_ref(parent):
+        parts = parent.split('/')
+        return f'{parts[1]}.{parts[3]}.{parts[5]}'
+
+    def create_write_stream(self, parent, write_stream, timeout=None):
+        self.client.record('create_write_stream', self.table_ref(parent))
+        self.client.table_entry(self.table_ref(parent))
+        stream = FakeWriteStream(f'{parent}/streams/fake_{next(self.stream_ids)}', self.table_ref(parent))
+        self.streams[stream.name] = stream
+        return stream
+
+    def append_rows(self, requests, metadata=(), timeout=None):
+        responses = []
+        row_class = stream = None
+        for request in requests:
+            if request.write_stream:
+                stream = self.streams[request.write_stream]
+                self.client.record('append_rows', stream.table_ref)
+                row_class = message_class(request.proto_rows.writer_schema.proto_descriptor)
+            table = self.client.table_entry(stream.table_ref)[0]
+            if request.offset != len(stream.rows):
+                raise Exception(f'Offset {request.offset} is not the end of the stream ({len(stream.rows)})')
+            for serialized in request.proto_rows.rows.serialized_rows:
+                message = row_class()
+                message.ParseFromString(serialized)
+                stream.rows.append(message_row(message, table.schema))
+            responses.append(_AppendRowsResponse())
+        return iter(responses)
+
+    def finalize_write_stream(self, name, timeout=None):
+        self.client.record('finalize_write_stream', self.streams[name].table_ref)
+        self.streams[name].finalized = True
+
+    def get_write_stream(self, name, timeout=None):
+        self.client.record('get_write_stream', self.streams[name].table_ref)
+        return self.streams[name]
+
+    def batch_commit_write_streams(self, request, timeout=None):
+        streams = [self.streams[name] for name in request['write_streams']]
+        self.client.record('batch_commit_write_streams', self.table_ref(request['parent']))
+        if not all(stream.finalized for stream in streams):
+            raise Exception('Streams must be finalized before they are committed')
+        for stream in streams:
+            if stream.commit_time is not None:
+                raise Exception(f'Stream {stream.name} is already committed')
+            self.client.write_rows(stream.table_ref, stream.rows, bigquery.WriteDisposition.WRITE_APPEND)
+            stream.commit_time = time.time()
+        return _BatchCommitResponse()
+
+class _RpcStatus:
+    code = 0
+    message = ''
+
+class _AppendRowsResponse:
+    row_errors = []
+    error = _RpcStatus()
+
+class _BatchCommitResponse:
+    stream_errors = []
+
+def message_row(message, schema):
+    """
+    Returns the row dict of a Write API message, with the values as a JSON load would store them.
+    """
+    row = {}
+    for field in schema:
+        if field.field_type in ('RECORD', 'STRUCT'):
+            value = getattr(message, field.name)
+            if field.mode == 'REPEATED':
+                row[field.name] = [message_row(item, field.fields) for item in value]
+            else:
+                row[field.name] = message_row(value, field.fields) if message.HasField(field.name) else None
+            continue
+        if field.mode == 'REPEATED':
+            row[field.name] = [message_value(item, field) for item in getattr(message, field.name)]
+        else:
+            row[field.name] = message_value(getattr(message, field.name), field) if message.HasField(field.name) else None
+    return row
+
+def message_value(value, field):
+    if field.field_type == 'DATE':
+        return (EPOCH + timedelta(days=value)).isoformat()
+    if field.field_type == 'TIMESTAMP':
+        return (EPOCH_UTC + timedelta(microseconds=value)).isoformat()
+    return value
@@ -0,0 +1,99 @@
+# Runs each connector's fetch_all_data against the local vendor stand-ins (see vendor_stubs.py) and reports
+# requests/sec, wall time and peak RSS. Every connector runs in a fresh interpreter, so peak RSS is per connector.
+# Usage: python benchmarks/fetch_throughput.py [--latency 0.05] [--rows 100] [--pages 5] [--error-rate 0]
+#        [--queue-polls 1] [--poll-sleep 0.5] [--date-from 2024-01-01] [--date-to 2024-01-31] [connector ...]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from vendor_stubs import StubServer, StubSettings
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Benchmark name -> connector config (dates are added from the arguments)
+SCENARIOS = {
+    'google_ads': {'connector': 'google_ads', 'report': 'campaigns', 'client_id': 'stub', 'client_secret': 'stub',
+                   'customer_id': '1234567890', 'developer_token': 'stub', 'login_customer_id': '1234567890',
+                   'refresh_token': 'stub'},
+    'appsflyer': {'connector': 'appsflyer', 'app_id': 'com.example.app', 'api_key': 'stub',
+                  'report_name': 'non_organic_events'},
+    'planfix_leads': {'connector': 'planfix', 'report': 'leads', 'access_token': 'stub'},
+    'planfix_contacts': {'connector': 'planfix', 'report': 'contacts', 'access_token': 'stub'},
+    'esputnik': {'connector': 'esputnik', 'username': 'stub', 'token': 'stub'},
+    'tiktok': {'connector': 'tiktok', 'advertiser_id': '700000', 'access_token': 'stub'},
+    'yandex_direct': {'connector': 'yandex_direct', 'access_token': 'stub', 'client_login': 'stub'},
+    'asa': {'connector': 'asa', 'client_id': 'stub', 'client_secret': 'stub', 'org_id': '123'},
+}
+
+RUN_SNIPPET = """
+import json, resource, sys, time, types
+sys.path.insert(0, {benchmarks_dir!r})
+from vendor_stubs import mount_stubs
+from http_transport import get_session
+from source_factory import Source
+
+config = json.loads({config!r})
+connector = Source.connector(config)
+mount_stubs(get_session(pool_size=config['http_pool_size'], timeout=config['http_timeout']), {stub_url!r},
+            pool_size=int(config['http_pool_size']))
+if config['connector'] == 'yandex_direct':
+    # The connector waits 30 seconds between report polls
+    import sources.yandex_direct as yandex_direct
+    yandex_direct.time = types.SimpleNamespace(sleep=lambda seconds: time.sleep({poll_sleep!r}))
+
+start = time.perf_counter()
+rows = len(connector.fetch_all_data())
+seconds = time.perf_counter() - start
+print(json.dumps({{'rows': rows, 'seconds': seconds, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+def run_scenario(server, name, config, poll_sleep):
+    server.reset_counters()
+    snippet = RUN_SNIPPET.format(benchmarks_dir=BENCHMARKS_DIR, config=json.dumps(config), stub_url=server.url,
+                                 poll_sleep=poll_sleep)
+    process = subprocess.run([sys.executable, '-c', snippet], cwd=REPO_DIR, capture_output=True, text=True)
+    counters = server.counters()
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f'exit code {process.returncode}'
+        return dict(counters, name=name, error=error)
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return dict(counters, name=name, **result)
+
+def main():
+    parser = argparse.ArgumentParser(description='Connector fetch throughput against local vendor stand-ins.')
+    parser.add_argument('connectors', nargs='*', default=list(SCENARIOS), help='benchmarks to run (default: all)')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before each stand-in response')
+    parser.add_argument('--rows', type=int, default=100, help='rows per page')
+    parser.add_argument('--pages', type=int, default=5, help='pages per date range for paginated APIs')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 429/500/503 responses')
+    parser.add_argument('--queue-polls', type=int, default=1, help='Yandex 201/202 answers before the report')
+    parser.add_argument('--poll-sleep', type=float, default=0.5, help='Yandex wait between polls, instead of 30 s')
+    parser.add_argument('--date-from', default='2024-01-01')
+    parser.add_argument('--date-to', default='2024-01-31')
+    parser.add_argument('--chunk-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    settings = StubSettings(latency=args.latency, rows_per_page=args.rows, pages=args.pages,
+                            error_rate=args.error_rate, queue_polls=args.queue_polls)
+    server = StubServer(settings).start()
+
+    print(f"{'benchmark':<18} {'requests':>9} {'errors':>7} {'rows':>9} {'wall, s':>9} {'req/s':>8} {'rows/s':>10} {'peak RSS, MB':>13}")
+    for name in args.connectors:
+        config = dict(SCENARIOS[name], netpeak_client='benchmark', date_from=args.date_from, date_to=args.date_to,
+                      chunk_workers=args.chunk_workers)
+        result = run_scenario(server, name, config, args.poll_sleep)
+        if 'error' in result:
+            print(f"{name:<18} {result['requests']:>9} {result['errors']:>7}  failed: {result['error']}")
+            continue
+        seconds = result['seconds']
+        print(f"{name:<18} {result['requests']:>9} {result['errors']:>7} {result['rows']:>9} {seconds:>9.2f} "
+              f"{result['requests'] / seconds:>8.1f} {result['rows'] / seconds:>10.0f} {result['max_rss_mb']:>13.1f}")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
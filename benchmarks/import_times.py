@@ -0,0 +1,44 @@
+# Measures cold-start import time per connector: "import source_factory" plus loading the requested
+# connector class, each in a fresh interpreter so nothing is cached between measurements.
+# Usage: python benchmarks/import_times.py [runs]
+
+import os
+import subprocess
+import sys
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_SNIPPET = """
+import time
+start = time.perf_counter()
+from source_factory import Source
+factory_time = time.perf_counter() - start
+if hasattr(Source, 'connector_class'):
+    Source.connector_class({connector!r})
+print(factory_time, time.perf_counter() - start)
+"""
+
+def measure(connector, runs):
+    factory_times, total_times = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', MEASURE_SNIPPET.format(connector=connector)],
+                                cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        factory_time, total_time = map(float, output.split())
+        factory_times.append(factory_time)
+        total_times.append(total_time)
+
+    return statistics.median(factory_times), statistics.median(total_times)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    sys.path.insert(0, REPO_DIR)
+    from source_factory import CONNECTORS
+
+    print(f"{'connector':<20} {'factory import, ms':>20} {'with connector, ms':>20}")
+    for connector in CONNECTORS:
+        factory_time, total_time = measure(connector, runs)
+        print(f"{connector:<20} {factory_time * 1000:>20.1f} {total_time * 1000:>20.1f}")
+
+if __name__ == '__main__':
+    main()
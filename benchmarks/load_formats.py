@@ -0,0 +1,72 @@
+# Compares the load formats of BigQueryDestination (see destinations/load_formats.py) on the transform_data output
+# of synthetic payloads: bytes sent to the load job and time to encode them. The JSON payload is built the way
+# load_table_from_json builds it (one json.dumps per row).
+# With --dataset project.dataset, every case is also loaded to a scratch table per format, to time the load jobs;
+# the tables are dropped afterwards. This needs BigQuery credentials.
+# Usage: python benchmarks/load_formats.py [--rows 100000] [--dataset project.dataset] [case ...]
+
+import argparse
+import json
+import os
+import sys
+import time
+from transform_data import CASES, REPO_DIR
+
+sys.path.insert(0, REPO_DIR)
+
+from source_factory import Source
+from columnar import to_rows
+from destinations.load_formats import ENCODERS, FORMATS
+
+DEFAULT_CASES = ['appsflyer', 'esputnik', 'google_ads_campaigns', 'tiktok', 'yandex_direct', 'google_play_reviews']
+
+def transformed_data(name, rows):
+    config, make_batch = CASES[name]
+    connector = Source.connector(dict(config, netpeak_client='benchmark'))
+    if config['connector'] == 'google_ads':
+        return connector, connector.report.transform_data(connector, *make_batch(rows, 0))
+    return connector, connector.transform_data(*make_batch(rows, 0))
+
+def encode(load_format, data, schema):
+    if load_format == 'json':
+        return '\n'.join(json.dumps(row, ensure_ascii=False) for row in to_rows(data)).encode()
+    return ENCODERS[load_format](data, schema)
+
+def load_seconds(dataset, name, load_format, connector, data):
+    from google.cloud import bigquery
+    from destinations.bigquery import BigQueryDestination
+
+    project_id, dataset_id = dataset.split('.')
+    destination = BigQueryDestination(project_id, dataset_id, f'load_formats_{name}_{load_format}', connector.bq_schema(),
+                                      data, 'US', '2024-01-01', '2024-01-31', connector.partition_by, full_refresh=True,
+                                      client=bigquery.Client(project=project_id), load_mode='delete_append',
+                                      load_format=load_format)
+    destination.prepare(delete=False)
+    start = time.perf_counter()
+    destination.load_rows(data)
+    seconds = time.perf_counter() - start
+    destination.drop_table()
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser(description='BigQuery load format comparison on synthetic payloads.')
+    parser.add_argument('cases', nargs='*', default=DEFAULT_CASES, help='cases to run (default: %(default)s)')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dataset', help='project.dataset for scratch tables, to time the load jobs too')
+    args = parser.parse_args()
+
+    print(f"{'case':<22} {'format':<8} {'bytes':>12} {'vs json':>8} {'encode, s':>10} {'load, s':>9}")
+    for name in args.cases:
+        connector, data = transformed_data(name, args.rows)
+        schema = connector.bq_schema()
+        json_bytes = None
+        for load_format in FORMATS:
+            start = time.perf_counter()
+            payload = encode(load_format, data, schema)
+            seconds = time.perf_counter() - start
+            json_bytes = json_bytes or len(payload)
+            load = f'{load_seconds(args.dataset, name, load_format, connector, data):>9.2f}' if args.dataset else f"{'-':>9}"
+            print(f"{name:<22} {load_format:<8} {len(payload):>12} {len(payload) / json_bytes:>8.2f} {seconds:>10.2f} {load}")
+
+if __name__ == '__main__':
+    main()
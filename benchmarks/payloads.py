@@ -0,0 +1,137 @@
+# Synthetic vendor payloads, shaped like the real API responses the connectors parse.
+# Used by the vendor stand-ins (vendor_stubs.py) and the transform_data benchmarks (transform_data.py).
+# Every generator takes the number of rows and the index of the first row, so pages and batches can be built
+# from any offset; the values cycle through realistic cardinalities (20 campaigns, 50 ad groups, ...).
+
+from datetime import date, timedelta
+
+def google_ads_batch(rows, start=0, day='2024-01-01'):
+    """
+    One searchStream batch of the campaigns report.
+    """
+    results = []
+    for i in range(start, start + rows):
+        results.append({
+            'segments': {'date': day},
+            'customer': {'descriptiveName': 'Stub account', 'id': '1234567890'},
+            'campaign': {'advertisingChannelType': 'SEARCH', 'name': f'Campaign {i % 20}', 'id': str(1000 + i % 20)},
+            'adGroup': {'name': f'Ad group {i % 50}', 'id': str(2000 + i % 50)},
+            'adGroupAd': {'ad': {'type': 'RESPONSIVE_SEARCH_AD', 'id': str(100000 + i)}},
+            'metrics': {'impressions': str(100 + i % 900), 'clicks': str(i % 10), 'costMicros': str(i % 1000 * 12345)},
+        })
+    return {'results': results, 'fieldMask': 'segments.date', 'requestId': f'stub-{start}'}
+
+APPSFLYER_COLUMNS = ['Attributed Touch Type', 'Install Time', 'Event Time', 'Event Name', 'Event Value', 'Event Revenue',
+                     'Media Source', 'Campaign', 'Campaign ID', 'Adset', 'Adset ID', 'Ad', 'Ad ID', 'Country Code',
+                     'AppsFlyer ID', 'Platform', 'App Version']
+
+def appsflyer_csv(rows, start=0, day='2024-01-01', header=True):
+    """
+    Raw-data export CSV. A third of the events carry an event_value JSON, like purchase events do.
+    """
+    lines = [','.join(APPSFLYER_COLUMNS)] if header else []
+    for i in range(start, start + rows):
+        event_value = '"{""af_revenue"": 1.5, ""af_level"": 3, ""af_content_id"": ""sku-%d""}"' % (i % 100) if i % 3 == 0 else ''
+        lines.append(f'click,{day} 10:00:00,{day} 12:{i % 60:02d}:00,af_purchase,{event_value},{i % 7}.99,'
+                     f'stub_network,Campaign {i % 20},{1000 + i % 20},Adset {i % 50},{2000 + i % 50},Ad {i % 500},'
+                     f'{300000 + i % 500},US,{1600000000000 + i}-stub,android,1.{i % 10}.0')
+    return '\n'.join(lines) + '\n'
+
+GOOGLE_PLAY_REVIEW_COLUMNS = ['Package Name', 'App Version Code', 'App Version Name', 'Reviewer Language', 'Device',
+                              'Review Submit Date and Time', 'Review Submit Millis Since Epoch',
+                              'Review Last Update Date and Time', 'Review Last Update Millis Since Epoch',
+                              'Star Rating', 'Review Title', 'Review Text', 'Developer Reply Date and Time',
+                              'Developer Reply Millis Since Epoch', 'Developer Reply Text', 'Review Link']
+
+def google_play_reviews_csv(rows, start=0, day='2024-01-01'):
+    """
+    Monthly reviews export CSV, every other review has a developer reply.
+    """
+    lines = [','.join(GOOGLE_PLAY_REVIEW_COLUMNS)]
+    for i in range(start, start + rows):
+        time = f'{day}T{i % 24:02d}:{i % 60:02d}:00Z'
+        millis = 1704067200000 + i * 1000
+        reply = (f'{time},{millis},Thanks for the feedback' if i % 2 else ',-1,')
+        lines.append(f'com.example.app,{100 + i % 30},1.{i % 30}.0,en,device{i % 40},{time},{millis},{time},{millis},'
+                     f'{i % 5 + 1},Title {i % 100},Review text number {i},{reply},'
+                     f'https://play.google.com/review?id={i}')
+    return '\n'.join(lines) + '\n'
+
+def planfix_tasks(rows, start=0):
+    return [{
+        'id': 500000 + i,
+        'name': f'Lead {i}',
+        'description': (f'<table><tr><td>id</td><td>{i}</td></tr><tr><td>ad id</td><td>{300000 + i % 500}</td></tr>'
+                        f'<tr><td>ad name</td><td>Ad {i % 500}</td></tr><tr><td>adset id</td><td>{2000 + i % 50}</td></tr>'
+                        f'<tr><td>adset name</td><td>Adset {i % 50}</td></tr><tr><td>campaign id</td><td>{1000 + i % 20}</td></tr>'
+                        f'<tr><td>campaign name</td><td>Campaign {i % 20}</td></tr><tr><td>platform</td><td>facebook</td></tr></table>'),
+        'dateTime': {'date': '01-02-2024', 'datetime': '2024-02-01T10:15Z'},
+        'counterparty': {'id': f'contact:{700000 + i}', 'name': f'Contact {i}'},
+    } for i in range(start, start + rows)]
+
+def planfix_contacts(rows, start=0):
+    return [{
+        'id': 700000 + i,
+        'group': {'name': '🟢 Qualified' if i % 2 else '🔴 New'},
+        'dateOfLastUpdate': {'date': '01-02-2024'},
+    } for i in range(start, start + rows)]
+
+def esputnik_activity(rows, start=0, day='2024-01-01', offset=''):
+    return [{
+        'activityDateTime': f'{day}T10:{i % 60:02d}:00', 'contactId': str(800000 + i), 'email': f'user{i}@example.com',
+        'mediaType': 'EMAIL', 'activityStatus': 'DELIVERED', 'messageId': str(i % 30),
+        'messageInstanceId': str(900000 + i), 'workflowId': str(i % 5), 'offset': offset,
+    } for i in range(start, start + rows)]
+
+def tiktok_rows(rows, start=0, day='2024-01-01'):
+    return [{
+        'dimensions': {'ad_id': str(900000 + i), 'stat_time_day': f'{day} 00:00:00'},
+        'metrics': {'campaign_name': f'Campaign {i % 20}', 'campaign_id': str(1000 + i % 20),
+                    'adgroup_name': f'Ad group {i % 50}', 'adgroup_id': str(2000 + i % 50), 'ad_name': f'Ad {i}',
+                    'impressions': str(1000 + i % 900), 'clicks': str(i % 40), 'spend': f'{i % 13}.5',
+                    'reach': str(800 + i % 700), 'video_views_p25': '10', 'video_views_p50': '8',
+                    'video_views_p75': '5', 'video_views_p100': '2', 'frequency': '1.2'},
+    } for i in range(start, start + rows)]
+
+def tiktok_report(rows):
+    return {'code': 0, 'message': 'OK', 'data': {
+        'list': rows, 'page_info': {'page': 1, 'page_size': 1000, 'total_number': len(rows), 'total_page': 1}}}
+
+def yandex_tsv(report_name, field_names, days, rows_per_day):
+    """
+    Report TSV: the report name line, the header, the rows and the totals line.
+    """
+    lines = [f'"{report_name}"', '\t'.join(field_names)]
+    for day in days:
+        for i in range(rows_per_day):
+            lines.append(f'{day}\tCampaign {i % 20}\t{1000 + i}\t{i % 30 + 1}\t{i * 1000000}\tAd group {i % 50}\t{400000 + i}\t--')
+    lines.append(f'Total rows: {len(lines) - 2}')
+    return '\n'.join(lines) + '\n'
+
+YANDEX_FIELDS = ['Date', 'CampaignName', 'Impressions', 'Clicks', 'Cost', 'AdGroupName', 'AdId', 'Conversions']
+
+def asa_rows(campaigns, days, start=0):
+    """
+    Campaign report rows: one row per campaign, with one granularity entry per day.
+    """
+    return [{
+        'metadata': {'campaignId': 1000 + i, 'campaignName': f'Campaign {i}'},
+        'granularity': [{
+            'date': day, 'impressions': 1000 + i, 'taps': i % 50, 'installs': i % 20, 'newDownloads': i % 15,
+            'redownloads': i % 5, 'latOnInstalls': 1, 'latOffInstalls': i % 19, 'ttr': 0.05, 'conversionRate': 0.4,
+            'avgCPA': {'amount': '1.5', 'currency': 'USD'}, 'avgCPT': {'amount': '0.6', 'currency': 'USD'},
+            'avgCPM': {'amount': '3.1', 'currency': 'USD'}, 'localSpend': {'amount': '12.3', 'currency': 'USD'},
+        } for day in days],
+    } for i in range(start, start + campaigns)]
+
+YOUTUBE_METRICS = 'comments,dislikes,estimatedMinutesWatched,likes,shares,views'
+
+def youtube_report(rows, start=0):
+    headers = [{'name': 'video', 'columnType': 'DIMENSION', 'dataType': 'STRING'}]
+    headers += [{'name': metric, 'columnType': 'METRIC', 'dataType': 'INTEGER'} for metric in YOUTUBE_METRICS.split(',')]
+    return {'kind': 'youtubeAnalytics#resultTable', 'columnHeaders': headers,
+            'rows': [[f'video{i:08d}', i % 7, i % 3, i * 1.5, i % 50, i % 11, 100 + i] for i in range(start, start + rows)]}
+
+def date_range(date_from, date_to):
+    start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    return [(start + timedelta(days=day)).isoformat() for day in range((end - start).days + 1)]
@@ -0,0 +1,148 @@
+# Times the connectors' transform_data on synthetic payloads (see payloads.py) at 10k, 100k and 1M rows,
+# and records throughput and peak memory. Payloads are generated batch by batch (batch_size rows, like the
+# connectors get them from the APIs), and only the transform_data calls are timed. Every case runs in a
+# fresh interpreter, so peak RSS is per case.
+# Results are written as JSON; pass an earlier result file as --baseline to see the change in throughput.
+# Usage: python benchmarks/transform_data.py [--sizes 10000,100000,1000000] [--batch-size 10000]
+#        [--output results.json] [--baseline old_results.json] [case ...]
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import payloads
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def appsflyer_batch(rows, start):
+    import pandas as pd
+    return (pd.read_csv(io.StringIO(payloads.appsflyer_csv(rows, start))),)
+
+def google_play_batch(rows, start):
+    import pandas as pd
+    return (pd.read_csv(io.StringIO(payloads.google_play_reviews_csv(rows, start))), '2024-01-01', '2024-01-31', 'reviews')
+
+def yandex_batch(rows, start):
+    import pandas as pd
+    tsv = payloads.yandex_tsv('Report', payloads.YANDEX_FIELDS, ['2024-01-01'], rows)
+    return (pd.read_csv(io.StringIO(tsv), header=1, sep='\t'),)
+
+def asa_batch(rows, start):
+    # 10 days per campaign, like a 10-day report
+    days = payloads.date_range('2024-01-01', '2024-01-10')
+    return (payloads.asa_rows(max(1, rows // len(days)), days, start),)
+
+# Case name -> (connector config, batch generator (rows, start) -> transform_data arguments)
+# Google Ads report classes are called through GoogleAds.report, like GoogleAds.fetch_chunk does
+CASES = {
+    'appsflyer': ({'connector': 'appsflyer', 'report_name': 'non_organic_events'}, appsflyer_batch),
+    'google_play_reviews': ({'connector': 'google_play', 'report': 'reviews'}, google_play_batch),
+    'planfix_leads': ({'connector': 'planfix', 'report': 'leads'},
+                      lambda rows, start: (payloads.planfix_tasks(rows, start),)),
+    'google_ads_campaigns': ({'connector': 'google_ads', 'report': 'campaigns'},
+                             lambda rows, start: ([payloads.google_ads_batch(rows, start)],)),
+    'asa': ({'connector': 'asa'}, asa_batch),
+    'esputnik': ({'connector': 'esputnik'}, lambda rows, start: (payloads.esputnik_activity(rows, start),)),
+    'youtube_ads': ({'connector': 'youtube_ads'},
+                    lambda rows, start: (payloads.youtube_report(rows, start), '2024-01-01', payloads.YOUTUBE_METRICS)),
+    'tiktok': ({'connector': 'tiktok', 'advertiser_id': '700000'},
+               lambda rows, start: (payloads.tiktok_report(payloads.tiktok_rows(rows, start)),)),
+    'yandex_direct': ({'connector': 'yandex_direct'}, yandex_batch),
+}
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_case(name, size, batch_size):
+    """
+    Runs one case in this interpreter and returns its result.
+    """
+    sys.path.insert(0, REPO_DIR)
+    from source_factory import Source
+
+    config, make_batch = CASES[name]
+    connector = Source.connector(dict(config, netpeak_client='benchmark'))
+    transform = connector.transform_data
+    if config['connector'] == 'google_ads':
+        transform = lambda *arguments: connector.report.transform_data(connector, *arguments)
+    # Warm up imports and caches, so they are not counted in the first batch
+    transform(*make_batch(min(100, size), 0))
+
+    rss_before = max_rss_mb()
+    seconds = 0.0
+    rows_out = 0
+    for start in range(0, size, batch_size):
+        arguments = make_batch(min(batch_size, size - start), start)
+        begin = time.perf_counter()
+        result = transform(*arguments)
+        seconds += time.perf_counter() - begin
+        rows_out += len(result)
+        del arguments, result
+
+    return {'case': name, 'rows': size, 'rows_out': rows_out, 'batch_size': batch_size, 'seconds': round(seconds, 4),
+            'rows_per_second': round(size / seconds, 1), 'peak_rss_mb': round(max_rss_mb(), 1),
+            'transform_rss_mb': round(max_rss_mb() - rss_before, 1)}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def main():
+    parser = argparse.ArgumentParser(description='transform_data micro-benchmarks on synthetic payloads.')
+    parser.add_argument('cases', nargs='*', default=list(CASES), help='cases to run (default: all)')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated row counts')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per transform_data call')
+    parser.add_argument('--output', help='result file (default: results/transform_data_<commit>.json)')
+    parser.add_argument('--baseline', help='earlier result file to compare throughput with')
+    parser.add_argument('--run-case', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case[0], int(args.run_case[1]), args.batch_size)))
+        return
+
+    commit = git_commit()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r['case'], r['rows']): r for r in json.load(f)['results'] if 'error' not in r}
+
+    results = []
+    print(f"{'case':<22} {'rows':>9} {'seconds':>9} {'rows/s':>11} {'peak RSS, MB':>13} {'transform, MB':>14} {'vs baseline':>12}")
+    for name in args.cases:
+        for size in map(int, args.sizes.split(',')):
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', name, str(size),
+                                      '--batch-size', str(args.batch_size)], capture_output=True, text=True)
+            if process.returncode != 0:
+                error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f'exit code {process.returncode}'
+                results.append({'case': name, 'rows': size, 'error': error})
+                print(f"{name:<22} {size:>9}  failed: {error}")
+                continue
+
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            results.append(result)
+            change = ''
+            if (name, size) in baseline:
+                change = f"{(result['rows_per_second'] / baseline[(name, size)]['rows_per_second'] - 1) * 100:+.1f}%"
+            print(f"{name:<22} {size:>9} {result['seconds']:>9.2f} {result['rows_per_second']:>11.0f} "
+                  f"{result['peak_rss_mb']:>13.1f} {result['transform_rss_mb']:>14.1f} {change:>12}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'transform_data_{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                   'python': platform.python_version(), 'batch_size': args.batch_size, 'results': results}, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main()
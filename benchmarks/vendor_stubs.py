@@ -0,0 +1,216 @@
+# Local stand-ins for the vendor APIs the connectors call, for offline throughput benchmarks.
+# One HTTP server answers the endpoints of all vendors (the host is ignored, only the path is used):
+# Google OAuth + Ads searchStream, AppsFlyer raw-data export, Planfix task/list and contact/list,
+# eSputnik contacts/activity, TikTok report/integrated/get, Yandex Direct reports (with 201/202 queueing),
+# Apple OAuth + Search Ads campaign reports.
+#
+# StubSettings: latency per response, rows per page, number of pages, share of 429/5xx responses, Yandex queue polls
+# Payloads come from the generators in payloads.py
+# StubAdapter: requests transport adapter that sends https://<vendor host>/... to the local server
+
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+import payloads
+
+# Hosts the connectors call, see StubAdapter
+VENDOR_HOSTS = ['oauth2.googleapis.com', 'googleads.googleapis.com', 'hq1.appsflyer.com', 'gremi.planfix.com',
+                'esputnik.com', 'business-api.tiktok.com', 'api.direct.yandex.com', 'appleid.apple.com',
+                'api.searchads.apple.com']
+
+class StubSettings:
+    def __init__(self, latency=0.05, rows_per_page=100, pages=5, error_rate=0.0, queue_polls=1, seed=0):
+        self.latency = latency  # seconds before each response
+        self.rows_per_page = rows_per_page  # rows per page (or per searchStream batch, per day for APIs without paging)
+        self.pages = pages  # pages per date range for paginated APIs, CSV export has rows_per_page * pages rows
+        self.error_rate = error_rate  # share of responses replaced by 429/500/503
+        self.queue_polls = queue_polls  # Yandex reports answer 201/202 this many times before the report
+        self.random = random.Random(seed)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, settings, port=0):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.report_polls = {}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='vendor-stubs', daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.errors = self.bytes_sent = 0
+
+    def counters(self):
+        with self.lock:
+            return {'requests': self.requests, 'errors': self.errors, 'bytes': self.bytes_sent}
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # (method, path regex) -> handler method
+    ROUTES = [
+        ('POST', r'/token$', 'oauth_token'),
+        ('POST', r'/auth/oauth2/token$', 'oauth_token'),
+        ('POST', r'/v\d+/customers/[^/]+/googleAds:searchStream$', 'google_ads_search_stream'),
+        ('GET', r'/api/raw-data/export/app/[^/]+/[^/]+/v5$', 'appsflyer_export'),
+        ('POST', r'/rest/task/list$', 'planfix_tasks'),
+        ('POST', r'/rest/contact/list$', 'planfix_contacts'),
+        ('GET', r'/api/v2/contacts/activity$', 'esputnik_activity'),
+        ('GET', r'/open_api/v1.3/report/integrated/get/$', 'tiktok_report'),
+        ('POST', r'/json/v5/reports$', 'yandex_report'),
+        ('POST', r'/api/v4/reports/campaigns$', 'asa_report'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        settings = self.server.settings
+        url = urlsplit(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length', 0))
+        self.body = self.rfile.read(length) if length else b''
+        with self.server.lock:
+            self.server.requests += 1
+            inject_error = settings.error_rate and settings.random.random() < settings.error_rate
+
+        time.sleep(settings.latency)
+        if inject_error:
+            with self.server.lock:
+                self.server.errors += 1
+            status = settings.random.choice([429, 500, 503])
+            return self.respond(status, {'error': 'injected'}, headers={'Retry-After': '1'})
+
+        for route_method, pattern, handler in self.ROUTES:
+            if route_method == method and re.search(pattern, url.path):
+                return getattr(self, handler)()
+        self.respond(404, {'error': f'No stand-in for {method} {url.path}'})
+
+    def respond(self, status, payload, content_type='application/json', headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    def json_body(self):
+        return json.loads(self.body or b'{}')
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    # Endpoints
+
+    def oauth_token(self):
+        self.respond(200, {'access_token': 'stub-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+    def google_ads_search_stream(self):
+        query = self.json_body().get('query', '')
+        dates = re.findall(r"\d{4}-\d{2}-\d{2}", query)
+        day = dates[0] if dates else date.today().isoformat()
+        rows = self.settings.rows_per_page
+        self.respond(200, [payloads.google_ads_batch(rows, page * rows, day) for page in range(self.settings.pages)])
+
+    def appsflyer_export(self):
+        day = self.query.get('from', date.today().isoformat())
+        csv = payloads.appsflyer_csv(self.settings.rows_per_page * self.settings.pages, day=day)
+        self.respond(200, csv.encode('utf-8'), content_type='text/csv')
+
+    def planfix_page(self):
+        query = self.json_body()
+        offset, page_size = int(query.get('offset', 0)), int(query.get('pageSize', 100))
+        total = self.settings.rows_per_page * self.settings.pages
+        return offset, max(0, min(page_size, total - offset))
+
+    def planfix_tasks(self):
+        offset, rows = self.planfix_page()
+        self.respond(200, {'result': 'success', 'tasks': payloads.planfix_tasks(rows, offset)})
+
+    def planfix_contacts(self):
+        offset, rows = self.planfix_page()
+        self.respond(200, {'result': 'success', 'contacts': payloads.planfix_contacts(rows, offset)})
+
+    def esputnik_activity(self):
+        page = int(self.query.get('offset') or 0)
+        if page >= self.settings.pages:
+            return self.respond(200, [])
+        rows = self.settings.rows_per_page
+        self.respond(200, payloads.esputnik_activity(rows, page * rows, self.query.get('dateFrom', '2024-01-01'), str(page + 1)))
+
+    def tiktok_report(self):
+        rows = []
+        for day in payloads.date_range(self.query['start_date'], self.query['end_date']):
+            rows.extend(payloads.tiktok_rows(self.settings.rows_per_page, day=day))
+        self.respond(200, payloads.tiktok_report(rows))
+
+    def yandex_report(self):
+        params = self.json_body().get('params', {})
+        report_name = params.get('ReportName', '')
+        with self.server.lock:
+            polls = self.server.report_polls.get(report_name, 0)
+            self.server.report_polls[report_name] = polls + 1
+        if polls < self.settings.queue_polls:
+            # 201 - the report is queued, 202 - it is being built
+            return self.respond(201 if polls == 0 else 202, b'', content_type='text/plain', headers={'retryIn': '1'})
+
+        selection = params.get('SelectionCriteria', {})
+        days = payloads.date_range(selection['DateFrom'], selection['DateTo'])
+        tsv = payloads.yandex_tsv(report_name, params.get('FieldNames', payloads.YANDEX_FIELDS), days, self.settings.rows_per_page)
+        self.respond(200, tsv.encode('utf-8'), content_type='text/tab-separated-values')
+
+    def asa_report(self):
+        selector = self.json_body()
+        days = payloads.date_range(selector['startTime'], selector['endTime'])
+        self.respond(200, {'data': {'reportingDataResponse': {'row': payloads.asa_rows(self.settings.rows_per_page, days)}}})
+
+class StubAdapter(HTTPAdapter):
+    """
+    Sends requests for the vendor hosts to the local stand-in server instead, e.g.
+    session.mount('https://api.direct.yandex.com', StubAdapter(server.url)).
+    """
+
+    def __init__(self, stub_url, **kwargs):
+        self.stub_url = urlsplit(stub_url)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit((self.stub_url.scheme, self.stub_url.netloc, url.path, url.query, url.fragment))
+        return super().send(request, **kwargs)
+
+def mount_stubs(session, stub_url, pool_size=10):
+    for host in VENDOR_HOSTS:
+        session.mount(f'https://{host}', StubAdapter(stub_url, pool_maxsize=pool_size))
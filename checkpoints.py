@@ -0,0 +1,146 @@
+# Checkpoints for resumable runs.
+# A checkpointed run loads its date chunks to BigQuery one by one and records every committed chunk, and the
+# pagination cursor of the chunk in progress, in a local SQLite file. A retry of the same job skips the committed
+# chunks and continues a paginated chunk after its last loaded page, so only what is missing is fetched again.
+# With the cursor, the days (partitions) the chunk has loaded are stored: a resumed chunk adds its rows to them,
+# and still replaces the other days of its date range.
+# The checkpoints of a job are dropped when it finishes, so a later run for the same dates loads everything again.
+#
+# The store file is set with the CHECKPOINT_FILE environment variable (default: connector_checkpoints.sqlite in the temp dir).
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+CHECKPOINT_TTL = 24 * 3600  # seconds, older checkpoints are ignored (a retry comes long before that)
+
+# Config fields that identify a job: the same data going to the same table
+JOB_KEY_FIELDS = ('connector', 'report', 'netpeak_client', 'project_id', 'dataset_id', 'table_id', 'date_from', 'date_to')
+
+class CheckpointStore:
+    def __init__(self, file_path, ttl=CHECKPOINT_TTL):
+        self.file_path = file_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = None
+
+    @staticmethod
+    def job_key(config):
+        identity = json.dumps([str(config.get(field, '')) for field in JOB_KEY_FIELDS])
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def connect(self):
+        # Opened on first use, so runs without checkpoints don't create the file
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.file_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    job_key TEXT, date_from TEXT, date_to TEXT, rows INTEGER, committed_at REAL,
+                    PRIMARY KEY (job_key, date_from, date_to));
+                CREATE TABLE IF NOT EXISTS cursors (
+                    job_key TEXT, date_from TEXT, date_to TEXT, cursor TEXT, rows INTEGER, committed_at REAL,
+                    partitions TEXT, PRIMARY KEY (job_key, date_from, date_to));
+                """)
+            try:
+                # Files created before partitions were stored
+                self.connection.execute('ALTER TABLE cursors ADD COLUMN partitions TEXT')
+            except sqlite3.OperationalError:
+                pass
+            expired = time.time() - self.ttl
+            self.connection.execute('DELETE FROM chunks WHERE committed_at < ?', (expired,))
+            self.connection.execute('DELETE FROM cursors WHERE committed_at < ?', (expired,))
+        return self.connection
+
+    def completed_chunks(self, job_key):
+        """
+        Returns {(date_from, date_to): rows} for the chunks of the job that are already loaded.
+        """
+        with self.lock:
+            result = self.connect().execute(
+                'SELECT date_from, date_to, rows FROM chunks WHERE job_key = ? AND committed_at >= ?',
+                (job_key, time.time() - self.ttl))
+            return {(date_from, date_to): rows for date_from, date_to, rows in result}
+
+    def get_cursor(self, job_key, date_from, date_to):
+        """
+        Returns (cursor, rows, partitions) committed for a chunk in progress, or (None, 0, set()).
+        """
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT cursor, rows, partitions FROM cursors WHERE job_key = ? AND date_from = ? AND date_to = ? AND committed_at >= ?',
+                (job_key, date_from, date_to, time.time() - self.ttl)).fetchone()
+        if row is None or row[0] is None:
+            return None, 0, set()
+        # None: committed before partitions were stored, so they aren't known
+        partitions = None if row[2] is None else {date.fromisoformat(day) for day in json.loads(row[2])}
+        return json.loads(row[0]), row[1], partitions
+
+    def commit_cursor(self, job_key, date_from, date_to, cursor, rows, partitions=()):
+        with self.lock:
+            self.connect().execute(
+                'INSERT OR REPLACE INTO cursors (job_key, date_from, date_to, cursor, rows, committed_at, partitions) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_key, date_from, date_to, None if cursor is None else json.dumps(cursor), rows, time.time(),
+                 None if partitions is None else json.dumps(sorted(day.isoformat() for day in partitions))))
+
+    def commit_chunk(self, job_key, date_from, date_to, rows):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('BEGIN')
+                connection.execute('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)',
+                                   (job_key, date_from, date_to, rows, time.time()))
+                connection.execute('DELETE FROM cursors WHERE job_key = ? AND date_from = ? AND date_to = ?',
+                                   (job_key, date_from, date_to))
+
+    def clear(self, job_key):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('BEGIN')
+                connection.execute('DELETE FROM chunks WHERE job_key = ?', (job_key,))
+                connection.execute('DELETE FROM cursors WHERE job_key = ?', (job_key,))
+
+    def chunk(self, job_key, date_from, date_to):
+        return ChunkCheckpoint(self, job_key, date_from, date_to)
+
+class ChunkCheckpoint:
+    """
+    Checkpoint of one date chunk: the last committed cursor, and the cursor staged by the source for the next commit.
+    A chunk without a committed cursor starts from scratch (and its date range is replaced in BigQuery).
+    partitions are the days the chunk has loaded rows to, a resumed chunk keeps their rows.
+    """
+
+    def __init__(self, store, job_key, date_from, date_to):
+        self.store = store
+        self.job_key = job_key
+        self.date_from = date_from
+        self.date_to = date_to
+        self.cursor, self.rows, self.partitions = store.get_cursor(job_key, date_from, date_to)
+        self.staged = self.cursor
+
+    @property
+    def resumed(self):
+        return self.cursor is not None
+
+    def stage(self, cursor):
+        self.staged = cursor
+
+    def commit(self, rows, partitions=()):
+        """
+        Called when a batch is loaded (to the days in partitions): the staged cursor becomes the point to resume from.
+        """
+        self.rows += rows
+        self.cursor = self.staged
+        if self.partitions is not None:
+            self.partitions |= set(partitions)
+        self.store.commit_cursor(self.job_key, self.date_from, self.date_to, self.cursor, self.rows, self.partitions)
+
+    def complete(self):
+        self.store.commit_chunk(self.job_key, self.date_from, self.date_to, self.rows)
+
+checkpoint_store = CheckpointStore(os.environ.get('CHECKPOINT_FILE') or os.path.join(tempfile.gettempdir(), 'connector_checkpoints.sqlite'))
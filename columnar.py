@@ -0,0 +1,339 @@
+# Columnar row batches.
+# A ColumnBatch keeps the rows of a batch as one array per column plus a null mask, typed from the connector's
+# bq_schema(): INTEGER -> int64, FLOAT -> float64, BOOLEAN -> bool, everything else (strings, dates, timestamps,
+# records) stays an array of Python objects. Connectors build batches straight from their DataFrames or row dicts,
+# and BigQueryDestination only turns them into row dicts when a load job is sent, so the rows are not
+# serialized to JSON and parsed back in between.
+#
+# A column whose values don't fit its schema type is kept as it is (as objects), so the load gets the same values
+# as before; columns that are not in the schema are kept too. to_arrow() needs pyarrow, which is optional.
+#
+# Row converters - connectors that build row dicts coerce them with row_converter(bq_schema()): a function compiled
+# once per schema that converts every field of a row to the JSON-style value BigQuery loads for its type, records and
+# repeated fields included, in one pass (NaN -> None). Batches built with from_rows/from_frame get the record columns
+# converted the same way.
+
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+
+INTEGER_TYPES = {'INTEGER', 'INT64'}
+FLOAT_TYPES = {'FLOAT', 'FLOAT64', 'NUMERIC', 'BIGNUMERIC'}
+BOOLEAN_TYPES = {'BOOLEAN', 'BOOL'}
+TEMPORAL_TYPES = {'DATE', 'DATETIME', 'TIMESTAMP'}
+RECORD_TYPES = {'RECORD', 'STRUCT'}
+# Compiled converters of the most recently used schemas
+MAX_CONVERTERS = 64
+
+def typed_column(values, field_type=None):
+    """
+    Returns (array, null mask) for the values of a column (a list or a pandas Series) and its BigQuery type.
+    """
+    import pandas as pd
+
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    mask = series.isna().to_numpy(dtype=bool)
+
+    if field_type in INTEGER_TYPES or field_type in FLOAT_TYPES:
+        numbers = pd.to_numeric(series, errors='coerce')
+        if not (numbers.isna().to_numpy(dtype=bool) & ~mask).any():
+            numbers = numbers.astype('float64').fillna(0).to_numpy()
+            if field_type in FLOAT_TYPES:
+                return numbers, mask
+            if np.all(np.mod(numbers, 1) == 0) and np.all(np.abs(numbers) < 2 ** 53):
+                return numbers.astype('int64'), mask
+    elif field_type in BOOLEAN_TYPES:
+        if series.dtype == bool or all(type(value) is bool for value in series[~mask]):
+            return series.where(~mask, False).to_numpy(dtype=bool), mask
+    elif field_type in TEMPORAL_TYPES and pd.api.types.is_datetime64_any_dtype(series):
+        if field_type == 'DATE':
+            series = series.dt.strftime('%Y-%m-%d')
+        else:
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    elif field_type in TEMPORAL_TYPES:
+        date_format = '%Y-%m-%d' if field_type == 'DATE' else None
+        series = series.map(lambda value: temporal_value(value, date_format))
+
+    array = series.to_numpy(dtype=object, copy=True)
+    array[mask] = None
+    return array, mask
+
+def temporal_value(value, date_format):
+    # date/datetime objects are written the way BigQuery reads them from JSON, strings are left as they are
+    if hasattr(value, 'isoformat') and not isinstance(value, str):
+        return value.strftime(date_format) if date_format else value.isoformat()
+    return value
+
+def is_null(value):
+    if value is None:
+        return True
+    if type(value) in (str, int, dict, list):
+        return False
+    try:
+        # NaN (and NaT) is the only value that is not equal to itself
+        return bool(value != value)
+    except (TypeError, ValueError):
+        # pd.NA can't be compared
+        return True
+
+def to_integer(value):
+    if type(value) is int:
+        return value
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                number = float(value)
+            except ValueError:
+                return value
+            return int(number) if number.is_integer() else value
+    return value
+
+def to_float(value):
+    if type(value) is float:
+        return value
+    if isinstance(value, (int, float, np.number, str)) and not isinstance(value, bool):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+def to_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bool, np.bool_)):
+        return 'true' if value else 'false'
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+def to_boolean(value):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '1', '0'):
+        return value.strip().lower() in ('true', '1')
+    if isinstance(value, (int, np.integer)) and value in (0, 1):
+        return bool(value)
+    return value
+
+def to_date(value):
+    if hasattr(value, 'isoformat') and not isinstance(value, str):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+def to_datetime(value):
+    if hasattr(value, 'isoformat') and not isinstance(value, str):
+        return value.isoformat()
+    return value
+
+def to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat') and not isinstance(value, str):
+        return value.isoformat()
+    return value if isinstance(value, (str, int, float, bool, dict, list)) else str(value)
+
+# A value that doesn't fit its type is returned as it is, for the load to report it
+SCALAR_CONVERTERS = {
+    'INTEGER': to_integer, 'INT64': to_integer,
+    'FLOAT': to_float, 'FLOAT64': to_float,
+    'STRING': to_string,
+    'BOOLEAN': to_boolean, 'BOOL': to_boolean,
+    'DATE': to_date, 'DATETIME': to_datetime, 'TIMESTAMP': to_datetime,
+}
+
+def field_converter(field):
+    """
+    Returns a function that converts a value of the field, see the module comment. A null REPEATED field is empty.
+    """
+    if field.field_type in RECORD_TYPES:
+        convert_record = compile_row_converter(field.fields)
+        scalar = lambda value: convert_record(value) if isinstance(value, dict) else value
+    else:
+        scalar = SCALAR_CONVERTERS.get(field.field_type, to_json_value)
+
+    if field.mode == 'REPEATED':
+        def convert(value):
+            if isinstance(value, (list, tuple, np.ndarray)):
+                return [scalar(item) for item in value if not is_null(item)]
+            return [] if is_null(value) else value
+    else:
+        def convert(value):
+            return None if is_null(value) else scalar(value)
+    return convert
+
+def compile_row_converter(schema):
+    converters = [(field.name, field_converter(field)) for field in schema]
+
+    def convert(row):
+        # Keys that are not in the schema are kept, fields the row doesn't have stay missing
+        row = dict(row)
+        for name, converter in converters:
+            if name in row:
+                row[name] = converter(row[name])
+        return row
+    return convert
+
+_converters = OrderedDict()
+_converters_lock = threading.Lock()
+
+def row_converter(schema):
+    """
+    Returns the converter of row dicts of the schema, compiled on the first call for the schema object.
+    """
+    key = id(schema)
+    with _converters_lock:
+        entry = _converters.get(key)
+        # The entry keeps its schema, so the id isn't reused while it's cached
+        if entry is not None and entry[0] is schema:
+            _converters.move_to_end(key)
+            return entry[1]
+    converter = compile_row_converter(schema)
+    with _converters_lock:
+        _converters[key] = (schema, converter)
+        while len(_converters) > MAX_CONVERTERS:
+            _converters.popitem(last=False)
+    return converter
+
+def convert_rows(rows, schema):
+    """
+    Returns the rows converted to the schema with its compiled row converter.
+    """
+    convert = row_converter(schema)
+    return [convert(row) for row in rows]
+
+def record_values(values, field):
+    convert = field_converter(field)
+    return [convert(value) for value in values]
+
+def field_types(schema):
+    return {field.name: field.field_type for field in schema or []}
+
+def record_fields(schema):
+    # Fields whose values are converted before they're put in a column: records, and repeated fields (lists)
+    return {field.name: field for field in schema or [] if field.field_type in RECORD_TYPES or field.mode == 'REPEATED'}
+
+class ColumnBatch:
+    """
+    Rows of a batch as typed column arrays with null masks, see the module comment.
+    """
+
+    def __init__(self, columns, length):
+        # Column name -> (values array, null mask array)
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows, schema):
+        """
+        Builds a batch from a list of row dicts, a missing key is a null.
+        """
+        types = field_types(schema)
+        keys = {}
+        for row in rows:
+            keys.update(dict.fromkeys(row))
+        # Schema fields first, then the other keys; schema fields none of the rows have are left out
+        names = [name for name in types if name in keys] + [name for name in keys if name not in types]
+        records = record_fields(schema)
+        columns = {}
+        for name in names:
+            values = [row.get(name) for row in rows]
+            if name in records:
+                values = record_values(values, records[name])
+            columns[name] = typed_column(values, types.get(name))
+        return cls(columns, len(rows))
+
+    @classmethod
+    def from_frame(cls, df, schema):
+        """
+        Builds a batch from a DataFrame, schema fields that are not columns of the frame are left out.
+        """
+        types = field_types(schema)
+        records = record_fields(schema)
+        columns = {}
+        for name in df.columns:
+            values = df[name]
+            if str(name) in records:
+                values = record_values(values.tolist(), records[str(name)])
+            columns[str(name)] = typed_column(values, types.get(str(name)))
+        return cls(columns, len(df))
+
+    @classmethod
+    def concat(cls, batches):
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls({}, 0)
+        names = list(dict.fromkeys(name for batch in batches for name in batch.columns))
+        columns = {}
+        for name in names:
+            parts = [batch.columns.get(name) or batch.null_column() for batch in batches]
+            columns[name] = (np.concatenate([values for values, _ in parts]), np.concatenate([mask for _, mask in parts]))
+        return cls(columns, sum(len(batch) for batch in batches))
+
+    def null_column(self):
+        return np.full(self.length, None, dtype=object), np.ones(self.length, dtype=bool)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('ColumnBatch: Only slices are supported, use rows() to read single rows.')
+        start, stop, step = index.indices(self.length)
+        columns = {name: (values[index], mask[index]) for name, (values, mask) in self.columns.items()}
+        return ColumnBatch(columns, len(range(start, stop, step)))
+
+    def take(self, indices):
+        """
+        Returns a batch of the rows at the indices, in their order.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = {name: (values[indices], mask[indices]) for name, (values, mask) in self.columns.items()}
+        return ColumnBatch(columns, len(indices))
+
+    def column(self, name):
+        """
+        Returns the values of a column as a list, nulls are None (all None for a column the batch doesn't have).
+        """
+        if name not in self.columns:
+            return [None] * self.length
+        values, mask = self.columns[name]
+        values = values.tolist()
+        for i in np.flatnonzero(mask).tolist():
+            values[i] = None
+        return values
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def rows(self):
+        """
+        Returns the rows as a list of dicts of Python values (nulls are None), e.g. for a JSON load job.
+        """
+        names = list(self.columns)
+        columns = [self.column(name) for name in names]
+        return [dict(zip(names, row)) for row in zip(*columns)] if names else [{} for _ in range(self.length)]
+
+    def to_arrow(self):
+        """
+        Returns the batch as a pyarrow Table.
+        """
+        # Imported here, pyarrow is only needed for Arrow output
+        import pyarrow as pa
+        return pa.table({name: pa.array(values, mask=mask if mask.any() else None)
+                         for name, (values, mask) in self.columns.items()})
+
+def to_rows(data):
+    """
+    Returns the rows of a ColumnBatch or a list of row dicts as a list of row dicts.
+    """
+    return data.rows() if isinstance(data, ColumnBatch) else data
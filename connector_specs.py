@@ -0,0 +1,49 @@
+# Specs of the connectors, kept apart from source_factory in a module that imports nothing of the project:
+# the factory and the connector modules both import it, so importing a connector on its own (e.g. in a benchmark)
+# doesn't go through source_factory, and there is no import cycle between them.
+
+from collections import namedtuple
+
+ConnectorSpec = namedtuple('ConnectorSpec', ['module', 'class_name', 'required_fields'])
+
+# Connector name -> where the connector class lives and which config fields it requires.
+# Connector classes take their required_fields from here (required_fields_of), see AbstractSource.validate_input.
+CONNECTORS = {
+    'admitad': ConnectorSpec('sources.admitad', 'Admitad',
+        ["netpeak_client", "client_id", "client_secret", "customer_id", "date_from", "date_to"]),
+    'esputnik': ConnectorSpec('sources.esputnik', 'eSputnik',
+        ["netpeak_client", "username", "token", "date_from", "date_to"]),
+    'rtb_house': ConnectorSpec('sources.rtb_house', 'RTBHouse',
+        ["netpeak_client", "login", "password", "date_from", "date_to"]),
+    'asa': ConnectorSpec('sources.asa', 'AppleSearchAds',
+        ["netpeak_client", "client_id", "client_secret", "org_id", "date_from", "date_to"]),
+    'currency': ConnectorSpec('sources.currency_rates', 'CurrencyRates',
+        ["netpeak_client", "date_from", "date_to", "from_currency", "to_currency", "api_key"]),
+    'appsflyer': ConnectorSpec('sources.appsflyer', 'AppsFlyer',
+        ["netpeak_client", "app_id", "api_key", "date_from", "date_to", "report_name"]),
+    'google_play': ConnectorSpec('sources.google_play', 'GooglePlay',
+        ["netpeak_client", "source_project_id", "bucket_id", "date_from", "date_to", "report", "package_name"]),
+    'tiktok': ConnectorSpec('sources.tiktok', 'TikTok',
+        ["netpeak_client", "advertiser_id", "access_token", "date_from", "date_to"]),
+    'pazaruvaj': ConnectorSpec('sources.pazaruvaj', 'Pazaruvaj',
+        ["netpeak_client", "api_key", "date_from", "date_to"]),
+    # Fields required by both Planfix reports (contacts also requires netpeak_client)
+    'planfix': ConnectorSpec('sources.planfix', 'Planfix',
+        ["report", "date_from", "date_to", "access_token"]),
+    'yandex_direct': ConnectorSpec('sources.yandex_direct', 'YandexDirect',
+        ["netpeak_client", "date_from", "date_to", "access_token", "client_login"]),
+    'meta_ads': ConnectorSpec('sources.meta_ads', 'MetaAds',
+        ["netpeak_client", "access_token", "account_id", "app_id", "app_secret", "country", "date_from", "date_to"]),
+    'google_ads': ConnectorSpec('sources.google_ads', 'GoogleAds',
+        ["netpeak_client", "client_id", "client_secret", "customer_id", "developer_token", "login_customer_id", "refresh_token", "report", "date_from", "date_to"]),
+    'youtube_ads': ConnectorSpec('sources.youtube_ads', 'YouTubeAds',
+        ["netpeak_client", "client_id", "client_secret", "channel_id", "refresh_token", "date_from", "date_to"]),
+    'google_analytics_4': ConnectorSpec('sources.google_analytics_4', 'GoogleAnalytics4',
+        ["netpeak_client", "date_from", "date_to", "property_id", "dimensions", "metrics"]),
+}
+
+def required_fields_of(connector_name):
+    """
+    Returns a copy of the required config fields of a connector, which a connector class can extend.
+    """
+    return list(CONNECTORS[connector_name].required_fields)
@@ -0,0 +1,77 @@
+# The "Destination" class creates the destination of a run from the "destination" config field:
+# bigquery (default) or local - date-partitioned files on disk, see destinations/local.py.
+# Destination modules are imported only when they are used.
+# Local destination fields: "local_dir" (or the LOCAL_DESTINATION_DIR environment variable, default: ./data)
+# and "local_format" (parquet, default, or ndjson).
+# "validate_rows" (default true): rows are checked against the schema before they're written, see schema_validation.py,
+# on "validate_sample_rows" rows of each batch (default 10000, 0: all rows).
+
+import os
+
+DESTINATIONS = ('bigquery', 'local')
+
+class Destination:
+    @staticmethod
+    def kind(config):
+        kind = str(config.get('destination') or 'bigquery').lower()
+        if kind not in DESTINATIONS:
+            raise ValueError(f"Unsupported destination: {kind}")
+        return kind
+
+    @staticmethod
+    def create(config, bq_schema, partition_by, date_from, date_to, json_data=None, data_batches=None,
+               full_refresh=False, bq_client=None, streaming=False):
+        """
+        Returns the destination of the config for the rows of a connector: json_data, or data_batches to load
+        in chunks (streaming: fetched from the source during the load). bq_client is a BigQuery client shared
+        with other jobs (BigQuery destination only).
+        """
+        validate_rows = str(config.get("validate_rows", "true")).lower() == "true"
+        if Destination.kind(config) == 'local':
+            from destinations.local import LocalDestination
+            return LocalDestination(
+                directory=config.get("local_dir") or os.environ.get("LOCAL_DESTINATION_DIR") or "data",
+                dataset_id=config.get("dataset_id"),
+                table_id=config["table_id"],
+                bq_schema=bq_schema,
+                json_data=json_data,
+                date_from=date_from,
+                date_to=date_to,
+                partition_by=partition_by,
+                full_refresh=full_refresh,
+                data_batches=data_batches,
+                chunk_size=config.get("chunk_size", 20000),
+                file_format=config.get("local_format", "parquet"),
+                validate_rows=validate_rows,
+                validate_sample_rows=config.get("validate_sample_rows", 10000)
+            )
+
+        from destinations.bigquery import BigQueryDestination
+        return BigQueryDestination(
+            project_id=config["project_id"],
+            dataset_id=config["dataset_id"],
+            table_id=config["table_id"],
+            bq_schema=bq_schema,
+            json_data=json_data,
+            dataset_location=config["dataset_location"],
+            date_from=date_from,
+            date_to=date_to,
+            partition_by=partition_by,
+            full_refresh=full_refresh,
+            client=bq_client,
+            data_batches=data_batches,
+            chunk_size=config.get("chunk_size", 20000),
+            load_mode=config.get("load_mode"),
+            load_format=config.get("load_format"),
+            load_workers=config.get("load_workers", 4),
+            load_retries=config.get("load_retries", 2),
+            skip_unchanged=str(config.get("skip_unchanged", "")).lower() == "true",
+            hash_store=config.get("hash_store"),
+            load_strategy=config.get("load_strategy"),
+            stream_max_rows=config.get("stream_max_rows", 500),
+            batch_min_rows=config.get("batch_min_rows", 500000),
+            batch_rows=config.get("batch_rows", 250000),
+            validate_rows=validate_rows,
+            validate_sample_rows=config.get("validate_sample_rows", 10000),
+            streaming=streaming
+        )
@@ -0,0 +1,163 @@
+# AbstractDestination class - a unified interface for the places rows are loaded to (BigQuery, local files).
+# A run replaces what the destination has for its date range: prepare() creates the table and has the loads replace
+# the partitions of the range, load_rows() writes one batch, finish_load() drops the partitions that got no rows.
+# Destinations are created from the "destination" config field, see destination_factory.py.
+# With validate_rows, every batch is checked against bq_schema before it's written, see schema_validation.py:
+# on validate_sample_rows rows of it (0: all of them), which keeps the check of a large batch of row dicts cheap.
+# Rows at hand (and spilled ones, see validate_batches) are checked before prepare(). Batches fetched during the load
+# (streamed runs, checkpointed chunks) can only be checked as they come, after prepare(): a bad one fails the run
+# with the batches before it loaded. Their partitions are replaced, the days not loaded yet keep their rows (streaming
+# needs partition_overwrite), and a checkpointed chunk is resumed from the bad batch.
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from columnar import ColumnBatch, to_rows
+from instrumentation import span
+from schema_validation import describe, validate_rows
+
+class AbstractDestination(ABC):
+    def __init__(self, table_id, bq_schema, json_data, date_from, date_to, partition_by,
+                 full_refresh=False, data_batches=None, chunk_size=20000, validate_rows=True,
+                 validate_sample_rows=10000):
+        self.table_id = table_id
+        self.bq_schema = bq_schema
+        self.json_data = json_data
+        # Streaming mode: an iterable of row batches, loaded in chunks of chunk_size rows instead of json_data
+        self.data_batches = data_batches
+        self.chunk_size = int(chunk_size)
+        self.date_from = date_from
+        self.date_to = date_to
+        self.partition_by = partition_by
+        self.full_refresh = full_refresh
+        self.validate_rows = validate_rows
+        self.validate_sample_rows = int(validate_sample_rows or 0)
+        # The last batch validate() checked, so a batch checked before the load isn't checked again
+        self.validated = None
+        # Set by validate_batches: data_batches were all checked before the load
+        self.batches_validated = False
+        self.rows_loaded = 0
+        # Rows loaded per day of the date range (None: rows appended outside of it)
+        self.partition_rows = {}
+        # How the rows were loaded and the seconds it took, reported by the pipeline
+        self.strategy = None
+        self.load_seconds = 0
+
+    @abstractmethod
+    def prepare(self, delete=True, loaded_partitions=None):
+        """
+        Creates the table if needed (dropped first on full refresh). With delete, the rows of the date range
+        are replaced by the rows loaded next; delete=False keeps them, e.g. for a resumed checkpointed chunk.
+        loaded_partitions are the days such a chunk has loaded already: only their rows are kept, the other days
+        of the range are still replaced. None (not known) keeps all of them.
+        """
+
+    @abstractmethod
+    def load_rows(self, rows):
+        """
+        Writes a batch of rows, a list of row dicts or a ColumnBatch.
+        """
+
+    def finish_load(self):
+        """
+        Called after the last load_rows of the date range.
+        """
+
+    def validate(self, rows):
+        """
+        Checks rows against bq_schema before they are written: rows the table would reject fail the run here,
+        with the offending columns and sample rows, instead of in a load job.
+        """
+        if not self.validate_rows or rows is None or not len(rows) or rows is self.validated:
+            return
+        with span(f'{self.__class__.__name__}.validate', rows=len(rows)):
+            problems = validate_rows(rows, self.bq_schema, self.validate_sample_rows)
+        if problems:
+            sampled = f' in {self.validate_sample_rows} of its rows' if 0 < self.validate_sample_rows < len(rows) else ''
+            error_message = (f"{self.__class__.__name__}: Rows for {self.table_id} don't match the schema "
+                             f"({len(problems)} problems{sampled}):\n" + describe(problems, rows))
+            logging.error(error_message)
+            raise ValueError(error_message)
+        self.validated = rows
+
+    def validate_batches(self, batches):
+        """
+        Checks all batches of data_batches before prepare(), e.g. the spilled ones, they aren't checked again when loaded.
+        """
+        if not self.validate_rows:
+            return
+        for batch in batches:
+            self.validate(batch)
+        self.batches_validated = True
+
+    def insert_data(self):
+        logging.info(f'{self.__class__.__name__}: Starting to insert new data.')
+        start = time.perf_counter()
+        if self.data_batches is not None:
+            self.insert_data_in_chunks(self.data_batches, self.chunk_size)
+        else:
+            self.validate(self.json_data)
+            self.load_rows(self.json_data)
+        self.finish_load()
+        self.load_seconds = time.perf_counter() - start
+
+    def execute(self):
+        # Rows at hand are checked before the table is touched
+        self.validate(self.json_data)
+        self.prepare()
+        self.insert_data()
+
+    def insert_data_in_chunks(self, batches, chunk_size):
+        """
+        Loads batches in chunks of chunk_size rows, so only one chunk is held in memory (and encoded) at a time.
+        """
+        chunk = []
+        for batch in batches:
+            if not self.batches_validated:
+                self.validate(batch)
+            chunk = self.extend_chunk(chunk, batch)
+            # Full chunks are loaded by index, the rest (less than a chunk) is copied once per batch
+            full = len(chunk) - len(chunk) % chunk_size
+            for start in range(0, full, chunk_size):
+                self.load_rows(chunk[start:start + chunk_size])
+            if full:
+                chunk = chunk[full:]
+        if len(chunk):
+            self.load_rows(chunk)
+        logging.info(f'{self.__class__.__name__}: {self.rows_loaded} rows in total were uploaded to table {self.table_id}')
+
+    @staticmethod
+    def extend_chunk(chunk, batch):
+        # ColumnBatches are joined column by column, a chunk of mixed batches is a list of row dicts
+        if isinstance(batch, ColumnBatch) and (isinstance(chunk, ColumnBatch) or not len(chunk)):
+            return ColumnBatch.concat([chunk, batch]) if len(chunk) else batch
+        chunk = to_rows(chunk)
+        chunk.extend(to_rows(batch))
+        return chunk
+
+    def date_range_days(self):
+        date_from, date_to = date.fromisoformat(self.date_from), date.fromisoformat(self.date_to)
+        return [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+    def split_by_partition(self, rows):
+        """
+        Groups rows by the day of partition_by. Rows outside the date range (or without a valid date) are
+        grouped under None, so they are appended instead of replacing a partition the run doesn't cover.
+        """
+        date_from, date_to = date.fromisoformat(self.date_from), date.fromisoformat(self.date_to)
+        values = rows.column(self.partition_by) if isinstance(rows, ColumnBatch) else [row.get(self.partition_by) for row in rows]
+        days = {}
+        groups = {}
+        for index, value in enumerate(values):
+            if value not in days:
+                try:
+                    day = date.fromisoformat(str(value)[:10])
+                except ValueError:
+                    day = None
+                days[value] = day if day is not None and date_from <= day <= date_to else None
+            groups.setdefault(days[value], []).append(index)
+
+        if isinstance(rows, ColumnBatch):
+            return {day: rows.take(indices) for day, indices in groups.items()}
+        return {day: [rows[i] for i in indices] for day, indices in groups.items()}
@@ -1,47 +1,143 @@
-# Destination schema is different - fail explicitly: CHECKED.
+# Destination schema is different: additive changes (new NULLABLE fields, REQUIRED -> NULLABLE) are applied to the
+# table, any other difference fails explicitly, see schema.py.
+# Load modes:
+# partition_overwrite (default for tables partitioned by day on partition_by) - the rows of each day in the date
+#   range are loaded to its partition (table$YYYYMMDD) with WRITE_TRUNCATE, so every partition is replaced by one
+#   load job, without DML; partitions of the range that got no rows are deleted. Rows of days outside the range are appended.
+# delete_append - DML DELETE of the date range, then WRITE_APPEND loads.
+# Streamed runs (batches fetched from the source while they're loaded) need partition_overwrite: with delete_append
+# a failed fetch would leave the date range deleted, with only the rows of the batches before the failure.
+# Load formats: json (default) sends the rows as newline-delimited JSON, parquet and avro encode them with the table
+# schema first, see load_formats.py.
+# Load strategies, picked by the number of rows when load_strategy is auto (default):
+# stream (up to stream_max_rows) - the Storage Write API, one pending stream committed at once, see write_api.py;
+#   no load job is scheduled, which is most of the time a small load takes. The Write API has no WRITE_TRUNCATE: in
+#   partition_overwrite mode the partitions the rows replace are deleted (a metadata operation, no DML) after the
+#   stream is written and right before it's committed, so they're only empty for the moment of the commit.
+#   Falls back to load jobs (which replace the partitions again) when the rows weren't committed.
+# parallel - load jobs, one per partition, run concurrently; appended rows are split across up to load_workers jobs.
+# batch (from batch_min_rows, and for streamed batches) - load jobs of batch_rows rows at a time, so only one batch
+#   is encoded in memory.
+# With skip_unchanged, partitions whose rows are the same as at their last load are not loaded again, see partition_hashes.py.
 
 from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
+from google.cloud.exceptions import NotFound, PreconditionFailed
+from instrumentation import span
+from columnar import to_rows
+from destinations.abstract_destination import AbstractDestination
+from destinations.load_formats import ENCODERS, FORMATS
+from destinations.schema import merge_schema
+from destinations.metadata_cache import metadata_cache
+from destinations.partition_hashes import PartitionHash, open_hash_store, schema_fingerprint
+from destinations.write_api import commit_streams, stream_committed, writable, write_client, write_pending
+from resource_cache import resource_cache, google_credentials_usable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+import io
 import logging
+import os
+import time
+
+LOAD_MODES = ('partition_overwrite', 'delete_append')
+LOAD_STRATEGIES = ('auto', 'stream', 'parallel', 'batch')
+MIN_SLICE_ROWS = 10000  # rows appended by one load job at least, when they are split across parallel jobs
+POLL_INTERVAL = 0.5  # seconds between the first polls of running load jobs, doubled up to MAX_POLL_INTERVAL
+MAX_POLL_INTERVAL = 5
+
+class PartitionLoad:
+    def __init__(self, day, rows, destination, write_disposition):
+        self.day = day  # None for the rows appended to the table
+        self.rows = rows
+        self.destination = destination
+        self.write_disposition = write_disposition
+        self.attempts = 0
+
+def default_client():
+    """
+    Returns the BigQuery client of the default credentials and project, shared by the runs of a warm instance.
+    """
+    key_parts = [os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', ''), os.environ.get('GOOGLE_CLOUD_PROJECT', '')]
+    return resource_cache.get('bigquery', key_parts, bigquery.Client, health_check=google_credentials_usable)
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-class BigQueryDestination:
+class BigQueryDestination(AbstractDestination):
     def __init__(self, project_id, dataset_id, table_id, bq_schema, json_data, 
-                 dataset_location, date_from, date_to, partition_by, cluster_by=None, full_refresh=False):
+                 dataset_location, date_from, date_to, partition_by, cluster_by=None, full_refresh=False,
+                 data_batches=None, chunk_size=20000, client=None, load_mode=None,
+                 load_format='json', load_workers=4, load_retries=2, skip_unchanged=False, hash_store='bigquery',
+                 load_strategy='auto', stream_max_rows=500, batch_min_rows=500000, batch_rows=250000, write_client=None,
+                 validate_rows=True, validate_sample_rows=10000, streaming=False):
+        super().__init__(table_id, bq_schema, json_data, date_from, date_to, partition_by,
+                         full_refresh=full_refresh, data_batches=data_batches, chunk_size=chunk_size,
+                         validate_rows=validate_rows, validate_sample_rows=validate_sample_rows)
         self.project_id = project_id
         self.dataset_id = dataset_id
-        self.table_id = table_id
-        self.bq_schema = bq_schema
-        self.json_data = json_data
         self.dataset_location = dataset_location
-        self.date_from = date_from
-        self.date_to = date_to
-        self.partition_by = partition_by
         self.cluster_by = cluster_by
-        self.full_refresh = full_refresh
         self.table_ref = f'{self.project_id}.{self.dataset_id}.{self.table_id}'
-        self.client = bigquery.Client()
+        # A client can be shared between destinations, e.g. by the jobs of one batch
+        self.client = client or default_client()
+        self.load_mode = load_mode or ('partition_overwrite' if partition_by else 'delete_append')
+        if self.load_mode not in LOAD_MODES:
+            raise ValueError(f"BigQuery: Unknown load mode '{self.load_mode}', expected one of: {', '.join(LOAD_MODES)}.")
+        # data_batches are fetched from the source while they're loaded, see the load modes above
+        self.streaming = streaming
+        if self.streaming and self.load_mode == 'delete_append':
+            raise ValueError(f"BigQuery: Streaming needs the partition_overwrite load mode (and a partitioned table), "
+                             f"in delete_append mode the date range of {self.table_id} would be deleted before all rows are fetched.")
+        self.load_format = (load_format or 'json').lower()
+        if self.load_format not in FORMATS:
+            raise ValueError(f"BigQuery: Unknown load format '{self.load_format}', expected one of: {', '.join(FORMATS)}.")
+        # Bytes sent to load jobs
+        self.bytes_loaded = 0
+        # Partition loads run concurrently, a failed one is retried on its own, see load_partitions
+        self.load_workers = max(1, int(load_workers))
+        self.load_retries = int(load_retries)
+        # Set by prepare(): loads replace the partitions of the date range
+        self.overwrite_partitions = False
+        # Days of the date range loaded so far, their partitions are already replaced
+        self.loaded_partitions = set()
+        self.load_strategy = (load_strategy or 'auto').lower()
+        if self.load_strategy not in LOAD_STRATEGIES:
+            raise ValueError(f"BigQuery: Unknown load strategy '{self.load_strategy}', expected one of: {', '.join(LOAD_STRATEGIES)}.")
+        self.stream_max_rows = int(stream_max_rows)
+        self.batch_min_rows = int(batch_min_rows)
+        self.batch_rows = int(batch_rows)
+        # Storage Write API client of the stream strategy, by default one with the credentials of client
+        self.write_client = write_client
+        # Load jobs appending rows to the table, parallel strategy only
+        self.append_slices = 1
+        # Content hashes of the partitions (skip_unchanged), None when partitions are always loaded
+        self.hash_store = open_hash_store(hash_store, self.client, f'{project_id}.{dataset_id}') if skip_unchanged else None
+        self.partition_hashes = {}
+        self.stored_hashes = None
+        self.skipped_partitions = set()
+        # Partitions a resumed checkpointed chunk loaded before, see prepare
+        self.resumed_partitions = set()
+        # Set by insert_data when all rows are loaded at once: only then a partition can be skipped,
+        # as no later chunk can add rows to it
+        self.whole_partitions = False
 
     def create_table_if_not_exists(self):
         logging.info('BigQuery: Сhecking and creating table if not exists.')
         dataset_ref = f'{self.project_id}.{self.dataset_id}'
 
         try:
-            self.client.get_dataset(dataset_ref)
+            metadata_cache.get_dataset(self.client, dataset_ref)
         except NotFound:
             try:
                 dataset = bigquery.Dataset(dataset_ref)
                 dataset.location = self.dataset_location
-                self.client.create_dataset(dataset)
+                metadata_cache.put_dataset(self.client, dataset_ref, self.client.create_dataset(dataset))
                 logging.info(f'BigQuery: Dataset created: {dataset_ref}')
             except Exception as e:
                 logging.error(f'BigQuery: Failed to create dataset: {str(e)}')
                 raise
 
         try:
-            self.client.get_table(self.table_ref)
+            metadata_cache.get_table(self.client, self.table_ref)
         except NotFound:
             try:
                 table = bigquery.Table(self.table_ref, schema=self.bq_schema)
@@ -51,7 +147,7 @@ class BigQueryDestination:
                 )
                 if self.cluster_by:
                     table.clustering_fields = [self.cluster_by]
-                self.client.create_table(table)
+                metadata_cache.put_table(self.client, self.table_ref, self.client.create_table(table))
                 logging.info(f'BigQuery: Table created: {self.table_ref}')
             except Exception as e:
                 logging.error(f'BigQuery: Failed to create table: {str(e)}')
@@ -60,35 +156,49 @@ class BigQueryDestination:
             self.validate_table_schema()
 
     def validate_table_schema(self):
+        """
+        Compares the provided schema with the remote table. Additive changes (new NULLABLE or REPEATED fields,
+        REQUIRED fields that became NULLABLE, also in nested records) are applied to the table in place,
+        any other difference fails the run.
+        """
         logging.info('BigQuery: Starting to validate provided table schema vs remote.')
-        remote_fields = {field.name: field for field in self.client.get_table(self.table_ref).schema}
-        local_fields = {field.name: field for field in self.bq_schema}
-        
-        errors = []
-        
-        # Check for fields in local schema that are missing or different in the remote schema
-        for field_name, local_field in local_fields.items():
-            if field_name not in remote_fields:
-                errors.append(f"BigQuery: Field '{field_name}' is missing in remote schema.")
-            else:
-                remote_field = remote_fields[field_name]
-                if local_field.field_type != remote_field.field_type:
-                    errors.append(f"BigQuery: Field '{field_name}' type mismatch: local={local_field.field_type}, remote={remote_field.field_type}")
-                if local_field.mode != remote_field.mode:
-                    errors.append(f"BigQuery: Field '{field_name}' mode mismatch: local={local_field.mode}, remote={remote_field.mode}")
-        
-        # Check for fields in remote schema that are not in the local schema
-        for field_name in remote_fields.keys():
-            if field_name not in local_fields:
-                errors.append(f"Field '{field_name}' is present in remote schema but missing in local schema.")
-        
+        # The table was just read by create_table_if_not_exists, the schema is compared with the cached copy
+        table = metadata_cache.get_table(self.client, self.table_ref)
+        merged_schema, changes, errors = merge_schema(table.schema, self.bq_schema)
+
         if errors:
             error_message = "BigQuery: Schema mismatch found:\n" + "\n".join(errors)
             logging.error(error_message)
+            # The table is read again on the next run, e.g. after it has been fixed
+            metadata_cache.invalidate_table(self.client, self.table_ref)
             raise ValueError(error_message)
+        if changes:
+            self.update_table_schema(table, merged_schema, changes)
         else:
             logging.info("BigQuery: Schemas match.")
 
+    def update_table_schema(self, table, schema, changes):
+        logging.info(f"BigQuery: Updating schema of {self.table_ref}:\n" + "\n".join(changes))
+        try:
+            with span('BigQuery.update_table_schema'):
+                table.schema = schema
+                try:
+                    table = self.client.update_table(table, ['schema'])
+                except PreconditionFailed:
+                    # The table was changed since it was read (e.g. by a parallel job): merge with the current schema
+                    table = self.client.get_table(self.table_ref)
+                    merged_schema, _, errors = merge_schema(table.schema, self.bq_schema)
+                    if errors:
+                        raise ValueError("Schema mismatch found:\n" + "\n".join(errors))
+                    table.schema = merged_schema
+                    table = self.client.update_table(table, ['schema'])
+        except Exception as e:
+            logging.error(f'BigQuery: Failed to update table schema: {str(e)}')
+            metadata_cache.invalidate_table(self.client, self.table_ref)
+            raise
+        metadata_cache.put_table(self.client, self.table_ref, table)
+        logging.info(f'BigQuery: Schema of {self.table_ref} updated.')
+
     def delete_existing_data(self):
         logging.info('BigQuery: Starting to delete existing data for the dates that we got from source connector.')
         query = f"""
@@ -102,39 +212,323 @@ class BigQueryDestination:
             ]
         )
         try:
-            query_job = self.client.query(query, job_config=job_config)
-            query_job.result()  # Wait for job to complete
+            with span('BigQuery.delete_existing_data'):
+                query_job = self.client.query(query, job_config=job_config)
+                query_job.result()  # Wait for job to complete
             # Log the number of rows deleted
             logging.info(f'BigQuery: {query_job.num_dml_affected_rows} rows deleted for dates between {self.date_from} and {self.date_to}')
+            self.forget_partition_hashes(self.date_range_days())
         except Exception as e:
             logging.error(f'BigQuery: Failed to delete existing data: {str(e)}')
             raise
 
+    def choose_strategy(self, rows):
+        if self.load_strategy != 'auto':
+            return self.load_strategy
+        if len(rows) <= self.stream_max_rows and writable(self.bq_schema):
+            return 'stream'
+        return 'batch' if len(rows) >= self.batch_min_rows else 'parallel'
+
     def insert_data(self):
         logging.info('BigQuery: Starting to insert new data.')
+        start = time.perf_counter()
+        if self.data_batches is not None:
+            # The number of rows isn't known before the last batch
+            self.strategy = 'batch'
+            with span('BigQuery.load_batch'):
+                self.insert_data_in_chunks(self.data_batches, self.chunk_size)
+        else:
+            self.validate(self.json_data)
+            self.strategy = self.choose_strategy(self.json_data)
+            with span(f'BigQuery.load_{self.strategy}', rows=len(self.json_data)):
+                if self.strategy == 'batch':
+                    self.insert_data_in_chunks([self.json_data], self.batch_rows)
+                else:
+                    self.whole_partitions = True
+                    if self.strategy == 'stream':
+                        self.stream_rows(self.json_data)
+                    else:
+                        self.append_slices = self.load_workers
+                        self.load_rows(self.json_data)
+        self.finish_load()
+        self.load_seconds = time.perf_counter() - start
+        logging.info(f'BigQuery: {self.rows_loaded} rows loaded to {self.table_id} with the {self.strategy} strategy in {self.load_seconds:.2f} s')
+
+    def finish_load(self):
+        """
+        Called after the last load_rows of the date range: deletes the partitions that got no rows
+        and stores the hashes of the loaded ones.
+        """
+        self.delete_empty_partitions()
+        self.save_partition_hashes()
+        if self.overwrite_partitions and self.partition_rows:
+            counts = ', '.join(f'{day or "appended"}: {rows}' for day, rows in sorted(self.partition_rows.items(), key=lambda item: str(item[0])))
+            logging.info(f'BigQuery: Rows per partition of {self.table_id}: {counts}')
+        if self.skipped_partitions:
+            days = ', '.join(str(day) for day in sorted(self.skipped_partitions))
+            logging.info(f'BigQuery: {len(self.skipped_partitions)} unchanged partitions of {self.table_id} were not loaded: {days}')
+
+    def load_rows(self, rows):
+        """
+        Loads a list of row dicts or a ColumnBatch, a ColumnBatch is turned into rows only here.
+        When partitions are overwritten, the rows are loaded partition by partition, see the load modes above.
+        """
+        self.load_partitions(self.partition_loads(rows))
+
+    def partition_loads(self, rows):
+        """
+        Returns the PartitionLoads of the rows: one per day of the date range when partitions are overwritten
+        (but none for an unchanged partition), and the appended rows split into append_slices loads.
+        """
+        if not self.overwrite_partitions:
+            return [PartitionLoad(None, part, self.table_ref, bigquery.WriteDisposition.WRITE_APPEND) for part in self.slices(rows)]
+
+        loads = []
+        for day, part in self.split_by_partition(rows).items():
+            if day is None:
+                loads.extend(PartitionLoad(None, part, self.table_ref, bigquery.WriteDisposition.WRITE_APPEND) for part in self.slices(part))
+                continue
+            # The first load of a partition replaces it, the next ones (of later chunks) append to it
+            write_disposition = (bigquery.WriteDisposition.WRITE_APPEND if day in self.loaded_partitions
+                                 else bigquery.WriteDisposition.WRITE_TRUNCATE)
+            self.loaded_partitions.add(day)
+            if self.hash_store is not None:
+                partition_hash = self.partition_hashes.setdefault(day, PartitionHash(schema_fingerprint(self.bq_schema)))
+                partition_hash.update(to_rows(part))
+                if self.whole_partitions and self.unchanged(day, partition_hash):
+                    self.skipped_partitions.add(day)
+                    continue
+            loads.append(PartitionLoad(day, part, f'{self.table_ref}${day:%Y%m%d}', write_disposition))
+        return loads
+
+    def slices(self, rows):
+        count = min(self.append_slices, len(rows) // MIN_SLICE_ROWS)
+        if count <= 1:
+            return [rows]
+        size = -(-len(rows) // count)
+        return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+    def stream_rows(self, rows):
+        """
+        Writes the rows with the Storage Write API instead of load jobs. There is no WRITE_TRUNCATE there, so
+        the partitions the rows replace are deleted between the write and the commit of the stream. When the rows
+        weren't committed, they are loaded with load jobs; a failed commit is only retried that way when the stream
+        is known to be uncommitted.
+        """
+        loads = self.partition_loads(rows)
+        if not loads:
+            return
+        replaced = [load.day for load in loads if load.write_disposition == bigquery.WriteDisposition.WRITE_TRUNCATE]
+        stream_rows = [row for load in loads for row in to_rows(load.rows)]
+        stream_name = None
+        try:
+            client = self.write_client or write_client(self.client)
+            with span('BigQuery.write_pending', rows=len(stream_rows)):
+                stream_name = write_pending(client, self.table_ref, stream_rows, self.bq_schema)
+            if replaced:
+                with span('BigQuery.delete_partitions'):
+                    self.delete_partitions(replaced)
+            with span('BigQuery.commit_streams'):
+                commit_streams(client, self.table_ref, [stream_name])
+        except Exception as e:
+            # A commit that failed on the way back may have gone through: the rows would be appended twice
+            if stream_name is not None and stream_committed(client, stream_name):
+                logging.warning(f'BigQuery: Write API commit to {self.table_ref} reported an error, but the rows were committed: {str(e)}')
+            else:
+                logging.warning(f'BigQuery: Write API write to {self.table_ref} failed, loading with load jobs: {str(e)}')
+                self.strategy = 'parallel'
+                self.load_partitions(loads)
+                return
+        self.rows_loaded += len(stream_rows)
+        for load in loads:
+            self.partition_rows[load.day] = self.partition_rows.get(load.day, 0) + len(load.rows)
+        logging.info(f'BigQuery: {len(stream_rows)} rows were written to {self.table_ref} with the Write API')
+
+    def start_load_job(self, rows, destination, write_disposition):
+        """
+        Sends the rows to a new load job and returns (job, bytes sent) without waiting for the job.
+        """
         job_config = bigquery.LoadJobConfig()
-        job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
-        job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+        job_config.write_disposition = write_disposition
         job_config.schema = self.bq_schema
         job_config.autodetect = False
 
-        table_ref = f"{self.project_id}.{self.dataset_id}.{self.table_id}"
+        if self.load_format == 'json':
+            job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+            return self.client.load_table_from_json(to_rows(rows), destination=destination, job_config=job_config), 0
 
+        with span(f'BigQuery.encode_{self.load_format}', rows=len(rows)):
+            payload = ENCODERS[self.load_format](rows, self.bq_schema)
+        if self.load_format == 'parquet':
+            job_config.source_format = bigquery.SourceFormat.PARQUET
+            # Lists are loaded as REPEATED fields, not as records with a "list" field
+            job_config.parquet_options = bigquery.ParquetOptions()
+            job_config.parquet_options.enable_list_inference = True
+        else:
+            job_config.source_format = bigquery.SourceFormat.AVRO
+            job_config.use_avro_logical_types = True
+        return self.client.load_table_from_file(io.BytesIO(payload), destination=destination, job_config=job_config), len(payload)
+
+    def load_partitions(self, loads):
+        """
+        Runs the partition loads concurrently: up to load_workers uploads at a time, and the started jobs are
+        polled together. A failed partition load is retried on its own (up to load_retries times), the other
+        partitions go on; the loads that still fail are raised together when all others are done.
+        """
+        failed = []
+        jobs = {}
+        with ThreadPoolExecutor(max_workers=self.load_workers) as executor, \
+                span('BigQuery.load_rows', rows=sum(len(load.rows) for load in loads)) as load_span:
+
+            def start(load):
+                load.attempts += 1
+                uploads[executor.submit(copy_context().run, self.start_load_job, load.rows, load.destination,
+                                        load.write_disposition)] = load
+
+            def retry_or_fail(load, error):
+                logging.warning(f'BigQuery: Load to {load.destination} failed (attempt {load.attempts}): {str(error)}')
+                if isinstance(error, NotFound):
+                    # The table (or dataset) was dropped since it was cached: it's read again on the next run,
+                    # retrying the load wouldn't find it either
+                    metadata_cache.invalidate_table(self.client, self.table_ref)
+                    metadata_cache.invalidate_dataset(self.client, f'{self.project_id}.{self.dataset_id}')
+                    failed.append((load, error))
+                elif load.attempts <= self.load_retries:
+                    start(load)
+                else:
+                    failed.append((load, error))
+
+            uploads = {}
+            for load in loads:
+                start(load)
+
+            poll_interval = POLL_INTERVAL
+            while uploads or jobs:
+                for future in [future for future in uploads if future.done()]:
+                    load = uploads.pop(future)
+                    try:
+                        job, payload_bytes = future.result()
+                    except Exception as e:
+                        retry_or_fail(load, e)
+                        continue
+                    load_span.add(bytes=payload_bytes)
+                    self.bytes_loaded += payload_bytes
+                    jobs[job] = load
+
+                for job in list(jobs):
+                    try:
+                        done = job.done()
+                    except Exception as e:
+                        # The job state couldn't be read, it is polled again
+                        logging.warning(f'BigQuery: Failed to poll load job {job.job_id}: {str(e)}')
+                        continue
+                    if not done:
+                        continue
+                    try:
+                        job.result()
+                    except Exception as e:
+                        retry_or_fail(jobs.pop(job), e)
+                        continue
+                    load = jobs.pop(job)
+                    self.rows_loaded += job.output_rows
+                    self.partition_rows[load.day] = self.partition_rows.get(load.day, 0) + job.output_rows
+                    logging.info(f'BigQuery: {job.output_rows} rows were uploaded to {load.destination}')
+
+                if uploads:
+                    # Started jobs are polled again when an upload finishes, or after poll_interval
+                    wait(list(uploads), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                elif jobs:
+                    time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
+
+        if failed:
+            metadata_cache.invalidate_table(self.client, self.table_ref)
+            errors = '; '.join(f'{load.destination}: {str(error)}' for load, error in failed)
+            logging.error(f'BigQuery: Failed to insert data to {len(failed)} of {len(loads)} partitions: {errors}')
+            raise Exception(f'BigQuery: Failed to load {len(failed)} of {len(loads)} partitions, the others are loaded: {errors}')
+
+    def delete_partitions(self, days):
         try:
-            load_job = self.client.load_table_from_json(
-                self.json_data,
-                destination=table_ref,
-                job_config=job_config
-            )
-            load_job.result()  # Wait for job to complete
-            # Log the number of rows inserted
-            logging.info(f'BigQuery: {load_job.output_rows} rows were uploaded to table {self.table_id}')
+            with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+                list(executor.map(lambda day: self.client.delete_table(f'{self.table_ref}${day:%Y%m%d}', not_found_ok=True), days))
         except Exception as e:
-            logging.error(f'BigQuery: Failed to insert data: {str(e)}')
+            logging.error(f'BigQuery: Failed to delete partitions: {str(e)}')
             raise
+
+    def get_stored_hashes(self):
+        # Read once per destination, for the whole date range
+        if self.stored_hashes is None:
+            with span('BigQuery.get_partition_hashes'):
+                self.stored_hashes = self.hash_store.get(self.table_ref, self.date_from, self.date_to)
+        return self.stored_hashes
+
+    def table_created(self):
+        # A hash is only valid for the table it was loaded to, not e.g. for the table recreated by full_refresh
+        return str(metadata_cache.get_table(self.client, self.table_ref).created)
+
+    def unchanged(self, day, partition_hash):
+        """
+        Returns True when the rows of the partition have the hash of its last load, and the partition still has
+        the rows of that load (it wasn't changed or deleted since).
+        """
+        stored = self.get_stored_hashes().get(day)
+        if stored is None or stored[0] != partition_hash.hexdigest() or stored[2] != self.table_created():
+            return False
+        try:
+            partition = self.client.get_table(f'{self.table_ref}${day:%Y%m%d}')
+        except NotFound:
+            return False
+        return partition.num_rows == stored[1]
+
+    def save_partition_hashes(self):
+        """
+        Stores the hashes of the partitions loaded by this destination, after all their loads succeeded.
+        """
+        if self.hash_store is None:
+            return
+        entries = {day: (partition_hash.hexdigest(), partition_hash.rows) for day, partition_hash in self.partition_hashes.items()
+                   if day not in self.skipped_partitions and day not in self.resumed_partitions}
+        if not entries:
+            return
+        try:
+            with span('BigQuery.save_partition_hashes'):
+                self.hash_store.put(self.table_ref, entries, self.table_created())
+        except Exception as e:
+            # The partitions are loaded, without their hashes they are only loaded again by the next run
+            logging.warning(f'BigQuery: Failed to store partition hashes of {self.table_ref}: {str(e)}')
+
+    def forget_partition_hashes(self, days):
+        # Partitions deleted or changed by DML don't match their stored hashes any more
+        if self.hash_store is None or not days:
+            return
+        stored = self.get_stored_hashes()
+        days = [day for day in days if day in stored]
+        if days:
+            self.hash_store.forget(self.table_ref, days)
+            for day in days:
+                stored.pop(day, None)
+
+    def delete_empty_partitions(self):
+        """
+        Deletes the partitions of the date range that no rows were loaded to, like the DELETE of delete_append would.
+        """
+        if not self.overwrite_partitions:
+            return
+        empty = [day for day in self.date_range_days() if day not in self.loaded_partitions]
+        with span('BigQuery.delete_empty_partitions'):
+            self.delete_partitions(empty)
+        self.forget_partition_hashes(empty)
+        if empty:
+            logging.info(f'BigQuery: {len(empty)} partitions without new rows were deleted for dates between {self.date_from} and {self.date_to}')
+
+    def day_partitioned(self):
+        partitioning = metadata_cache.get_table(self.client, self.table_ref).time_partitioning
+        return (partitioning is not None and partitioning.type_ == bigquery.TimePartitioningType.DAY
+                and partitioning.field == self.partition_by)
         
     def drop_table(self):
         logging.info(f'BigQuery: Dropping table (as full_refresh tag is True): {self.table_ref}')
+        metadata_cache.invalidate_table(self.client, self.table_ref)
         try:
             self.client.delete_table(self.table_ref)
             logging.info(f'BigQuery: Table dropped: {self.table_ref}')
@@ -144,13 +538,46 @@ class BigQueryDestination:
             logging.error(f'BigQuery: Failed to drop table: {str(e)}')
             raise
 
+    def prepare(self, delete=True, loaded_partitions=None):
+        """
+        Drops the table on full refresh, creates it if needed and deletes the rows of the date range
+        (or, in partition_overwrite mode, has the loads replace its partitions), so rows can be loaded.
+        delete=False keeps the rows, e.g. of a resumed checkpointed chunk. In partition_overwrite mode such a chunk
+        (its range wasn't deleted up front) still replaces the days of the range but loaded_partitions, the days
+        it has loaded before.
+        """
+        if self.full_refresh:
+            with span('BigQuery.drop_table'):
+                self.drop_table()
+        with span('BigQuery.create_table_if_not_exists'):
+            self.create_table_if_not_exists()
+        if not delete and loaded_partitions is None:
+            return
+        if self.load_mode == 'partition_overwrite':
+            if self.day_partitioned():
+                self.overwrite_partitions = True
+                if not delete:
+                    # The rows are added to these partitions, their hashes would only cover the new ones
+                    self.loaded_partitions = set(loaded_partitions)
+                    self.resumed_partitions = set(loaded_partitions)
+                    self.forget_partition_hashes(list(self.resumed_partitions))
+                return
+            if not delete:
+                return
+            if self.streaming:
+                error_message = (f'BigQuery: {self.table_ref} is not partitioned by day on {self.partition_by}, '
+                                 f'streamed rows can only be loaded in partition_overwrite mode.')
+                logging.error(error_message)
+                raise ValueError(error_message)
+            logging.warning(f'BigQuery: {self.table_ref} is not partitioned by day on {self.partition_by}, using delete_append load mode.')
+        self.delete_existing_data()
+
     def execute(self):
         logging.info('BigQuery: Starting upload.')
         try:
-            if self.full_refresh:
-                self.drop_table()
-            self.create_table_if_not_exists()
-            self.delete_existing_data()
+            # Rows at hand are checked before any BigQuery call
+            self.validate(self.json_data)
+            self.prepare()
             self.insert_data()
         except Exception as e:
             logging.error(f'BigQuery: Failed to execute BigQuery upload: {str(e)}')
@@ -0,0 +1,229 @@
+# Encoders for the "load_format" config field of BigQueryDestination: batches are sent to the load job as
+# Snappy-compressed Parquet or Deflate-compressed Avro, typed from the table schema, instead of newline-delimited JSON.
+# Values are converted the way BigQuery converts them from JSON: numbers in strings are parsed for numeric fields,
+# ISO strings for DATE/DATETIME/TIMESTAMP fields (timestamps without a zone are UTC), and a null REPEATED field is empty.
+#
+# pyarrow (Parquet) and fastavro (Avro) are imported only when the format is used.
+
+import base64
+import io
+import json
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+import numpy as np
+from columnar import ColumnBatch
+
+FORMATS = ('json', 'parquet', 'avro')
+
+def to_int(value):
+    # Integral numbers only, like the JSON load: "1.0" is 1, "1.5" or 1.5 is an error rather than 1
+    if type(value) is int:
+        return value
+    if isinstance(value, str):
+        if '.' not in value:
+            return int(value)
+        value = float(value)
+    integer = int(value)
+    if integer != value:
+        raise ValueError(f"{value!r} is not an integer")
+    return integer
+
+def to_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+def to_bool(value):
+    # The values the JSON load reads as booleans, anything else ("yes", 2) is an error rather than False or True
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '1', '0'):
+        return value.strip().lower() in ('true', '1')
+    if isinstance(value, (bool, int, float, np.bool_, np.number)) and value in (0, 1):
+        return bool(value)
+    raise ValueError(f"{value!r} is not a boolean")
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return datetime.fromisoformat(str(value).replace(' UTC', '+00:00'))
+
+def to_timestamp(value):
+    value = to_datetime(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def to_time(value):
+    return value if isinstance(value, time) else time.fromisoformat(str(value))
+
+def to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def to_bytes(value):
+    return value if isinstance(value, bytes) else base64.b64decode(value)
+
+SCALAR_CONVERTERS = {
+    'STRING': to_string, 'JSON': to_string, 'GEOGRAPHY': to_string,
+    'INTEGER': to_int, 'INT64': to_int,
+    'FLOAT': float, 'FLOAT64': float,
+    'NUMERIC': to_decimal, 'BIGNUMERIC': to_decimal,
+    'BOOLEAN': to_bool, 'BOOL': to_bool,
+    'DATE': to_date, 'DATETIME': to_datetime, 'TIMESTAMP': to_timestamp, 'TIME': to_time,
+    'BYTES': to_bytes,
+}
+
+def value_converter(field, scalar_converters=SCALAR_CONVERTERS):
+    """
+    Returns a function that converts a JSON-style value to the Python value of the field (None stays None),
+    with scalar_converters at every level of records.
+    """
+    if field.field_type in ('RECORD', 'STRUCT'):
+        converters = [(subfield.name, value_converter(subfield, scalar_converters)) for subfield in field.fields]
+
+        def convert(value):
+            return {name: converter(value.get(name)) for name, converter in converters}
+    else:
+        scalar = scalar_converters.get(field.field_type, to_string)
+
+        def convert(value):
+            return scalar(value)
+
+    if field.mode == 'REPEATED':
+        return lambda value: [convert(item) for item in value if item is not None] if value is not None else []
+    return lambda value: None if value is None else convert(value)
+
+def schema_batch(data, schema):
+    return data if isinstance(data, ColumnBatch) else ColumnBatch.from_rows(data, schema)
+
+def converted_columns(batch, schema, scalar_converters=SCALAR_CONVERTERS):
+    """
+    Yields (field, values) for the fields of the schema, the values of a numeric column that is already typed
+    stay a numpy array with a null mask.
+    """
+    for field in schema:
+        column = batch.columns.get(field.name)
+        if (column is not None and field.mode != 'REPEATED' and column[0].dtype != object
+                and field.field_type in ('INTEGER', 'INT64', 'FLOAT', 'FLOAT64', 'BOOLEAN', 'BOOL')):
+            yield field, column
+            continue
+        values = batch.column(field.name)
+        if field.mode != 'REPEATED' and scalar_converters.get(field.field_type, to_string) is to_string \
+                and all(value is None or type(value) is str for value in values):
+            # Most columns are strings already
+            yield field, values
+            continue
+        convert = value_converter(field, scalar_converters)
+        try:
+            yield field, [convert(value) for value in values]
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"Load format: Field '{field.name}' has a value that is not a {field.field_type}: {str(e)}") from e
+
+# Parquet
+
+def arrow_type(field):
+    import pyarrow as pa
+
+    if field.field_type in ('RECORD', 'STRUCT'):
+        value_type = pa.struct([arrow_field(subfield) for subfield in field.fields])
+    else:
+        value_type = {
+            'STRING': pa.string(), 'JSON': pa.string(), 'GEOGRAPHY': pa.string(),
+            'INTEGER': pa.int64(), 'INT64': pa.int64(), 'FLOAT': pa.float64(), 'FLOAT64': pa.float64(),
+            'NUMERIC': pa.decimal128(38, 9), 'BIGNUMERIC': pa.decimal256(76, 38),
+            'BOOLEAN': pa.bool_(), 'BOOL': pa.bool_(), 'DATE': pa.date32(), 'DATETIME': pa.timestamp('us'),
+            'TIMESTAMP': pa.timestamp('us', tz='UTC'), 'TIME': pa.time64('us'), 'BYTES': pa.binary(),
+        }.get(field.field_type, pa.string())
+    return pa.list_(value_type) if field.mode == 'REPEATED' else value_type
+
+def arrow_field(field):
+    import pyarrow as pa
+    return pa.field(field.name, arrow_type(field), nullable=field.mode != 'REQUIRED')
+
+def encode_parquet(data, schema):
+    """
+    Returns the rows (a ColumnBatch or a list of row dicts) as Parquet file bytes.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batch = schema_batch(data, schema)
+    arrays = []
+    for field, values in converted_columns(batch, schema):
+        if isinstance(values, tuple):
+            values, mask = values
+            arrays.append(pa.array(values, type=arrow_type(field), mask=mask if mask.any() else None))
+        else:
+            arrays.append(pa.array(values, type=arrow_type(field)))
+    # REQUIRED fields are written as nullable, so a missing value fails the load job like it does for JSON
+    table = pa.Table.from_arrays(arrays, schema=pa.schema([arrow_field(field).with_nullable(True) for field in schema]))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='snappy')
+    return buffer.getvalue()
+
+# Avro
+
+def to_avro_datetime(value):
+    # Avro has no civil datetime type, BigQuery reads DATETIME from a string with the "datetime" logical type
+    return to_datetime(value).isoformat(sep=' ')
+
+AVRO_CONVERTERS = dict(SCALAR_CONVERTERS, DATETIME=to_avro_datetime)
+
+def avro_type(field, path):
+    if field.field_type in ('RECORD', 'STRUCT'):
+        # Avro record names must be unique in the schema
+        value_type = {'type': 'record', 'name': '_'.join(path + [field.name]),
+                      'fields': [{'name': subfield.name, 'type': avro_type(subfield, path + [field.name])}
+                                 for subfield in field.fields]}
+    else:
+        value_type = {
+            'STRING': 'string', 'JSON': 'string', 'GEOGRAPHY': 'string', 'INTEGER': 'long', 'INT64': 'long',
+            'FLOAT': 'double', 'FLOAT64': 'double', 'BOOLEAN': 'boolean', 'BOOL': 'boolean', 'BYTES': 'bytes',
+            'NUMERIC': {'type': 'bytes', 'logicalType': 'decimal', 'precision': 38, 'scale': 9},
+            'BIGNUMERIC': {'type': 'bytes', 'logicalType': 'decimal', 'precision': 76, 'scale': 38},
+            'DATE': {'type': 'int', 'logicalType': 'date'},
+            'DATETIME': {'type': 'string', 'logicalType': 'datetime'},
+            'TIMESTAMP': {'type': 'long', 'logicalType': 'timestamp-micros'},
+            'TIME': {'type': 'long', 'logicalType': 'time-micros'},
+        }.get(field.field_type, 'string')
+    if field.mode == 'REPEATED':
+        return {'type': 'array', 'items': value_type}
+    return ['null', value_type]
+
+def encode_avro(data, schema):
+    """
+    Returns the rows (a ColumnBatch or a list of row dicts) as Avro file bytes.
+    """
+    import fastavro
+
+    batch = schema_batch(data, schema)
+    avro_schema = fastavro.parse_schema({'type': 'record', 'name': 'Row',
+                                         'fields': [{'name': field.name, 'type': avro_type(field, ['Row'])} for field in schema]})
+    names = []
+    columns = []
+    for field, values in converted_columns(batch, schema, AVRO_CONVERTERS):
+        if isinstance(values, tuple):
+            values, mask = values
+            values = values.tolist()
+            for i, null in enumerate(mask.tolist()):
+                if null:
+                    values[i] = None
+        names.append(field.name)
+        columns.append(values)
+
+    buffer = io.BytesIO()
+    fastavro.writer(buffer, avro_schema, (dict(zip(names, row)) for row in zip(*columns)), codec='deflate')
+    return buffer.getvalue()
+
+ENCODERS = {'parquet': encode_parquet, 'avro': encode_avro}
@@ -0,0 +1,140 @@
+# Local destination: date-partitioned Parquet or NDJSON files on disk instead of a BigQuery table, to run and benchmark
+# whole pipelines offline (e.g. with "replay" from the raw archive) and to land large backfills before a bulk upload.
+# Layout:
+#   {directory}/{dataset_id}/{table_id}/_schema.json                     - the table schema, BigQuery JSON schema format
+#   {directory}/{dataset_id}/{table_id}/{partition_by}=YYYY-MM-DD/part-{run}-{n}.parquet (or .ndjson)
+# Every file has all columns of the schema, so the files of a day can be loaded to the table as they are.
+# Like the partition_overwrite load mode, the first write of a run to a day of the date range replaces the files of the
+# day, and the days of the range that got no rows are removed; rows outside the range are added to their day.
+# Rows without a valid date go to {partition_by}=__NULL__.
+
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import date, datetime
+from columnar import to_rows
+from destinations.abstract_destination import AbstractDestination
+from destinations.load_formats import encode_parquet
+from destinations.schema import merge_schema, schema_from_api_repr
+
+FILE_FORMATS = {'parquet': 'parquet', 'ndjson': 'ndjson'}
+NULL_PARTITION = '__NULL__'
+SCHEMA_FILE = '_schema.json'
+
+class LocalDestination(AbstractDestination):
+    def __init__(self, directory, dataset_id, table_id, bq_schema, json_data, date_from, date_to, partition_by,
+                 full_refresh=False, data_batches=None, chunk_size=20000, file_format='parquet', validate_rows=True,
+                 validate_sample_rows=10000):
+        super().__init__(table_id, bq_schema, json_data, date_from, date_to, partition_by,
+                         full_refresh=full_refresh, data_batches=data_batches, chunk_size=chunk_size,
+                         validate_rows=validate_rows, validate_sample_rows=validate_sample_rows)
+        self.table_dir = os.path.join(directory, dataset_id or '', table_id)
+        self.file_format = (file_format or 'parquet').lower()
+        if self.file_format not in FILE_FORMATS:
+            raise ValueError(f"Local: Unknown file format '{self.file_format}', expected one of: {', '.join(FILE_FORMATS)}.")
+        self.strategy = f'local_{self.file_format}'
+        # Files of a run get its id, so runs adding rows to the same day don't overwrite each other's files
+        self.run_id = f'{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.files_written = 0
+        # Set by prepare(): loads replace the partitions of the date range
+        self.replace_partitions = False
+        self.loaded_partitions = set()
+
+    def partition_dir(self, day):
+        if not self.partition_by:
+            return self.table_dir
+        return os.path.join(self.table_dir, f'{self.partition_by}={day if day is not None else NULL_PARTITION}')
+
+    def prepare(self, delete=True, loaded_partitions=None):
+        if self.full_refresh and os.path.isdir(self.table_dir):
+            logging.info(f'Local: Removing table (as full_refresh tag is True): {self.table_dir}')
+            shutil.rmtree(self.table_dir)
+        os.makedirs(self.table_dir, exist_ok=True)
+        self.write_schema()
+        self.replace_partitions = (delete or loaded_partitions is not None) and bool(self.partition_by)
+        if not delete and loaded_partitions is not None:
+            self.loaded_partitions = set(loaded_partitions)
+
+    def write_schema(self):
+        """
+        Writes the schema of the table, an existing one gets the additive changes BigQuery would accept.
+        """
+        schema_path = os.path.join(self.table_dir, SCHEMA_FILE)
+        schema = self.bq_schema
+        if os.path.exists(schema_path) and schema:
+            with open(schema_path) as f:
+                existing = schema_from_api_repr(json.load(f), like=schema)
+            schema, changes, errors = merge_schema(existing, self.bq_schema)
+            if errors:
+                error_message = "Local: Schema mismatch found:\n" + "\n".join(errors)
+                logging.error(error_message)
+                raise ValueError(error_message)
+            if not changes:
+                return
+            logging.info(f"Local: Updating schema of {self.table_dir}:\n" + "\n".join(changes))
+        self.write_file(schema_path, json.dumps([field.to_api_repr() for field in schema], indent=2).encode('utf-8'))
+
+    @staticmethod
+    def write_file(path, payload):
+        # Written next to the target and renamed, so a reader never sees a partial file
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+
+    def encode(self, rows):
+        if self.file_format == 'parquet':
+            return encode_parquet(rows, self.bq_schema)
+        return ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in to_rows(rows)).encode('utf-8')
+
+    def write_part(self, day, rows):
+        directory = self.partition_dir(day)
+        os.makedirs(directory, exist_ok=True)
+        self.files_written += 1
+        self.write_file(os.path.join(directory, f'part-{self.run_id}-{self.files_written:05d}.{FILE_FORMATS[self.file_format]}'),
+                        self.encode(rows))
+        self.rows_loaded += len(rows)
+
+    def load_rows(self, rows):
+        if not len(rows):
+            return
+        if not self.partition_by:
+            self.write_part(None, rows)
+            return
+        for day, part in self.split_by_partition(rows).items():
+            if day is None:
+                # Rows outside the date range are added to their own day
+                for row_day, row_part in self.split_by_day(part).items():
+                    self.write_part(row_day, row_part)
+                self.partition_rows[None] = self.partition_rows.get(None, 0) + len(part)
+                continue
+            if self.replace_partitions and day not in self.loaded_partitions:
+                shutil.rmtree(self.partition_dir(day), ignore_errors=True)
+            self.loaded_partitions.add(day)
+            self.write_part(day, part)
+            self.partition_rows[day] = self.partition_rows.get(day, 0) + len(part)
+
+    def split_by_day(self, rows):
+        values = [row.get(self.partition_by) for row in rows] if isinstance(rows, list) else rows.column(self.partition_by)
+        groups = {}
+        for index, value in enumerate(values):
+            try:
+                day = date.fromisoformat(str(value)[:10])
+            except ValueError:
+                day = None
+            groups.setdefault(day, []).append(index)
+        if isinstance(rows, list):
+            return {day: [rows[i] for i in indices] for day, indices in groups.items()}
+        return {day: rows.take(indices) for day, indices in groups.items()}
+
+    def finish_load(self):
+        if self.replace_partitions:
+            empty = [day for day in self.date_range_days() if day not in self.loaded_partitions]
+            for day in empty:
+                shutil.rmtree(self.partition_dir(day), ignore_errors=True)
+        if self.partition_rows:
+            counts = ', '.join(f'{day or "outside the date range"}: {rows}' for day, rows in sorted(self.partition_rows.items(), key=lambda item: str(item[0])))
+            logging.info(f'Local: Rows per partition of {self.table_id}: {counts}')
+        logging.info(f'Local: {self.rows_loaded} rows were written to {self.table_dir} in {self.files_written} files')
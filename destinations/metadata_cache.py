@@ -0,0 +1,81 @@
+# BigQuery metadata cache.
+# Datasets known to exist and tables (schema, partitioning) are kept in process memory for a short TTL, so the jobs
+# of a batch, and later invocations of a warm instance, don't get the same metadata before every load.
+# Entries are kept per client identity (project and credentials), so clients of different projects or service
+# accounts never share them. BigQueryDestination updates the cache when it creates a dataset or table and drops the
+# table from it when the table is dropped (full_refresh) or a load fails, and the dataset too when a load job
+# reports the table is gone (e.g. dropped by another process), so a changed table is read again.
+#
+# The TTL is set with the BQ_METADATA_TTL environment variable (seconds, default 300, 0 disables the cache).
+
+import os
+import threading
+import time
+
+DEFAULT_TTL = 300  # seconds
+
+class MetadataCache:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = float(ttl)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            return entry[1]
+
+    def put(self, key, value):
+        if self.ttl > 0:
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_dataset(self, client, dataset_ref):
+        """
+        Returns the dataset, from the cache or client.get_dataset (which raises NotFound for a missing dataset).
+        """
+        key = ('dataset', client_identity(client), dataset_ref)
+        return self.get(key) or self.put(key, client.get_dataset(dataset_ref))
+
+    def put_dataset(self, client, dataset_ref, dataset):
+        return self.put(('dataset', client_identity(client), dataset_ref), dataset)
+
+    def invalidate_dataset(self, client, dataset_ref):
+        self.invalidate(('dataset', client_identity(client), dataset_ref))
+
+    def get_table(self, client, table_ref):
+        """
+        Returns the table, from the cache or client.get_table (which raises NotFound for a missing table).
+        """
+        key = ('table', client_identity(client), table_ref)
+        return self.get(key) or self.put(key, client.get_table(table_ref))
+
+    def put_table(self, client, table_ref, table):
+        return self.put(('table', client_identity(client), table_ref), table)
+
+    def invalidate_table(self, client, table_ref):
+        self.invalidate(('table', client_identity(client), table_ref))
+
+def client_identity(client):
+    # The project and the account of the credentials; a client without credentials (e.g. a stand-in) is its own identity
+    credentials = getattr(client, '_credentials', None)
+    if credentials is None:
+        return ('client', id(client))
+    account = getattr(credentials, 'service_account_email', None) or id(credentials)
+    return (getattr(client, 'project', None), account)
+
+metadata_cache = MetadataCache(ttl=os.environ.get('BQ_METADATA_TTL', DEFAULT_TTL))
@@ -0,0 +1,183 @@
+# Content hashes of loaded partitions, for the "skip_unchanged" config field of BigQueryDestination.
+# In partition_overwrite mode the rows of every day of the date range are hashed, and a partition whose hash, row
+# count and table are the same as at its last successful load is not loaded again. The hash doesn't depend on the
+# order of the rows, so a source that returns the same rows in another order doesn't reload the partition.
+#
+# Hashes are stored in a metadata table of the dataset (_partition_hashes, append-only, entries expire after
+# HASH_RETENTION_DAYS) or, with the "hash_store" config field set to "local", in a SQLite file (the HASH_STORE_FILE
+# environment variable, default: the temp dir), a stand-in for local runs.
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timezone
+
+HASH_TABLE_ID = '_partition_hashes'
+HASH_RETENTION_DAYS = 90
+HASH_BITS = 128
+
+def schema_fingerprint(schema):
+    """
+    Returns a hash of the field names, types and modes, a changed schema doesn't match earlier hashes.
+    """
+    def describe(field):
+        return [field.name, field.field_type, field.mode, [describe(subfield) for subfield in field.fields]]
+    return hashlib.sha256(json.dumps([describe(field) for field in schema]).encode('utf-8')).hexdigest()
+
+class PartitionHash:
+    """
+    Running content hash of the rows of one partition: the sum of the row hashes, so rows can be added
+    in any order and in several chunks.
+    """
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.total = 0
+        self.rows = 0
+
+    def update(self, rows):
+        total = self.total
+        for row in rows:
+            canonical = json.dumps(row, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+            total += int.from_bytes(hashlib.blake2b(canonical.encode('utf-8'), digest_size=HASH_BITS // 8).digest(), 'big')
+            self.rows += 1
+        self.total = total % (1 << HASH_BITS)
+
+    def hexdigest(self):
+        return hashlib.sha256(f'{self.fingerprint}:{self.rows}:{self.total:x}'.encode('utf-8')).hexdigest()
+
+class LocalHashStore:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        # Opened on first use, so runs without skip_unchanged don't create the file
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.file_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS hashes (
+                    table_ref TEXT, day TEXT, hash TEXT, rows INTEGER, table_created TEXT, loaded_at REAL,
+                    PRIMARY KEY (table_ref, day))""")
+            self.connection.execute('DELETE FROM hashes WHERE loaded_at < ?', (time.time() - HASH_RETENTION_DAYS * 86400,))
+        return self.connection
+
+    def get(self, table_ref, date_from, date_to):
+        """
+        Returns {day: (hash, rows, table_created)} of the partitions of the date range.
+        """
+        with self.lock:
+            result = self.connect().execute(
+                'SELECT day, hash, rows, table_created FROM hashes WHERE table_ref = ? AND day BETWEEN ? AND ?',
+                (table_ref, str(date_from), str(date_to)))
+            return {date.fromisoformat(day): (hash_, rows, table_created) for day, hash_, rows, table_created in result}
+
+    def put(self, table_ref, entries, table_created):
+        """
+        Stores {day: (hash, rows)} of loaded partitions.
+        """
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('BEGIN')
+                connection.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+                                       [(table_ref, str(day), hash_, rows, table_created, now)
+                                        for day, (hash_, rows) in entries.items()])
+
+    def forget(self, table_ref, days):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute('BEGIN')
+                connection.executemany('DELETE FROM hashes WHERE table_ref = ? AND day = ?',
+                                       [(table_ref, str(day)) for day in days])
+
+class BigQueryHashStore:
+    """
+    Hashes in the _partition_hashes table of the dataset. Entries are only appended (load jobs, no DML),
+    the latest entry of a partition is the one that counts; a forgotten partition gets an entry without a hash.
+    """
+
+    def __init__(self, client, dataset_ref):
+        self.client = client
+        self.table_ref = f'{dataset_ref}.{HASH_TABLE_ID}'
+        self.created = False
+
+    @staticmethod
+    def schema():
+        from google.cloud import bigquery
+        return [
+            bigquery.SchemaField('table_ref', 'STRING', mode='REQUIRED'),
+            bigquery.SchemaField('day', 'DATE', mode='REQUIRED'),
+            bigquery.SchemaField('hash', 'STRING'),
+            bigquery.SchemaField('rows', 'INTEGER'),
+            bigquery.SchemaField('table_created', 'STRING'),
+            bigquery.SchemaField('loaded_at', 'TIMESTAMP', mode='REQUIRED'),
+        ]
+
+    def create_table_if_not_exists(self):
+        from google.cloud import bigquery
+
+        if self.created:
+            return
+        table = bigquery.Table(self.table_ref, schema=self.schema())
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field='loaded_at',
+                                                            expiration_ms=HASH_RETENTION_DAYS * 86400 * 1000)
+        table.clustering_fields = ['table_ref']
+        self.client.create_table(table, exists_ok=True)
+        self.created = True
+
+    def get(self, table_ref, date_from, date_to):
+        from google.cloud import bigquery
+
+        self.create_table_if_not_exists()
+        query = f"""
+            SELECT day, hash, rows, table_created
+            FROM `{self.table_ref}`
+            WHERE table_ref = @table_ref AND day BETWEEN @date_from AND @date_to
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY day ORDER BY loaded_at DESC) = 1
+            """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('table_ref', 'STRING', table_ref),
+                bigquery.ScalarQueryParameter('date_from', 'DATE', str(date_from)),
+                bigquery.ScalarQueryParameter('date_to', 'DATE', str(date_to)),
+            ]
+        )
+        result = self.client.query(query, job_config=job_config).result()
+        return {row['day']: (row['hash'], row['rows'], row['table_created']) for row in result if row['hash'] is not None}
+
+    def append(self, rows):
+        from google.cloud import bigquery
+
+        self.create_table_if_not_exists()
+        job_config = bigquery.LoadJobConfig(schema=self.schema(), write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                                            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON)
+        self.client.load_table_from_json(rows, self.table_ref, job_config=job_config).result()
+
+    def put(self, table_ref, entries, table_created):
+        loaded_at = datetime.now(timezone.utc).isoformat()
+        self.append([{'table_ref': table_ref, 'day': str(day), 'hash': hash_, 'rows': rows,
+                      'table_created': table_created, 'loaded_at': loaded_at}
+                     for day, (hash_, rows) in entries.items()])
+
+    def forget(self, table_ref, days):
+        loaded_at = datetime.now(timezone.utc).isoformat()
+        self.append([{'table_ref': table_ref, 'day': str(day), 'hash': None, 'rows': None,
+                      'table_created': None, 'loaded_at': loaded_at} for day in days])
+
+local_hash_store = LocalHashStore(os.environ.get('HASH_STORE_FILE') or os.path.join(tempfile.gettempdir(), 'connector_partition_hashes.sqlite'))
+
+def open_hash_store(kind, client, dataset_ref):
+    """
+    Returns the hash store of the kind ("bigquery" or "local") for the tables of a dataset.
+    """
+    if str(kind or 'bigquery').lower() == 'local':
+        return local_hash_store
+    return BigQueryHashStore(client, dataset_ref)
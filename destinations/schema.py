@@ -0,0 +1,68 @@
+# Table schemas shared by the destinations: merge_schema applies the additive changes BigQuery accepts
+# (new NULLABLE/REPEATED fields, REQUIRED -> NULLABLE) to an existing schema.
+# Fields are google.cloud.bigquery SchemaFields (the connectors' bq_schema()), but this module doesn't import the
+# BigQuery client library: new fields are built with the class of the fields it's given, so destinations that don't
+# load to BigQuery (local files) don't load it either.
+
+# Legacy and standard SQL names of the same type
+TYPE_ALIASES = {'INT64': 'INTEGER', 'FLOAT64': 'FLOAT', 'BOOL': 'BOOLEAN', 'STRUCT': 'RECORD'}
+
+def merge_schema(remote_schema, local_schema, prefix=''):
+    """
+    Returns (merged schema, changes, errors): the remote schema with the additive changes of the local one
+    (new NULLABLE/REPEATED fields appended, REQUIRED fields relaxed to NULLABLE), and the differences that
+    can't be applied to the table in place.
+    """
+    local_fields = {field.name: field for field in local_schema}
+    remote_names = {field.name for field in remote_schema}
+    merged, changes, errors = [], [], []
+
+    for remote_field in remote_schema:
+        name = prefix + remote_field.name
+        local_field = local_fields.get(remote_field.name)
+        if local_field is None:
+            errors.append(f"Field '{name}' is present in remote schema but missing in local schema.")
+            merged.append(remote_field)
+            continue
+        local_type = TYPE_ALIASES.get(local_field.field_type, local_field.field_type)
+        remote_type = TYPE_ALIASES.get(remote_field.field_type, remote_field.field_type)
+        if local_type != remote_type:
+            errors.append(f"BigQuery: Field '{name}' type mismatch: local={local_field.field_type}, remote={remote_field.field_type}")
+        mode = remote_field.mode
+        if local_field.mode != remote_field.mode:
+            if remote_field.mode == 'REQUIRED' and local_field.mode == 'NULLABLE':
+                mode = 'NULLABLE'
+                changes.append(f"Field '{name}' relaxed from REQUIRED to NULLABLE.")
+            else:
+                errors.append(f"BigQuery: Field '{name}' mode mismatch: local={local_field.mode}, remote={remote_field.mode}")
+        fields = remote_field.fields
+        if local_type == remote_type == 'RECORD':
+            fields, field_changes, field_errors = merge_schema(remote_field.fields, local_field.fields, f'{name}.')
+            changes.extend(field_changes)
+            errors.extend(field_errors)
+        if mode == remote_field.mode and list(fields) == list(remote_field.fields):
+            merged.append(remote_field)
+        else:
+            # The other properties of the remote field (description, policy tags, ...) are kept
+            api_repr = dict(remote_field.to_api_repr(), mode=mode)
+            if fields:
+                api_repr['fields'] = [field.to_api_repr() for field in fields]
+            merged.append(type(remote_field).from_api_repr(api_repr))
+
+    for local_field in local_schema:
+        if local_field.name in remote_names:
+            continue
+        name = prefix + local_field.name
+        if local_field.mode == 'REQUIRED':
+            errors.append(f"BigQuery: Field '{name}' is missing in remote schema and can't be added as REQUIRED.")
+        else:
+            changes.append(f"Field '{name}' added as {local_field.field_type} {local_field.mode}.")
+            merged.append(local_field)
+    return merged, changes, errors
+
+def schema_from_api_repr(api_repr, like):
+    """
+    Returns the fields of a schema in JSON (API) format, of the class of the fields of the schema like.
+    """
+    field_class = type(next(iter(like)))
+    return [field_class.from_api_repr(field) for field in api_repr]
@@ -0,0 +1,199 @@
+# BigQuery Storage Write API, for the "stream" load strategy of BigQueryDestination (small results).
+# The rows are appended to a PENDING write stream as protocol buffers, typed from the table schema (the descriptor is
+# built from bq_schema, no .proto files), and the stream is committed at once: the rows appear together, and a write
+# that fails before the commit leaves nothing in the table. There is no load job to schedule, which is what most of
+# the latency of a small load is.
+#
+# google-cloud-bigquery-storage is imported only when the strategy is used.
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from destinations.load_formats import value_converter
+from resource_cache import resource_cache, google_credentials_usable
+
+MAX_REQUEST_BYTES = 8 * 1024 * 1024  # AppendRows requests are limited to 10 MB
+# Seconds per call, retries included: a small write that takes longer is loaded with load jobs instead
+WRITE_TIMEOUT = 30
+EPOCH = date(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+FieldDescriptor = descriptor_pb2.FieldDescriptorProto
+
+PROTO_TYPES = {
+    'INTEGER': FieldDescriptor.TYPE_INT64, 'INT64': FieldDescriptor.TYPE_INT64,
+    'FLOAT': FieldDescriptor.TYPE_DOUBLE, 'FLOAT64': FieldDescriptor.TYPE_DOUBLE,
+    'BOOLEAN': FieldDescriptor.TYPE_BOOL, 'BOOL': FieldDescriptor.TYPE_BOOL,
+    'BYTES': FieldDescriptor.TYPE_BYTES,
+    # Days since the epoch
+    'DATE': FieldDescriptor.TYPE_INT32,
+    # Microseconds since the epoch
+    'TIMESTAMP': FieldDescriptor.TYPE_INT64,
+    # Everything else (STRING, NUMERIC, DATETIME, TIME, JSON, ...) is sent as a string
+}
+
+def write_client(bq_client):
+    """
+    Returns the Storage Write API client with the credentials of a BigQuery client, shared by the runs of a warm instance.
+    """
+    from google.cloud.bigquery_storage_v1 import BigQueryWriteClient
+
+    credentials = getattr(bq_client, '_credentials', None)
+    key_parts = [os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', ''), os.environ.get('GOOGLE_CLOUD_PROJECT', ''), id(credentials)]
+    return resource_cache.get('bigquery_write', key_parts, lambda: BigQueryWriteClient(credentials=credentials),
+                              health_check=google_credentials_usable)
+
+def writable(schema):
+    # Field names are message field names, flexible column names (e.g. with spaces) can't be written this way
+    return all(field.name.isidentifier() and (field.field_type not in ('RECORD', 'STRUCT') or writable(field.fields))
+               for field in schema)
+
+def proto_descriptor(schema, name='Row', path='.Row'):
+    """
+    Returns the self-contained DescriptorProto of rows of the schema: records are nested message types.
+    """
+    message = descriptor_pb2.DescriptorProto(name=name)
+    for number, field in enumerate(schema, start=1):
+        label = FieldDescriptor.LABEL_REPEATED if field.mode == 'REPEATED' else FieldDescriptor.LABEL_OPTIONAL
+        if field.field_type in ('RECORD', 'STRUCT'):
+            nested_name = f'{name}_{field.name}'
+            message.nested_type.add().CopyFrom(proto_descriptor(field.fields, nested_name, f'{path}.{nested_name}'))
+            message.field.add(name=field.name, number=number, label=label,
+                              type=FieldDescriptor.TYPE_MESSAGE, type_name=f'{path}.{nested_name}')
+        else:
+            message.field.add(name=field.name, number=number, label=label,
+                              type=PROTO_TYPES.get(field.field_type, FieldDescriptor.TYPE_STRING))
+    return message
+
+def message_class(descriptor):
+    proto_file = descriptor_pb2.FileDescriptorProto(name='row.proto', syntax='proto2')
+    proto_file.message_type.add().CopyFrom(descriptor)
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(proto_file)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName(descriptor.name))
+
+def proto_value(field):
+    """
+    Returns a function that converts a JSON-style value to the value of the message field.
+    """
+    convert = value_converter(field)
+    field_type = field.field_type
+    if field_type == 'DATE':
+        to_proto = lambda value: (value - EPOCH).days
+    elif field_type == 'TIMESTAMP':
+        to_proto = lambda value: (value - EPOCH_UTC) // timedelta(microseconds=1)
+    elif field_type == 'DATETIME':
+        to_proto = lambda value: value.isoformat(sep=' ')
+    elif field_type in ('NUMERIC', 'BIGNUMERIC', 'TIME'):
+        to_proto = str
+    else:
+        return convert
+    if field.mode == 'REPEATED':
+        return lambda value: [to_proto(item) for item in convert(value)]
+    return lambda value: None if value is None else to_proto(convert(value))
+
+def row_filler(schema):
+    """
+    Returns fill(message, row), which sets the fields of the message from a row dict (None values stay unset).
+    """
+    setters = []
+    for field in schema:
+        name = field.name
+        if field.field_type in ('RECORD', 'STRUCT'):
+            fill_record = row_filler(field.fields)
+            if field.mode == 'REPEATED':
+                def setter(message, value, name=name, fill_record=fill_record):
+                    for item in value:
+                        if item is not None:
+                            fill_record(getattr(message, name).add(), item)
+            else:
+                def setter(message, value, name=name, fill_record=fill_record):
+                    fill_record(getattr(message, name), value)
+        elif field.mode == 'REPEATED':
+            def setter(message, value, name=name, convert=proto_value(field)):
+                getattr(message, name).extend(convert(value))
+        else:
+            def setter(message, value, name=name, convert=proto_value(field)):
+                setattr(message, name, convert(value))
+        setters.append((name, setter))
+
+    def fill(message, row):
+        for name, setter in setters:
+            value = row.get(name)
+            if value is not None:
+                setter(message, value)
+        return message
+    return fill
+
+def serialize_rows(rows, schema):
+    """
+    Returns (descriptor, serialized rows) of a list of row dicts.
+    """
+    descriptor = proto_descriptor(schema)
+    row_class = message_class(descriptor)
+    fill = row_filler(schema)
+    try:
+        return descriptor, [fill(row_class(), row).SerializeToString() for row in rows]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Write API: A row doesn't match the table schema: {str(e)}") from e
+
+def table_path(table_ref):
+    project_id, dataset_id, table_id = table_ref.split('.')
+    return f'projects/{project_id}/datasets/{dataset_id}/tables/{table_id}'
+
+def append_requests(stream_name, descriptor, serialized_rows):
+    from google.cloud.bigquery_storage_v1 import types
+
+    offset = 0
+    while offset < len(serialized_rows):
+        # Rows are sent in requests of up to MAX_REQUEST_BYTES, at their offset in the stream
+        size = 0
+        end = offset
+        while end < len(serialized_rows) and (end == offset or size + len(serialized_rows[end]) < MAX_REQUEST_BYTES):
+            size += len(serialized_rows[end])
+            end += 1
+        proto_data = types.AppendRowsRequest.ProtoData(rows=types.ProtoRows(serialized_rows=serialized_rows[offset:end]))
+        if offset == 0:
+            # The stream and schema are only sent with the first request
+            proto_data.writer_schema = types.ProtoSchema(proto_descriptor=descriptor)
+        request = types.AppendRowsRequest(offset=offset, proto_rows=proto_data)
+        if offset == 0:
+            request.write_stream = stream_name
+        yield request
+        offset = end
+
+def write_pending(client, table_ref, rows, schema):
+    """
+    Appends the rows to a new PENDING write stream of the table and finalizes it. Returns the stream name,
+    the rows appear in the table only when it is committed with commit_streams.
+    """
+    from google.cloud.bigquery_storage_v1 import types
+
+    descriptor, serialized_rows = serialize_rows(rows, schema)
+    stream = client.create_write_stream(parent=table_path(table_ref),
+                                        write_stream=types.WriteStream(type_=types.WriteStream.Type.PENDING),
+                                        timeout=WRITE_TIMEOUT)
+    if serialized_rows:
+        metadata = (('x-goog-request-params', f'write_stream={stream.name}'),)
+        for response in client.append_rows(append_requests(stream.name, descriptor, serialized_rows),
+                                           metadata=metadata, timeout=WRITE_TIMEOUT):
+            if response.row_errors:
+                errors = '; '.join(f'row {error.index}: {error.message}' for error in response.row_errors[:5])
+                raise ValueError(f'Write API: {len(response.row_errors)} rows were rejected: {errors}')
+            if response.error.code:
+                raise Exception(f'Write API: Append to {table_ref} failed: {response.error.message}')
+    client.finalize_write_stream(name=stream.name, timeout=WRITE_TIMEOUT)
+    return stream.name
+
+def stream_committed(client, stream_name):
+    """
+    Returns whether a write stream was committed. Raises when that can't be read, rather than risk writing its rows twice.
+    """
+    return bool(client.get_write_stream(name=stream_name, timeout=WRITE_TIMEOUT).commit_time)
+
+def commit_streams(client, table_ref, stream_names):
+    response = client.batch_commit_write_streams(request={'parent': table_path(table_ref), 'write_streams': list(stream_names)},
+                                                 timeout=WRITE_TIMEOUT)
+    if response.stream_errors:
+        errors = '; '.join(error.error_message for error in response.stream_errors)
+        raise Exception(f'Write API: Commit to {table_ref} failed: {errors}')
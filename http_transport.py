@@ -0,0 +1,63 @@
+# Shared HTTP transport for REST connectors.
+# One requests.Session per pool configuration is kept for the whole process, so paginated and per-day
+# loops (and all jobs of a batch) reuse keep-alive connections instead of a new TCP+TLS handshake per request.
+
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import span
+import raw_archive
+
+DEFAULT_TIMEOUT = 60  # seconds, used when a connector doesn't pass its own timeout
+DEFAULT_POOL_SIZE = 10  # keep-alive connections per host
+POOLED_HOSTS = 20  # number of hosts to keep connection pools for
+
+class PooledSession(requests.Session):
+    """
+    requests.Session with per-host connection pools, gzip negotiation and a default timeout.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=POOLED_HOSTS, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+        # The session is shared by different clients' jobs, so cookies must not be kept between requests
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # Responses are archived, or served from the archive on replay, see raw_archive.py
+        archive = raw_archive.current_chunk()
+        if archive is not None and archive.replay:
+            with span(f'replay.{method.upper()} {urlsplit(url).hostname}'):
+                return archive.replay_response(method, url, kwargs.get('stream'))
+
+        with span(f'http.{method.upper()} {urlsplit(url).hostname}') as s:
+            response = super().request(method, url, **kwargs)
+            # Streamed bodies are read later by the caller, so only their declared size is known here
+            if kwargs.get('stream'):
+                s.add(bytes=int(response.headers.get('Content-Length', 0)))
+            else:
+                s.add(bytes=len(response.content))
+        if archive is not None:
+            response = archive.record(method, url, response, kwargs.get('stream'))
+        return response
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """
+    Returns the process-wide session for the given pool size and default timeout.
+    """
+    key = (int(pool_size), float(timeout))
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = PooledSession(pool_size=key[0], timeout=key[1])
+
+        return _sessions[key]
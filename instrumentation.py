@@ -0,0 +1,218 @@
+# Timing instrumentation for connector runs.
+# A run opens a Trace, and every span inside it (validate, authenticate, each fetch request, transform,
+# each BigQuery step) records wall time, CPU time, rows and bytes. At the end of the run the spans are
+# aggregated by name and logged as one structured JSON line.
+# Without an active trace (or with instrumentation disabled) span() returns a shared no-op object,
+# so instrumented code costs one context variable lookup.
+#
+# InstrumentedMeta metaclass - wraps all public methods of a class in spans
+# instrument_method decorator - puts a method call (or a generator's iteration) in a span
+
+import contextvars
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Default for runs that don't set the "instrumentation" config field
+ENABLED_BY_DEFAULT = os.environ.get('INSTRUMENTATION', 'true').lower() == 'true'
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+class Trace:
+    """
+    Collects the spans of one run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.lock = threading.Lock()
+        self.wall_start = time.perf_counter()
+
+    def record(self, name, wall, cpu, rows, bytes, error):
+        with self.lock:
+            self.spans.append((name, wall, cpu, rows, bytes, error))
+
+    def summary(self):
+        """
+        Aggregates the spans by name: count, total and max wall time, CPU time, rows and bytes.
+        """
+        aggregated = {}
+        for name, wall, cpu, rows, bytes, error in list(self.spans):
+            entry = aggregated.setdefault(name, {'count': 0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'cpu_ms': 0.0,
+                                                 'rows': 0, 'bytes': 0, 'errors': 0})
+            entry['count'] += 1
+            entry['wall_ms'] += wall * 1000
+            entry['max_wall_ms'] = max(entry['max_wall_ms'], wall * 1000)
+            entry['cpu_ms'] += cpu * 1000
+            entry['rows'] += rows
+            entry['bytes'] += bytes
+            entry['errors'] += int(error)
+        for entry in aggregated.values():
+            for key in ('wall_ms', 'max_wall_ms', 'cpu_ms'):
+                entry[key] = round(entry[key], 1)
+
+        return {'run': self.name,
+                'wall_ms': round((time.perf_counter() - self.wall_start) * 1000, 1),
+                'spans': aggregated}
+
+    def log_summary(self):
+        logger.info(f'Run summary: {json.dumps(self.summary())}')
+
+class Span:
+    def __init__(self, trace, name, rows=0, bytes=0):
+        self.trace = trace
+        self.name = name
+        self.rows = rows
+        self.bytes = bytes
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.running = False
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows
+        self.bytes += bytes
+
+    def resume(self):
+        self.running = True
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def pause(self):
+        """
+        Stops the clocks without closing the span, e.g. while a generator is suspended.
+        """
+        if self.running:
+            self.running = False
+            self.wall += time.perf_counter() - self.wall_start
+            self.cpu += time.thread_time() - self.cpu_start
+
+    def __enter__(self):
+        self.resume()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pause()
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        self.trace.record(self.name, self.wall, self.cpu, self.rows, self.bytes, error)
+        return False
+
+class NoopSpan:
+    def add(self, rows=0, bytes=0):
+        pass
+
+    def resume(self):
+        pass
+
+    def pause(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NOOP_SPAN = NoopSpan()
+
+def span(name, rows=0, bytes=0):
+    """
+    Returns a span for the current run, or a no-op span when nothing is traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, rows, bytes)
+
+class start_trace:
+    """
+    Context manager that makes a new Trace current for the run (in this thread) and logs its summary at the end.
+    """
+
+    def __init__(self, name, enabled=None):
+        self.trace = Trace(name) if (ENABLED_BY_DEFAULT if enabled is None else enabled) else None
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_trace.reset(self.token)
+        if self.trace is not None:
+            self.trace.log_summary()
+        return False
+
+def current_trace():
+    return _current_trace.get()
+
+def row_count(result):
+    # Batches of rows (lists, ColumnBatches, DataFrames) have a length; strings, dicts and tuples returned
+    # by other methods (tokens, responses, pairs of values) aren't rows
+    if isinstance(result, (str, bytes, dict, tuple)) or not hasattr(result, '__len__'):
+        return 0
+    return len(result)
+
+def instrument_method(class_name, method_name):
+    """
+    Decorator that puts method calls in a "Class.method" span and logs exceptions.
+    Generator methods are timed while they produce values, and count the rows of the yielded batches.
+    """
+
+    def decorator(func):
+        name = f'{class_name}.{method_name}'
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with span(name) as s:
+                    try:
+                        generator = func(*args, **kwargs)
+                        while True:
+                            try:
+                                value = next(generator)
+                            except StopIteration:
+                                return
+                            s.add(rows=row_count(value))
+                            s.pause()
+                            yield value
+                            s.resume()
+                    except Exception as e:
+                        logger.error(f"{class_name}: Error in method: {method_name}. Error: {str(e)}")
+                        raise
+            return generator_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"{class_name}: Error in method: {method_name}. Error: {str(e)}")
+                    raise
+            with span(name) as s:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"{class_name}: Error in method: {method_name}. Error: {str(e)}")
+                    raise
+                s.add(rows=row_count(result))
+                return result
+        return wrapper
+    return decorator
+
+class InstrumentedMeta(type):
+    """
+    Metaclass that instruments all public methods.
+    """
+
+    def __new__(cls, name, bases, attrs):
+        for key, value in attrs.items():
+            if callable(value) and not key.startswith('__'):
+                attrs[key] = instrument_method(name, key)(value)
+        return super(InstrumentedMeta, cls).__new__(cls, name, bases, attrs)
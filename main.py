@@ -1,76 +1,88 @@
+from pipeline import run_job, run_batch
 from source_factory import Source
-from destinations.bigquery import BigQueryDestination
+from spill import memory_budget
+from notifications import dispatcher
 import logging
 import functions_framework
-from abstract_source import send_notification
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def positive_int(name, value):
+    """
+    Returns a query parameter as a positive integer, a ValueError names the parameter otherwise.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise ValueError(f"Invalid {name}: '{value}', expected a positive integer.")
+    return number
+
+def parse_connector_limits(value):
+    # Per-connector limits come as "connector_limits=google_ads:2,meta_ads:1"
+    limits = {}
+    for item in value.split(','):
+        if not item:
+            continue
+        connector, separator, limit = item.partition(':')
+        if not separator or not connector:
+            raise ValueError(f"Invalid connector_limits item: '{item}', expected connector:limit.")
+        limits[connector] = positive_int(f'connector_limits limit of {connector}', limit)
+    return limits
+
 @functions_framework.http
 def main(request):
     """
     This function is triggered by an HTTP request.
     It extracts configuration from the request, fetches data from a source, and writes it to BigQuery.
+    A POST with a JSON list of configs runs them all as one batch, see pipeline.run_batch.
+    Queued notifications are delivered before the response is returned, the instance may be idle (and its CPU
+    throttled) right after it.
+    """
+    try:
+        return handle(request)
+    finally:
+        dispatcher.flush()
+
+def handle(request):
     """
-    # 1. Extract configuration from the request
+    Runs the request, returns the response of main.
+    """
+    # Batch mode: POST a JSON list of configs
+    if request.method == 'POST':
+        configs = request.get_json(silent=True)
+        if not isinstance(configs, list) or not all(isinstance(config, dict) for config in configs):
+            return {"message": "Expected a JSON list of connector configs."}, 400
+
+        try:
+            max_workers = positive_int('max_workers', request.args.get('max_workers', 8))
+            connector_limit = positive_int('connector_limit', request.args.get('connector_limit', 4))
+            connector_limits = parse_connector_limits(request.args.get('connector_limits', ''))
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        summary = run_batch(configs, max_workers=max_workers, connector_limit=connector_limit,
+                            connector_limits=connector_limits)
+
+        # 207 tells the scheduler that some of the jobs failed, the summary says which ones
+        return summary, 200 if not summary["failed"] else 207
+
+    # Extract configuration from the request
     request_args = request.args
     if request_args:
         config = {key: value for key, value in request_args.items()}
     else:
         return {"message": "No URL parameters found."}, 400
-    
-    # 2. Get data from a source
+
+    # Config errors are the caller's: they get a 400 before the job starts, like the batch parameters
     try:
-        source_connector = Source.connector(config)
-        data = source_connector.fetch_all_data()
-    except Exception as e:
-        if config.get('report'):
-            send_notification(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {source_connector.__class__.__name__} connector, {config['report']} report.")
-        else:
-            send_notification(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {source_connector.__class__.__name__} connector.")
-        raise Exception(f"Failed to fetch data from {source_connector.__class__.__name__} source: {str(e)}")
+        Source.validate_config(config)
+        memory_budget(config)
+    except ValueError as e:
+        return {"message": str(e)}, 400
 
-    logger.info(f"Data fetched and transformed from {source_connector.__class__.__name__} source. Rows: {len(data)}")
-    
-    # If the data is empty, send a notification and return
-    if not data:
-        send_notification(f"🔷 <b>{config['netpeak_client']}</b>: Fetched 0 rows for dates {config['date_from']} - {config['date_from']} for {source_connector.__class__.__name__} source.")
-        return f"No data fetched from {source_connector.__class__.__name__} source", 200
+    result = run_job(config)
 
-    # 3. Write data to BigQuery
-    try:
-        bq_dest = BigQueryDestination(
-        project_id=config["project_id"],
-        dataset_id=config["dataset_id"],
-        table_id=config["table_id"],
-        bq_schema=source_connector.bq_schema(),
-        json_data=data, 
-        dataset_location=config["dataset_location"],
-        date_from=source_connector.config["date_from"],
-        date_to=source_connector.config["date_to"],
-        partition_by=source_connector.partition_by,
-        full_refresh=config.get("full_refresh", False)
-        )
-        bq_dest.execute()
-        logger.info(f"{source_connector.__class__.__name__} data loaded to BigQuery.")
-    except Exception as e:
-        if config.get('report'):
-            send_notification(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery. Got {len(data)} rows for {config['report']} report from {source_connector.__class__.__name__} source.")
-        else:
-            send_notification(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery. Got {len(data)} rows from {source_connector.__class__.__name__} source.")
-        logger.info(f"Got {len(data)} rows from {source_connector.__class__.__name__} source. Failed to load them to BigQuery: {str(e)}")
-        raise Exception(f"Failed to load data to BigQuery: {str(e)}")
-    
-    try:
-        if config.get('report'):
-            send_notification(f"✅ <b>{config['netpeak_client']}</b>: {source_connector.__class__.__name__} {config['report']} data loaded, last date: {config['date_to']}. Rows: {len(data)}")
-        else:
-            send_notification(f"✅ <b>{config['netpeak_client']}</b>: {source_connector.__class__.__name__} data loaded, last date: {config['date_to']}. Rows: {len(data)}")
-        
-        logger.info(f"Telegram notification sent.")
-        return f"{config['netpeak_client']}: Data fetched and transformed from {source_connector.__class__.__name__} source and loded into BigQuery ({len(data)} rows)", 200
-    except Exception as e:
-        send_notification(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery.")
-        raise Exception(f"Failed to load data to BigQuery: {str(e)}")
+    return result["message"], 200
@@ -0,0 +1,148 @@
+# Telegram notifications, delivered in the background.
+# send_notification only puts the message in a queue, a worker thread with one reusable Bot and event loop
+# delivers it, so a run never waits for a Telegram round trip. The HTTP handler flushes the queue before it returns
+# its response (a Cloud Functions instance isn't torn down between invocations, and its CPU is throttled once the
+# response is sent), and queued messages are also flushed on interpreter exit.
+# NotificationDigest collects the messages of a batch and sends one digest per netpeak_client.
+
+import asyncio
+import atexit
+import html
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FLUSH_TIMEOUT = 10  # seconds to wait for queued messages on exit
+MAX_MESSAGE_LENGTH = 4096  # Telegram rejects longer messages
+HTML_TAG = re.compile(r'<[^>]*>')
+
+class NotificationDispatcher:
+    def __init__(self, token, chat_id):
+        self.token = token
+        self.chat_id = chat_id
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def send(self, message):
+        """
+        Queues a message for delivery and returns immediately.
+        """
+        self.start()
+        self.queue.put(message)
+
+    def start(self):
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        # Imported here, so the Telegram client isn't loaded on cold start before it's needed
+        from telegram import Bot
+
+        loop = asyncio.new_event_loop()
+        try:
+            bot = Bot(token=self.token)
+        except Exception as e:
+            # E.g. a missing or invalid token: messages are still taken from the queue (and dropped), so flush doesn't wait
+            logger.error(f"Failed to create the Telegram bot, notifications are not sent: {str(e)}")
+            bot = None
+        while True:
+            message = self.queue.get()
+            try:
+                if bot is None:
+                    continue
+                loop.run_until_complete(bot.send_message(chat_id=self.chat_id, text=message, parse_mode='HTML'))
+            except Exception as e:
+                logger.error(f"Failed to send notification: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Waits until the queued messages are delivered, at most timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"{self.queue.unfinished_tasks} notifications were not delivered in {timeout} seconds.")
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+class NotificationDigest:
+    """
+    Collects messages per netpeak_client, and sends each client's messages as one notification on flush.
+    """
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.messages = {}
+        self.lock = threading.Lock()
+
+    def notifier(self, netpeak_client):
+        """
+        Returns a send function that adds messages to the digest of the client.
+        """
+        def notify(message):
+            with self.lock:
+                self.messages.setdefault(netpeak_client, []).append(message)
+        return notify
+
+    def flush(self):
+        with self.lock:
+            messages, self.messages = self.messages, {}
+        for client_messages in messages.values():
+            for chunk in message_chunks(client_messages):
+                self.dispatcher.send(chunk)
+
+def message_chunks(lines, limit=MAX_MESSAGE_LENGTH):
+    """
+    Joins lines into messages of at most limit characters, split on line boundaries (a longer line is cut,
+    see line_parts).
+    """
+    chunks = []
+    current = ''
+    for line in lines:
+        for part in line_parts(line, limit):
+            if current and len(current) + 1 + len(part) > limit:
+                chunks.append(current)
+                current = ''
+            current = f'{current}\n{part}' if current else part
+    if current:
+        chunks.append(current)
+    return chunks
+
+def line_parts(line, limit=MAX_MESSAGE_LENGTH):
+    """
+    Returns the parts of a line of at most limit characters. A longer line is cut as plain text, so that no HTML tag
+    or entity is split (Telegram would reject the message): its tags are dropped and its text is escaped again.
+    """
+    if len(line) <= limit:
+        return [line]
+    parts = []
+    current = ''
+    for char in html.unescape(HTML_TAG.sub('', line)):
+        escaped = html.escape(char, quote=False)
+        if len(current) + len(escaped) > limit:
+            parts.append(current)
+            current = ''
+        current += escaped
+    if current:
+        parts.append(current)
+    return parts
+
+dispatcher = NotificationDispatcher(token=os.environ.get('TELEGRAM_BOT_TOKEN', ''),
+                                    chat_id=os.environ.get('TELEGRAM_CHAT_ID', ''))
+atexit.register(dispatcher.flush)
+
+def send_notification(message):
+    dispatcher.send(message)
@@ -0,0 +1,279 @@
+# run_job function - runs one connector config: fetch from the source, load to BigQuery, notify
+# run_batch function - runs many configs on a bounded worker pool, with a concurrency limit per connector
+# With the "checkpoints" config field set to "true", a job is loaded chunk by chunk and can be resumed, see checkpoints.py
+# With "raw_archive" set, the API responses are archived, and "replay" reruns a job from them, see raw_archive.py
+# With "memory_budget_mb" set, rows over the budget are spilled to disk until the load, see spill.py
+# "load_mode" selects how the rows of the date range are replaced, and "load_format" how they are sent to
+# BigQuery (json, parquet or avro), see destinations/bigquery.py
+# With "skip_unchanged" set to "true", partitions with the same rows as at their last load are not loaded again,
+# see destinations/partition_hashes.py
+# With "destination" set to "local", the rows are written to date-partitioned files instead, see destination_factory.py
+# "load_strategy" (auto by default: Storage Write API for small results, parallel or batched load jobs for larger ones)
+# and its thresholds are described in destinations/bigquery.py; the strategy used and its seconds are in the result
+
+from source_factory import Source
+from destination_factory import Destination
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from collections import deque
+from itertools import chain
+import logging
+import time
+from notifications import send_notification, NotificationDigest, dispatcher
+from checkpoints import checkpoint_store
+from spill import SpillBuffer, memory_budget, peak_rss_mb
+import raw_archive
+from instrumentation import start_trace
+
+logger = logging.getLogger(__name__)
+
+def run_job(config, bq_client=None, notify=send_notification):
+    """
+    Fetches data from a source and writes it to BigQuery.
+    Returns a dict with the status ("success" or "empty"), row count and message, raises on failure.
+    The timings of the run are logged as one summary line, unless the "instrumentation" config field is "false".
+    Notifications go to notify(message), which queues them without waiting for delivery.
+    """
+    enabled = config.get('instrumentation')
+    trace_name = '/'.join(str(config[key]) for key in ('netpeak_client', 'connector', 'report') if config.get(key))
+    with start_trace(trace_name, enabled=None if enabled is None else str(enabled).lower() == 'true'), raw_archive.activate(config):
+        result = _run_job(config, bq_client, notify)
+    # The peak of the process, so with jobs running in parallel (run_batch) it covers all of them
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    logger.info(f"{trace_name}: peak RSS {result['peak_rss_mb']} MB.")
+    return result
+
+def _run_job(config, bq_client, notify):
+    if str(config.get('checkpoints', '')).lower() == 'true':
+        return _run_checkpointed_job(config, bq_client, notify)
+
+    # In streaming mode batches go from the source to BigQuery in chunks, instead of one list with all rows.
+    # The date range isn't deleted up front then, partitions are replaced as their rows come (BigQuery refuses
+    # streaming in delete_append mode), so a failed fetch leaves the days not loaded yet as they were
+    streaming = str(config.get('streaming', '')).lower() == 'true'
+    # With a memory budget all rows are collected in a SpillBuffer, and loaded from it in chunks
+    budget = None if streaming else memory_budget(config)
+    
+    # 1. Get data from a source
+    source_connector = Source.connector(config)
+    try:
+        if streaming:
+            batches = source_connector.fetch_batches()
+            # Take the first non-empty batch, so an empty result is detected before anything is written
+            data = next((batch for batch in batches if batch), [])
+        elif budget:
+            data = SpillBuffer(budget, config.get('spill_dir')).extend(source_connector.fetch_batches())
+        else:
+            data = source_connector.fetch_all_data()
+    except Exception as e:
+        if config.get('report'):
+            notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {source_connector.__class__.__name__} connector, {config['report']} report.")
+        else:
+            notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {source_connector.__class__.__name__} connector.")
+        raise Exception(f"Failed to fetch data from {source_connector.__class__.__name__} source: {str(e)}")
+
+    if streaming:
+        logger.info(f"First batch fetched and transformed from {source_connector.__class__.__name__} source. Rows: {len(data)}")
+    else:
+        logger.info(f"Data fetched and transformed from {source_connector.__class__.__name__} source. Rows: {len(data)}")
+    
+    # If the data is empty, send a notification and return
+    if not data:
+        notify(f"🔷 <b>{config['netpeak_client']}</b>: Fetched 0 rows for dates {config['date_from']} - {config['date_from']} for {source_connector.__class__.__name__} source.")
+        return {"status": "empty", "rows": 0, "message": f"No data fetched from {source_connector.__class__.__name__} source"}
+    rows = len(data)
+
+    # 2. Write data to BigQuery
+    try:
+        bq_dest = Destination.create(
+            config,
+            bq_schema=source_connector.bq_schema(),
+            partition_by=source_connector.partition_by,
+            date_from=source_connector.config["date_from"],
+            date_to=source_connector.config["date_to"],
+            json_data=None if streaming or budget else data,
+            data_batches=chain([data], batches) if streaming else data.batches() if budget else None,
+            full_refresh=config.get("full_refresh", False),
+            bq_client=bq_client,
+            streaming=streaming
+        )
+        # The rows are checked before the table is touched: spilled rows are read back once more for it, a streamed
+        # run checks the first batch, the others only as they come (see abstract_destination.py)
+        if budget:
+            bq_dest.validate_batches(data.read())
+        else:
+            bq_dest.validate(data)
+        bq_dest.execute()
+        if streaming:
+            rows = bq_dest.rows_loaded
+        logger.info(f"{source_connector.__class__.__name__} data loaded to BigQuery.")
+    except Exception as e:
+        if config.get('report'):
+            notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery. Got {rows} rows for {config['report']} report from {source_connector.__class__.__name__} source.")
+        else:
+            notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery. Got {rows} rows from {source_connector.__class__.__name__} source.")
+        logger.info(f"Got {rows} rows from {source_connector.__class__.__name__} source. Failed to load them to BigQuery: {str(e)}")
+        raise Exception(f"Failed to load data to BigQuery: {str(e)}")
+    
+    try:
+        if config.get('report'):
+            notify(f"✅ <b>{config['netpeak_client']}</b>: {source_connector.__class__.__name__} {config['report']} data loaded, last date: {config['date_to']}. Rows: {rows}")
+        else:
+            notify(f"✅ <b>{config['netpeak_client']}</b>: {source_connector.__class__.__name__} data loaded, last date: {config['date_to']}. Rows: {rows}")
+        
+        logger.info(f"Telegram notification queued.")
+        return {"status": "success", "rows": rows, "load_strategy": bq_dest.strategy, "load_seconds": round(bq_dest.load_seconds, 2),
+                "message": f"{config['netpeak_client']}: Data fetched and transformed from {source_connector.__class__.__name__} source and loded into BigQuery ({rows} rows)"}
+    except Exception as e:
+        notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery.")
+        raise Exception(f"Failed to load data to BigQuery: {str(e)}")
+
+def _run_checkpointed_job(config, bq_client, notify):
+    """
+    Loads the job one date chunk at a time. Every loaded batch and chunk is committed to the checkpoint store,
+    so a retry of a failed job skips the loaded chunks and continues a paginated chunk after its last loaded page.
+    """
+    source_connector = Source.connector(config)
+    connector_name = source_connector.__class__.__name__
+    job_key = checkpoint_store.job_key(config)
+    completed = checkpoint_store.completed_chunks(job_key)
+    chunks = source_connector.date_chunks()
+    if completed:
+        logger.info(f"Resuming {connector_name} job: {len(completed)} of {len(chunks)} date chunks are already loaded.")
+
+    # The table is only dropped before anything of this job is loaded
+    full_refresh = config.get("full_refresh", False) and not completed
+    rows = sum(completed.values())
+    for date_from, date_to in chunks:
+        if (date_from, date_to) in completed:
+            continue
+        checkpoint = checkpoint_store.chunk(job_key, date_from, date_to)
+        chunk_connector = Source.connector(dict(config, date_from=date_from, date_to=date_to))
+        chunk_connector.checkpoint = checkpoint
+
+        # 1. Get the first batch of the chunk from a source
+        try:
+            batches = chunk_connector.fetch_batches()
+            data = next((batch for batch in batches if batch), [])
+        except Exception as e:
+            if config.get('report'):
+                notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {connector_name} connector, {config['report']} report.")
+            else:
+                notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to fetch data from {connector_name} connector.")
+            raise Exception(f"Failed to fetch data from {connector_name} source for dates {date_from} - {date_to}: {str(e)}")
+
+        # 2. Load the chunk batch by batch, committing the source cursor after each load
+        if data:
+            try:
+                bq_dest = Destination.create(
+                    config,
+                    bq_schema=chunk_connector.bq_schema(),
+                    partition_by=chunk_connector.partition_by,
+                    date_from=date_from,
+                    date_to=date_to,
+                    full_refresh=full_refresh and not checkpoint.resumed,
+                    bq_client=bq_client
+                )
+                bq_dest.validate(data)
+                # Rows of a resumed chunk, loaded before the failure, are kept, the rest of its range is replaced
+                bq_dest.prepare(delete=not checkpoint.resumed, loaded_partitions=checkpoint.partitions)
+                full_refresh = False
+                for batch in chain([data], batches):
+                    if batch:
+                        bq_dest.validate(batch)
+                        bq_dest.load_rows(batch)
+                    checkpoint.commit(len(batch), bq_dest.loaded_partitions)
+                bq_dest.finish_load()
+            except Exception as e:
+                notify(f"⛔️ <b>{config['netpeak_client']}</b>: Failed to load data to BigQuery. Got {rows + checkpoint.rows} rows from {connector_name} source, the job can be resumed.")
+                logger.info(f"Got {rows + checkpoint.rows} rows from {connector_name} source. Failed to load dates {date_from} - {date_to} to BigQuery: {str(e)}")
+                raise Exception(f"Failed to load data to BigQuery: {str(e)}")
+
+        checkpoint.complete()
+        rows += checkpoint.rows
+        logger.info(f"{connector_name} dates {date_from} - {date_to} loaded to BigQuery. Rows: {checkpoint.rows}")
+
+    checkpoint_store.clear(job_key)
+    if not rows:
+        notify(f"🔷 <b>{config['netpeak_client']}</b>: Fetched 0 rows for dates {config['date_from']} - {config['date_to']} for {connector_name} source.")
+        return {"status": "empty", "rows": 0, "message": f"No data fetched from {connector_name} source"}
+
+    if config.get('report'):
+        notify(f"✅ <b>{config['netpeak_client']}</b>: {connector_name} {config['report']} data loaded, last date: {config['date_to']}. Rows: {rows}")
+    else:
+        notify(f"✅ <b>{config['netpeak_client']}</b>: {connector_name} data loaded, last date: {config['date_to']}. Rows: {rows}")
+    return {"status": "success", "rows": rows, "message": f"{config['netpeak_client']}: Data fetched and transformed from {connector_name} source and loded into BigQuery ({rows} rows)"}
+
+def run_batch(configs, max_workers=8, connector_limit=4, connector_limits=None):
+    """
+    Runs many connector configs concurrently, sharing one BigQuery client.
+    At most max_workers jobs run at once, and at most connector_limit (or connector_limits[connector]) per connector,
+    so a single vendor API doesn't get all the workers. A failing job doesn't stop the others.
+    Jobs wait in a queue per connector and are only given a worker when their connector is under its limit,
+    so the jobs of a busy connector don't hold workers the jobs of other connectors could run on.
+    Returns a summary with status and row count per job, in the order of the configs.
+    Notifications are sent as one digest per netpeak_client when the batch is finished.
+    """
+    max_workers = int(max_workers)
+    connector_limits = connector_limits or {}
+    queues = {}
+    for index, config in enumerate(configs):
+        queues.setdefault(config.get("connector"), deque()).append(index)
+    limits = {connector: int(connector_limits.get(connector, connector_limit)) for connector in queues}
+    if any(limit < 1 for limit in limits.values()) or max_workers < 1:
+        raise ValueError(f"Batch limits must be positive: max_workers {max_workers}, connector limits {limits}.")
+
+    # The BigQuery client is only created when a job loads to BigQuery
+    if any(str(config.get('destination') or 'bigquery').lower() == 'bigquery' for config in configs):
+        from destinations.bigquery import default_client
+        bq_client = default_client()
+    else:
+        bq_client = None
+    digest = NotificationDigest(dispatcher)
+
+    def run(index, config):
+        job = {
+            "index": index,
+            "connector": config.get("connector"),
+            "netpeak_client": config.get("netpeak_client"),
+            "report": config.get("report") or config.get("report_name"),
+            "status": "failed",
+            "rows": 0,
+        }
+        start = time.monotonic()
+        try:
+            Source.validate_config(config)
+            result = run_job(config, bq_client=bq_client, notify=digest.notifier(config.get("netpeak_client")))
+            job.update(status=result["status"], rows=result["rows"], peak_rss_mb=result["peak_rss_mb"])
+            if "load_strategy" in result:
+                job.update(load_strategy=result["load_strategy"], load_seconds=result["load_seconds"])
+        except Exception as e:
+            logger.error(f"Batch job {index} ({job['connector']}) failed: {str(e)}")
+            job["error"] = str(e)
+        job["seconds"] = round(time.monotonic() - start, 2)
+
+        return job
+
+    jobs = [None] * len(configs)
+    running = {}  # future: connector
+    active = dict.fromkeys(queues, 0)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queues or running:
+            for connector in list(queues):
+                queue = queues[connector]
+                while queue and active[connector] < limits[connector] and len(running) < max_workers:
+                    index = queue.popleft()
+                    running[executor.submit(run, index, configs[index])] = connector
+                    active[connector] += 1
+                if not queue:
+                    del queues[connector]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                active[running.pop(future)] -= 1
+                job = future.result()
+                jobs[job["index"]] = job
+
+    digest.flush()
+    failed = sum(1 for job in jobs if job["status"] == "failed")
+    logger.info(f"Batch finished: {len(jobs) - failed} jobs succeeded, {failed} failed.")
+
+    return {"jobs": jobs, "succeeded": len(jobs) - failed, "failed": failed}
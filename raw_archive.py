@@ -0,0 +1,257 @@
+# Raw response landing zone.
+# With the "raw_archive" config field (or the RAW_ARCHIVE environment variable) set to a local directory or
+# gs://bucket/prefix, every HTTP response a connector gets from a vendor API is stored gzip-compressed under
+# connector/netpeak_client/account/report/date_from_date_to/00001.gz - one file per response, in request order.
+# With "replay" set to "true", the connector reads the responses of each date chunk back from the archive instead
+# of calling the API, so transform_data and the load can be rerun after a fix without network I/O or API quota.
+#
+# Responses are archived in PooledSession (see http_transport.py), so only connectors that make their requests
+# through self.http can be replayed. A replay must use the same date chunks as the run that archived the data.
+
+import contextvars
+import gzip
+import json
+import os
+import shutil
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Config fields that identify the account of a job, the first one present is used in the archive key
+ACCOUNT_FIELDS = ('customer_id', 'account_id', 'advertiser_id', 'org_id', 'app_id', 'client_login', 'channel_id', 'username')
+
+# Headers that describe the transfer, not the archived (decoded) body
+SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie', 'connection'}
+
+_current_archive = contextvars.ContextVar('current_archive', default=None)
+_current_chunk = contextvars.ContextVar('current_archive_chunk', default=None)
+_paused = contextvars.ContextVar('archive_paused', default=False)
+
+class LocalStore:
+    def __init__(self, root):
+        self.root = root
+
+    def open_write(self, key):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, 'wb')
+
+    def open_read(self, key):
+        return open(os.path.join(self.root, key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.root, key))
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(os.path.join(self.root, prefix), ignore_errors=True)
+
+class GCSStore:
+    def __init__(self, url):
+        # Imported here, so the storage client is only loaded when a bucket is used
+        from google.cloud import storage
+        from resource_cache import resource_cache, google_credentials_usable
+        bucket, _, self.prefix = url[len('gs://'):].partition('/')
+        client = resource_cache.get('storage', [os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '')], storage.Client,
+                                    health_check=google_credentials_usable)
+        self.bucket = client.bucket(bucket)
+
+    def blob(self, key):
+        return self.bucket.blob(f'{self.prefix.rstrip("/")}/{key}' if self.prefix else key)
+
+    def open_write(self, key):
+        return self.blob(key).open('wb', ignore_flush=True)
+
+    def open_read(self, key):
+        return self.blob(key).open('rb')
+
+    def exists(self, key):
+        return self.blob(key).exists()
+
+    def delete_prefix(self, prefix):
+        for blob in self.bucket.list_blobs(prefix=self.blob(prefix).name):
+            blob.delete()
+
+class RawArchive:
+    """
+    Archive of one job, the responses of each date chunk are kept under their own prefix.
+    """
+
+    def __init__(self, config, store, replay):
+        self.store = store
+        self.replay = replay
+        self.date_from = config['date_from']
+        self.date_to = config['date_to']
+        account = next((config[field] for field in ACCOUNT_FIELDS if config.get(field)), '-')
+        parts = [config.get('connector'), config.get('netpeak_client'), account, config.get('report') or config.get('report_name')]
+        self.prefix = '/'.join(str(part or '-').replace('/', '_') for part in parts)
+        self.chunks = {}
+        self.lock = threading.Lock()
+
+    def chunk(self, date_from, date_to):
+        with self.lock:
+            if (date_from, date_to) not in self.chunks:
+                self.chunks[(date_from, date_to)] = ChunkArchive(self, f'{self.prefix}/{date_from}_{date_to}')
+            return self.chunks[(date_from, date_to)]
+
+class ChunkArchive:
+    """
+    Records the responses of one date chunk in request order, or serves them back on replay.
+    """
+
+    def __init__(self, archive, prefix):
+        self.store = archive.store
+        self.replay = archive.replay
+        self.prefix = prefix
+        self.sequence = 0
+        self.lock = threading.Lock()
+        if not self.replay:
+            # Responses from an earlier run of the chunk would be mixed with the new ones
+            self.store.delete_prefix(prefix)
+
+    def next_key(self):
+        with self.lock:
+            self.sequence += 1
+            return f'{self.prefix}/{self.sequence:05d}.gz'
+
+    def record(self, method, url, response, stream):
+        """
+        Archives a response. A streamed body is archived while the caller reads it.
+        """
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS}
+        meta = {'method': method.upper(), 'url': url, 'status': response.status_code,
+                'reason': response.reason, 'headers': headers}
+        writer = gzip.GzipFile(fileobj=self.store.open_write(self.next_key()), mode='wb')
+        writer.write(json.dumps(meta).encode('utf-8') + b'\n')
+        if stream:
+            response.raw = RecordingReader(response.raw, writer)
+        else:
+            writer.write(response.content)
+            close_writer(writer)
+        return response
+
+    def replay_response(self, method, url, stream):
+        key = self.next_key()
+        if not self.store.exists(key):
+            raise ValueError(f"RawArchive: No archived response {key} for {method.upper()} {url}, the archive doesn't cover this run.")
+        reader = gzip.GzipFile(fileobj=self.store.open_read(key), mode='rb')
+        meta = json.loads(reader.readline())
+        if meta['method'] != method.upper() or urlsplit(meta['url']).path != urlsplit(url).path:
+            raise ValueError(f"RawArchive: Archived response {key} is for {meta['method']} {meta['url']}, not {method.upper()} {url}.")
+
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.reason = meta['reason']
+        response.url = meta['url']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        if stream:
+            response.raw = reader
+        else:
+            response._content = reader.read()
+            reader.close()
+        return response
+
+class RecordingReader:
+    """
+    File-like wrapper of a streamed response body, that writes the decoded bytes to the archive as they are read.
+    """
+
+    def __init__(self, raw, writer):
+        self.raw = raw
+        self.raw.decode_content = True
+        self.writer = writer
+
+    @property
+    def decode_content(self):
+        return True
+
+    @decode_content.setter
+    def decode_content(self, value):
+        # The archive keeps the decoded body, so the body is always decoded
+        pass
+
+    def read(self, amt=None, *args, **kwargs):
+        data = self.raw.read(amt)
+        if data:
+            self.writer.write(data)
+        elif self.writer is not None:
+            close_writer(self.writer)
+            self.writer = None
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+def close_writer(writer):
+    fileobj = writer.fileobj
+    writer.close()
+    fileobj.close()
+
+def open_store(location):
+    return GCSStore(location) if location.startswith('gs://') else LocalStore(location)
+
+class activate:
+    """
+    Context manager that enables archiving (or replay) of the HTTP responses for a run of the config.
+    Does nothing when neither raw_archive nor replay is set.
+    """
+
+    def __init__(self, config):
+        location = config.get('raw_archive') or os.environ.get('RAW_ARCHIVE')
+        replay = str(config.get('replay', '')).lower() == 'true'
+        if replay and not location:
+            raise ValueError("Replay needs the raw_archive config field (or RAW_ARCHIVE environment variable).")
+        self.archive = RawArchive(config, open_store(location), replay) if location else None
+
+    def __enter__(self):
+        self.token = _current_archive.set(self.archive)
+        return self.archive
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_archive.reset(self.token)
+        return False
+
+class chunk:
+    """
+    Context manager that puts the requests made inside it under the archive prefix of a date chunk.
+    """
+
+    def __init__(self, date_from, date_to):
+        archive = _current_archive.get()
+        self.chunk = archive.chunk(date_from, date_to) if archive else None
+
+    def __enter__(self):
+        self.token = _current_chunk.set(self.chunk)
+        return self.chunk
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_chunk.reset(self.token)
+        return False
+
+class paused:
+    """
+    Context manager for requests that are not archived (and made even on replay), e.g. token requests.
+    """
+
+    def __enter__(self):
+        self.token = _paused.set(True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _paused.reset(self.token)
+        return False
+
+def current_chunk():
+    """
+    Returns the ChunkArchive for requests made now, or None when nothing is archived.
+    Requests outside of a date chunk go to the chunk of the whole date range of the run.
+    """
+    archive = _current_archive.get()
+    if archive is None or _paused.get():
+        return None
+    return _current_chunk.get() or archive.chunk(archive.date_from, archive.date_to)
+
+def replaying():
+    archive = _current_archive.get()
+    return archive is not None and archive.replay
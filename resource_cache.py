@@ -0,0 +1,147 @@
+# Cache of API and cloud clients for warm instances.
+# Clients (BigQuery, Cloud Storage, GA4 Data API, RTB House, Meta) are expensive to build: each one loads
+# credentials and opens its own connections. They are kept in process memory, keyed by kind and a hash of the
+# credentials/project, and reused by later runs on the same instance.
+# Concurrent callers for the same key wait for one client to be built instead of building their own (keys share
+# a fixed number of build locks by hash, so the locks don't grow with the keys ever seen).
+#
+# An entry is rebuilt after max_age seconds, or when its health check (run when the client was idle for longer
+# than check_interval seconds) fails. At most max_clients are kept; the least recently used one is dropped first
+# (and closed, unless it was used in the last check_interval seconds and may still be in use by a run).
+# Set with the RESOURCE_CACHE_MAX_CLIENTS (default 16) and RESOURCE_CACHE_MAX_AGE (seconds, default 3600)
+# environment variables.
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CLIENTS = 16
+DEFAULT_MAX_AGE = 3600  # seconds
+CHECK_INTERVAL = 60  # seconds of idle time after which a client is health-checked before reuse
+KEY_LOCK_BUCKETS = 64
+
+class CachedClient:
+    def __init__(self, client, health_check):
+        self.client = client
+        self.health_check = health_check
+        self.created = self.last_used = time.monotonic()
+
+def close_client(client):
+    close = getattr(client, 'close', None)
+    if callable(close):
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Failed to close cached {client.__class__.__name__}: {str(e)}")
+
+class ResourceCache:
+    def __init__(self, max_clients=DEFAULT_MAX_CLIENTS, max_age=DEFAULT_MAX_AGE, check_interval=CHECK_INTERVAL):
+        self.max_clients = int(max_clients)
+        self.max_age = float(max_age)
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Reentrant, a factory may get another client whose key falls in the same bucket
+        self.key_locks = [threading.RLock() for _ in range(KEY_LOCK_BUCKETS)]
+
+    @staticmethod
+    def cache_key(kind, key_parts):
+        key_hash = hashlib.sha256('\0'.join(str(value) for value in key_parts).encode('utf-8')).hexdigest()
+        return f'{kind}:{key_hash}'
+
+    def key_lock(self, key):
+        # Keys end with a hex hash, see cache_key
+        return self.key_locks[int(key[-8:], 16) % len(self.key_locks)]
+
+    def usable(self, entry, now):
+        if now - entry.created > self.max_age:
+            return False
+        if entry.health_check is not None and now - entry.last_used > self.check_interval:
+            try:
+                return bool(entry.health_check(entry.client))
+            except Exception as e:
+                logger.info(f"Cached {entry.client.__class__.__name__} failed its health check: {str(e)}")
+                return False
+        return True
+
+    def get(self, kind, key_parts, factory, health_check=None):
+        """
+        Returns the cached client of the kind for key_parts (credentials, project, ...), or builds one with factory().
+        health_check(client) returns False (or raises) when the client can't be reused.
+        """
+        if self.max_clients <= 0:
+            return factory()
+
+        key = self.cache_key(kind, key_parts)
+        with self.key_lock(key):
+            now = time.monotonic()
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is not None and self.usable(entry, now):
+                with self.lock:
+                    entry.last_used = now
+                    if key in self.entries:
+                        self.entries.move_to_end(key)
+                return entry.client
+            if entry is not None:
+                with self.lock:
+                    self.entries.pop(key, None)
+                self.close_idle(entry, now)
+
+            client = factory()
+            evicted = []
+            with self.lock:
+                self.entries[key] = CachedClient(client, health_check)
+                while len(self.entries) > self.max_clients:
+                    evicted.append(self.entries.popitem(last=False)[1])
+            for old_entry in evicted:
+                self.close_idle(old_entry, now)
+            return client
+
+    def close_idle(self, entry, now):
+        # A client used recently may still be in use by a run, it is closed when it is garbage collected
+        if now - entry.last_used > self.check_interval:
+            close_client(entry.client)
+
+    def discard(self, kind, key_parts):
+        """
+        Drops (and closes) a cached client, e.g. after it failed with a connection error.
+        """
+        with self.lock:
+            entry = self.entries.pop(self.cache_key(kind, key_parts), None)
+        if entry is not None:
+            close_client(entry.client)
+
+    def clear(self):
+        with self.lock:
+            entries = list(self.entries.values())
+            self.entries.clear()
+        for entry in entries:
+            close_client(entry.client)
+
+def google_credentials_usable(client):
+    """
+    Health check of Google Cloud clients: expired credentials are refreshed, a client whose credentials
+    can't be refreshed any more (e.g. revoked) is rebuilt.
+    """
+    credentials = getattr(client, '_credentials', None)
+    if credentials is not None and getattr(credentials, 'expired', False):
+        from google.auth.transport.requests import Request
+        credentials.refresh(Request())
+    return True
+
+def rtb_house_client_usable(client):
+    """
+    Health check of rtbhouse_sdk clients, whose closed state is only on their private httpx client: a client
+    without one (e.g. after an SDK update renamed it) is treated as closed and rebuilt rather than reused blindly.
+    """
+    httpx_client = getattr(client, '_httpx_client', None)
+    return httpx_client is not None and getattr(httpx_client, 'is_closed', True) is False
+
+resource_cache = ResourceCache(max_clients=os.environ.get('RESOURCE_CACHE_MAX_CLIENTS', DEFAULT_MAX_CLIENTS),
+                               max_age=os.environ.get('RESOURCE_CACHE_MAX_AGE', DEFAULT_MAX_AGE))
@@ -0,0 +1,252 @@
+# Pre-load validation of rows against the connector's bq_schema(), so a batch BigQuery would reject fails the run
+# before any call to the destination instead of in a load job scheduled minutes later.
+# Checked: values of each type (numbers, booleans, DATE/DATETIME/TIMESTAMP formats), nulls in REQUIRED fields,
+# REPEATED fields that are not lists (or have null items) and RECORD values that are not objects, recursively.
+# Columns are checked with vectorized pandas operations; the columns of a ColumnBatch that typed_column could type
+# (int64, float64, bool arrays) are valid as they are and aren't looked at, and a column whose values all have a type
+# of the field (strings of a STRING, numbers of a FLOAT...) is passed after one infer_dtype over it, without a look
+# at its distinct values.
+# Columns that are not in the schema are not checked.
+# With sample_rows, a batch of more rows is checked on that many rows spread evenly over it: a value of the wrong type
+# usually comes from a column the connector types wrongly, which is in every part of the batch.
+
+from collections import namedtuple
+from datetime import date
+import numbers
+import numpy as np
+import pandas as pd
+from columnar import ColumnBatch, RECORD_TYPES
+
+# Values shown per problem
+MAX_SAMPLES = 3
+
+# column: dotted path of the field; rows: indices of the first offending rows of the batch; values: their values
+ColumnProblem = namedtuple('ColumnProblem', ['column', 'field_type', 'problem', 'count', 'rows', 'values'])
+
+NUMERIC_TYPES = {'FLOAT', 'FLOAT64', 'NUMERIC', 'BIGNUMERIC'}
+INTEGER_TYPES = {'INTEGER', 'INT64'}
+BOOLEAN_TYPES = {'BOOLEAN', 'BOOL'}
+STRING_TYPES = {'STRING', 'GEOGRAPHY'}
+# Strings BigQuery reads as special FLOAT values
+SPECIAL_FLOATS = {'nan', 'inf', '+inf', '-inf', 'infinity', '+infinity', '-infinity'}
+BOOLEAN_STRINGS = {'true', 'false', '1', '0'}
+LIST_TYPES = (list, tuple, np.ndarray)
+# infer_dtype kinds of columns that only have numbers
+NUMBER_KINDS = {'integer', 'floating', 'mixed-integer-float', 'decimal'}
+# infer_dtype kinds of columns that are valid as they are, per field type
+VALID_KINDS = {**{field_type: NUMBER_KINDS for field_type in NUMERIC_TYPES},
+               **{field_type: {'integer'} for field_type in INTEGER_TYPES},
+               **{field_type: {'boolean'} for field_type in BOOLEAN_TYPES},
+               **{field_type: {'string'} for field_type in STRING_TYPES},
+               'TIMESTAMP': {'integer', 'floating', 'mixed-integer-float'}}
+
+DATE_PATTERN = r'\d{4}-\d{1,2}-\d{1,2}'
+TIME_PATTERN = r'\d{1,2}:\d{2}(:\d{2}(\.\d{1,6})?)?'
+DATETIME_PATTERN = rf'^{DATE_PATTERN}([ T]{TIME_PATTERN})?$'
+TIMESTAMP_PATTERN = rf'^{DATE_PATTERN}([ T]{TIME_PATTERN})?\s*(Z|UTC|[+-]\d{{1,2}}(:?\d{{2}})?)?$'
+TIME_ONLY_PATTERN = rf'^{TIME_PATTERN}$'
+INTEGER_PATTERN = r'^[+-]?\d+$'
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)(e[+-]?\d+)?$'
+
+def validate_rows(data, schema, sample_rows=None):
+    """
+    Returns the ColumnProblems of a ColumnBatch or a list of row dicts, an empty list when the rows match the schema.
+    With sample_rows, only that many rows of a larger batch are checked (the counts are of the sample).
+    """
+    length = len(data)
+    problems = []
+    if not length:
+        return problems
+    positions = np.arange(length)
+    if sample_rows and length > sample_rows:
+        positions = np.unique(np.linspace(0, length - 1, int(sample_rows)).astype(np.intp))
+        data = data.take(positions) if isinstance(data, ColumnBatch) else [data[i] for i in positions.tolist()]
+        length = len(positions)
+    # Names of the columns the rows have, collected once rather than per field of the schema
+    names = data.columns.keys() if isinstance(data, ColumnBatch) else set().union(*data)
+    for field in schema:
+        typed = column_values(data, field.name) if field.name in names else None
+        if typed is None:
+            # The batch doesn't have the column: all values are null
+            if field.mode == 'REQUIRED':
+                problems.append(ColumnProblem(field.name, field.field_type, 'is missing from the rows, the field is REQUIRED',
+                                              length, positions[:MAX_SAMPLES].tolist(), [None] * min(length, MAX_SAMPLES)))
+            continue
+        values, mask = typed
+        problems.extend(validate_column(field, values, mask, positions, field.name))
+    return problems
+
+def column_values(data, name):
+    # (values, null mask) of a column, typed arrays of a ColumnBatch are kept as they are
+    if isinstance(data, ColumnBatch):
+        return data.columns.get(name)
+    series = pd.Series([row.get(name) for row in data], dtype=object)
+    return series, null_mask(series)
+
+def null_mask(series):
+    return series.isna().to_numpy(dtype=bool)
+
+def validate_column(field, values, mask, positions, column):
+    """
+    Returns the ColumnProblems of the values of a field. positions are the batch rows of the values
+    (values of nested fields come from fewer or more rows than the batch has).
+    """
+    problems = []
+    if field.mode == 'REQUIRED' and mask.any():
+        problems.append(problem(column, field, 'has nulls, the field is REQUIRED', mask, values, positions))
+
+    if isinstance(values, np.ndarray) and values.dtype != object and field.mode != 'REPEATED':
+        # Typed by ColumnBatch: int64, float64 or bool values of a field of that type
+        return problems
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+
+    if field.mode == 'REPEATED':
+        present = ~mask
+        is_list = series.map(type).isin(LIST_TYPES).to_numpy(dtype=bool)
+        bad = present & ~is_list
+        if bad.any():
+            problems.append(problem(column, field, 'has values that are not lists, the field is REPEATED', bad, series, positions))
+        items, item_positions = flatten(series[is_list], positions[is_list])
+        if not len(items):
+            return problems
+        item_mask = null_mask(items)
+        if item_mask.any():
+            problems.append(problem(f'{column}[]', field, 'has null items, REPEATED fields can\'t have them',
+                                    item_mask, items, item_positions))
+        return problems + validate_values(field, items[~item_mask], item_positions[~item_mask], f'{column}[]')
+
+    present = ~mask
+    return problems + validate_values(field, series[present], positions[present], column)
+
+def flatten(series, positions):
+    values = series.tolist()
+    lengths = np.fromiter(map(len, values), dtype=np.intp, count=len(values))
+    items = [item for value in values for item in value]
+    return pd.Series(items, dtype=object), np.repeat(positions, lengths)
+
+def validate_values(field, series, positions, column):
+    """
+    Returns the ColumnProblems of the non-null scalar (or record) values of a field.
+    """
+    if not len(series):
+        return []
+    series = series.reset_index(drop=True)
+    field_type = field.field_type
+
+    if field_type in RECORD_TYPES:
+        is_record = (series.map(type) == dict).to_numpy(dtype=bool)
+        problems = []
+        if not is_record.all():
+            problems.append(problem(column, field, 'has values that are not records (objects)', ~is_record, series, positions))
+        records, record_positions = series[is_record].tolist(), positions[is_record]
+        for subfield in field.fields:
+            name = subfield.name
+            sub_values = pd.Series([record.get(name) for record in records], dtype=object)
+            problems.extend(validate_column(subfield, sub_values, null_mask(sub_values), record_positions,
+                                            f'{column}.{subfield.name}'))
+        return problems
+
+    if pd.api.types.infer_dtype(series, skipna=True) in VALID_KINDS.get(field_type, ()):
+        return []
+    bad, description = invalid_values(field_type, distinct_values(series))
+    if bad is None or not bad.any():
+        return []
+    if len(bad) != len(series):
+        # Checked per distinct value
+        bad = series.isin(distinct_values(series)[bad]).to_numpy(dtype=bool)
+    return [problem(column, field, description, bad, series, positions)]
+
+def distinct_values(series):
+    # Columns of dates, flags or codes repeat a few values: those are checked once
+    try:
+        return pd.Series(pd.unique(series.to_numpy()), dtype=object)
+    except TypeError:
+        # Records or lists, which are not hashable
+        return series
+
+def invalid_values(field_type, series):
+    """
+    Returns (mask of the values that are not valid for the type, description of the problem).
+    """
+    if pd.api.types.infer_dtype(series, skipna=True) in VALID_KINDS.get(field_type, ()):
+        return None, None
+    if field_type in INTEGER_TYPES:
+        return ~matches(series, INTEGER_PATTERN, not_integral), 'has values that are not integers'
+    if field_type in NUMERIC_TYPES:
+        return ~matches(series, NUMBER_PATTERN, not_number), 'has values that are not numbers'
+    if field_type in BOOLEAN_TYPES:
+        return ~text(series).str.strip().str.lower().isin(BOOLEAN_STRINGS).to_numpy(dtype=bool), 'has values that are not booleans'
+    if field_type == 'DATE':
+        return invalid_dates(series), 'has values that are not dates (YYYY-MM-DD)'
+    if field_type == 'DATETIME':
+        return ~matches(series, DATETIME_PATTERN), 'has values that are not datetimes (YYYY-MM-DD[ HH:MM:SS[.ffffff]])'
+    if field_type == 'TIMESTAMP':
+        # Seconds since the epoch: Python and numpy numbers, not bools
+        seconds = series.map(is_number).to_numpy(dtype=bool)
+        return ~(seconds | matches(series, TIMESTAMP_PATTERN)), 'has values that are not timestamps'
+    if field_type == 'TIME':
+        return ~matches(series, TIME_ONLY_PATTERN), 'has values that are not times (HH:MM:SS)'
+    if field_type in STRING_TYPES:
+        return series.map(type).isin((dict,) + LIST_TYPES).to_numpy(dtype=bool), 'has records or lists, the field is a STRING'
+    return None, None
+
+def is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_))
+
+def text(series):
+    # Strings as they are, other values (bools, numbers, dates) as str() writes them
+    return series.astype(str)
+
+def matches(series, pattern, recheck=None):
+    """
+    Returns the mask of the values that match the pattern. The values that don't are passed to recheck(values),
+    which returns the mask of the ones that are still invalid, for the rare forms the pattern leaves out.
+    """
+    matched = np.array(text(series).str.match(pattern, case=False), dtype=bool)
+    if recheck is not None and not matched.all():
+        unmatched = np.flatnonzero(~matched)
+        matched[unmatched] = ~recheck(series.iloc[unmatched])
+    return matched
+
+def not_integral(values):
+    numbers = pd.to_numeric(values, errors='coerce')
+    return (numbers.isna() | (np.mod(numbers.fillna(0), 1) != 0)).to_numpy(dtype=bool)
+
+def not_number(values):
+    return (pd.to_numeric(values, errors='coerce').isna()
+            & ~text(values).str.strip().str.lower().isin(SPECIAL_FLOATS)).to_numpy(dtype=bool)
+
+def invalid_dates(series):
+    strings = text(series)
+    bad = pd.to_datetime(strings, format='%Y-%m-%d', errors='coerce').isna().to_numpy(dtype=bool)
+    for index in np.flatnonzero(bad).tolist():
+        # Dates pandas can't represent (before 1677 or after 2262) are checked one by one
+        parts = strings.iat[index].split('-')
+        if len(parts) != 3 or len(parts[0]) != 4:
+            continue
+        try:
+            date(*map(int, parts))
+        except ValueError:
+            continue
+        bad[index] = False
+    return bad
+
+def problem(column, field, description, bad, series, positions):
+    indices = np.flatnonzero(bad)
+    samples = indices[:MAX_SAMPLES].tolist()
+    return ColumnProblem(column, field.field_type, description, len(indices), positions[samples].tolist(),
+                         [series.iat[i] if isinstance(series, pd.Series) else series[i] for i in samples])
+
+def describe(problems, data=None):
+    """
+    Returns the report of the problems: the offending columns with sample values, and the first offending row.
+    """
+    lines = []
+    for item in problems:
+        samples = ', '.join(f'row {row}: {value!r}' for row, value in zip(item.rows, item.values))
+        lines.append(f"  {item.column} ({item.field_type}) {item.problem}: {item.count} values, e.g. {samples}")
+    if data is not None and problems and problems[0].rows:
+        row = problems[0].rows[0]
+        row_values = data.take([row]).rows()[0] if isinstance(data, ColumnBatch) else data[row]
+        lines.append(f'  row {row}: {str(row_values)[:500]}')
+    return '\n'.join(lines)
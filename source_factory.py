@@ -1,48 +1,52 @@
 # The "Source" class enables the creation of a source object based on the connector name from HTTP trigger.
 # This way we can publish code once, and use it for any connectors.
+# Connector modules are imported lazily, only when a connector is requested, so a cold start
+# doesn't load the SDKs of all the other connectors (facebook_business, rtbhouse_sdk, GA4, pandas, etc.).
+# The connectors and their required fields are listed in connector_specs.py.
 
-from sources.admitad import Admitad
-from sources.esputnik import eSputnik
-from sources.rtb_house import RTBHouse
-from sources.asa import AppleSearchAds
-from sources.currency_rates import CurrencyRates
-from sources.appsflyer import AppsFlyer
-from sources.google_play import GooglePlay
-from sources.tiktok import TikTok
-from sources.pazaruvaj import Pazaruvaj
-from sources.planfix import Planfix
-from sources.yandex_direct import YandexDirect
-from sources.meta_ads import MetaAds
-from sources.google_ads import GoogleAds
-from sources.youtube_ads import YouTubeAds
-from sources.google_analytics_4 import GoogleAnalytics4
+from importlib import import_module
+from connector_specs import CONNECTORS, required_fields_of
+
+# Fields that AbstractSource fills with defaults, so they may be missing from the request
+DEFAULTED_FIELDS = {'date_from', 'date_to'}
 
 class Source:
     def __init__(self, config):
         self.config = config
 
+    @staticmethod
+    def get_spec(connector_name):
+        if connector_name not in CONNECTORS:
+            raise ValueError(f"Unsupported API type: {connector_name}")
+
+        return CONNECTORS[connector_name]
+
+    @staticmethod
+    def required_fields(connector_name):
+        """
+        Returns the required config fields of a connector without importing it.
+        """
+        Source.get_spec(connector_name)
+        return required_fields_of(connector_name)
+
+    @staticmethod
+    def validate_config(config):
+        """
+        Checks the connector name and required fields before the connector module is imported.
+        """
+        spec = Source.get_spec(config.get("connector"))
+        for field in spec.required_fields:
+            if field not in config and field not in DEFAULTED_FIELDS:
+                raise ValueError(f"Missing required field: {field}")
+
+    @staticmethod
+    def connector_class(connector_name):
+        spec = Source.get_spec(connector_name)
+        module = import_module(spec.module)
+
+        return getattr(module, spec.class_name)
+
     @staticmethod
     def connector(config):
-        connector_classes = {
-            'admitad': Admitad,
-            'esputnik': eSputnik,
-            'rtb_house': RTBHouse,
-            'asa': AppleSearchAds,
-            'currency': CurrencyRates,
-            'appsflyer': AppsFlyer,
-            'google_play': GooglePlay,
-            'tiktok': TikTok,
-            'pazaruvaj': Pazaruvaj,
-            'planfix': Planfix,
-            'yandex_direct': YandexDirect,
-            'meta_ads': MetaAds,
-            'google_ads': GoogleAds,
-            'youtube_ads': YouTubeAds,
-            'google_analytics_4': GoogleAnalytics4,
-        }
-
-        if config["connector"] not in connector_classes:
-            raise ValueError(f"Unsupported API type: {config['connector']}")
-
-        connector_class = connector_classes[config["connector"]]
+        connector_class = Source.connector_class(config.get("connector"))
         return connector_class(config)
@@ -1,36 +1,39 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
+from token_cache import get_access_token
 from google.cloud import bigquery
-import requests
-from pandas import date_range
 
 class Admitad(AbstractSource):
+    max_days_per_request = 1
+    parallel_chunks = True
+    required_fields = required_fields_of('admitad')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "client_id", "client_secret", "customer_id", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-         
-    def authenticate(self):
+    def authenticate(self, refresh=False):
         """
         Authenticates the user by sending a request to the Admitad API and retrieves an access token.
+        The token is cached until shortly before it expires, refresh requests a new one.
         """
         
+        endpoint = 'https://api.admitad.com/token/'
         data = {'client_id': self.config.get("client_id"),
                 'client_secret': self.config.get("client_secret"),
                 'scope': 'advertiser_statistics',
                 'grant_type': 'client_credentials'}
         headers = {'content-type': 'application/x-www-form-urlencoded'}
-        r = requests.post('https://api.admitad.com/token/',
-                          data=data,
-                          headers=headers)
-        token = r.json()['access_token']
+
+        def request_token():
+            r = self.http.post(endpoint,
+                              data=data,
+                              headers=headers)
+            response = r.json()
+            return response['access_token'], response.get('expires_in')
+
+        token = get_access_token(endpoint, data['client_id'], (data['client_secret'], data['scope']), request_token,
+                                 refresh=refresh)
 
         return token
 
@@ -41,9 +44,10 @@ class Admitad(AbstractSource):
         
         params = {'start_date': date, 'end_date': date, 'order_by': 'date'}
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-        r = requests.get(f'https://api.admitad.com/advertiser/{self.config.get("customer_id")}/statistics/dates/',
+        r = self.http.get(f'https://api.admitad.com/advertiser/{self.config.get("customer_id")}/statistics/dates/',
                          params=params,
                          headers=headers)
+        r.raise_for_status()
         content = r.json()['results']
 
         return content
@@ -51,20 +55,17 @@ class Admitad(AbstractSource):
     def transform_data(self):
         pass
     
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
-        Fetches statistics data for all dates within the specified date range.
+        Fetches statistics data for all dates within the specified date range, one date per request.
         """
         
         self.validate_input()
-        token = self.authenticate()
-
-        data = []
-        for date in date_range(self.config.get("date_from"), self.config.get("date_to")).strftime('%Y-%m-%d'):
-            data.extend(self.fetch_data(date, token))
 
-        return data
+        yield from self.map_date_chunks(
+            lambda date_from, date_to: [self.with_token(lambda token: self.fetch_data(date_from, token))])
 
+    @cached_schema()
     def bq_schema(self):
         schema_admitad = [
         bigquery.SchemaField("date", "DATE", mode="NULLABLE"),
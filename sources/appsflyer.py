@@ -1,59 +1,58 @@
-from abstract_source import AbstractSource
-import requests
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 import pandas as pd
-import io
 import simplejson
+from columnar import ColumnBatch
 from google.cloud import bigquery
 
 class AppsFlyer(AbstractSource):
+    # Raw data exports cover up to 90 days; chunks are fetched one by one because of the API rate limits
+    max_days_per_request = 90
+    required_fields = required_fields_of('appsflyer')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "app_id", "api_key", "date_from", "date_to", "report_name"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         pass
 
-    def fetch_data(self, api_key):
+    def fetch_data(self, api_key, date_from, date_to):
         """
-        Fetches data from the AppsFlyer API using the provided API key.
+        Fetches data from the AppsFlyer API using the provided API key, yields it as DataFrames of batch_size rows.
         """
         
         def api_path(report_name):        
             report_paths = {
-                "non_organic_installs": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/installs_report/v5?from={self.config["date_from"]}&to={self.config["date_to"]}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,contributor1_match_type,contributor2_match_type,contributor3_match_type,match_type,device_category,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
-                "organic_installs": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/organic_installs_report/v5?from={self.config["date_from"]}&to={self.config["date_to"]}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
-                "non_organic_events": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/in_app_events_report/v5?from={self.config["date_from"]}&to={self.config["date_to"]}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,contributor1_match_type,contributor2_match_type,contributor3_match_type,match_type,device_category,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
-                "organic_events": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/organic_in_app_events_report/v5?from={self.config["date_from"]}&to={self.config["date_to"]}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,amazon_aid,keyword_match_type,att,conversion_type,campaign_type&maximum_rows=1000000',
-                "postbacks": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/postbacks/v5?from={self.config["date_from"]}&to={self.config["date_to"]}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,device_download_time,install_app_store,match_type,contributor1_match_type,contributor2_match_type,contributor3_match_type,device_category,postback_retry,att,is_lat&maximum_rows=1000000'
+                "non_organic_installs": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/installs_report/v5?from={date_from}&to={date_to}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,contributor1_match_type,contributor2_match_type,contributor3_match_type,match_type,device_category,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
+                "organic_installs": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/organic_installs_report/v5?from={date_from}&to={date_to}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
+                "non_organic_events": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/in_app_events_report/v5?from={date_from}&to={date_to}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,install_app_store,contributor1_match_type,contributor2_match_type,contributor3_match_type,match_type,device_category,gp_referrer,gp_click_time,gp_install_begin,amazon_aid,keyword_match_type,att,conversion_type,campaign_type,is_lat&maximum_rows=1000000',
+                "organic_events": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/organic_in_app_events_report/v5?from={date_from}&to={date_to}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,amazon_aid,keyword_match_type,att,conversion_type,campaign_type&maximum_rows=1000000',
+                "postbacks": f'https://hq1.appsflyer.com/api/raw-data/export/app/{self.config["app_id"]}/postbacks/v5?from={date_from}&to={date_to}&additional_fields=device_model,keyword_id,store_reinstall,deeplink_url,oaid,device_download_time,install_app_store,match_type,contributor1_match_type,contributor2_match_type,contributor3_match_type,device_category,postback_retry,att,is_lat&maximum_rows=1000000'
             }
             
             return f'{report_paths[report_name]}'
         
         headers = {"authorization": "Bearer " + api_key}
-        request_data=requests.get(api_path(self.config["report_name"]), headers=headers)
-        
-        content = pd.read_csv(io.StringIO(request_data.text), low_memory=False)
-        return content
+        # The export can be up to 1M rows, so the CSV is read from the stream in chunks instead of as one DataFrame.
+        # The response is closed once the chunks are read (or the generator is closed); low_memory=False types
+        # each column of a chunk from all of its rows, as the whole export was before
+        with self.http.get(api_path(self.config["report_name"]), headers=headers, stream=True) as request_data:
+            request_data.raise_for_status()
+            request_data.raw.decode_content = True
+            yield from pd.read_csv(request_data.raw, chunksize=int(self.config['batch_size']), low_memory=False)
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
-        Fetches all data from the AppsFlyer API using the configured API key.
+        Fetches all data from the AppsFlyer API using the configured API key, chunk by chunk.
         """
         self.validate_input()
-        data = self.fetch_data(self.config['api_key'])
-        
-        data = self.transform_data(data)
 
-        return data
+        def fetch_chunk(date_from, date_to):
+            for df in self.fetch_data(self.config['api_key'], date_from, date_to):
+                yield self.transform_data(df)
+        
+        yield from self.map_date_chunks(fetch_chunk)
 
     def transform_data(self, df):
         """
@@ -101,7 +100,8 @@ class AppsFlyer(AbstractSource):
                 row['event_value'] = [{'key': None, 'value': [{'string_value': None, 'int_value': None, 'float_value': None, 'bool_value': None}]}]
             else:
                 try:
-                    tmp_json = simplejson.loads(row['event_value'])
+                    # NaN and Infinity are not valid JSON for the load, they are read as nulls
+                    tmp_json = simplejson.loads(row['event_value'], parse_constant=lambda constant: None)
                 except simplejson.errors.JSONDecodeError:
                     print(f"JSONDecodeError on row: {row['event_value']}")
                     row['event_value'] = [{'key': None, 'value': [{'string_value': None, 'int_value': None, 'float_value': None, 'bool_value': None}]}]
@@ -132,11 +132,9 @@ class AppsFlyer(AbstractSource):
 
             final_dict.append(row)
 
-        final_dict = simplejson.dumps(final_dict, ignore_nan=True)
-        final_dict = simplejson.loads(final_dict)
-
-        return final_dict
+        return ColumnBatch.from_rows(final_dict, self.bq_schema())
     
+    @cached_schema()
     def bq_schema(self):
         schema = [
             bigquery.SchemaField('date', 'DATE', mode='NULLABLE'),
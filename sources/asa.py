@@ -1,37 +1,43 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
+from token_cache import get_access_token
 from google.cloud import bigquery
-import requests
 import re
+import requests
 
 class AppleSearchAds(AbstractSource):
+    # Daily granularity reports are limited to 90 days
+    max_days_per_request = 90
+    parallel_chunks = True
+    required_fields = required_fields_of('asa')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "client_id", "client_secret", "org_id", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
-    def authenticate(self):
+    def authenticate(self, refresh=False):
         """
         Authenticates with the Apple Search Ads API and retrieves an access token.
+        The token is cached until shortly before it expires, refresh requests a new one.
         """
         
+        endpoint = 'https://appleid.apple.com/auth/oauth2/token'
         request_params = {'client_id': self.config["client_id"],
                           'client_secret': self.config["client_secret"],
                           'grant_type': 'client_credentials',
                           'scope': 'searchadsorg'}
-        r = requests.post(url='https://appleid.apple.com/auth/oauth2/token',
-                          params=request_params,
-                          headers={'Host': 'appleid.apple.com',
-                                   'Content-Type': 'application/x-www-form-urlencoded'
-                                   })
-        token = r.json()['access_token']
+
+        def request_token():
+            r = self.http.post(url=endpoint,
+                              params=request_params,
+                              headers={'Host': 'appleid.apple.com',
+                                       'Content-Type': 'application/x-www-form-urlencoded'
+                                       })
+            response = r.json()
+            return response['access_token'], response.get('expires_in')
+
+        token = get_access_token(endpoint, request_params['client_id'], (request_params['client_secret'],), request_token,
+                                 refresh=refresh)
 
         return token
 
@@ -65,7 +71,7 @@ class AppleSearchAds(AbstractSource):
             "returnGrandTotals": 'false'
         }
 
-        r = requests.post(url='https://api.searchads.apple.com/api/v4/reports/campaigns',
+        r = self.http.post(url='https://api.searchads.apple.com/api/v4/reports/campaigns',
                         json=params,
                         headers={
                             'Authorization': f'Bearer {token}',
@@ -74,7 +80,7 @@ class AppleSearchAds(AbstractSource):
         
         # Check if the request was successful
         if r.status_code != 200:
-            raise Exception(f"API request failed with status code {r.status_code}: {r.text}")
+            raise requests.HTTPError(f"API request failed with status code {r.status_code}: {r.text}", response=r)
 
         response_json = r.json()
 
@@ -130,17 +136,16 @@ class AppleSearchAds(AbstractSource):
 
         return results
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
         Fetches and transforms all campaign data within the specified date range.
         """
         self.validate_input()
-        token = self.authenticate()
-        data = self.fetch_data(token, self.config['date_from'], self.config['date_to'])
-        data = self.transform_data(data)
 
-        return data
+        yield from self.map_date_chunks(lambda date_from, date_to: [
+            self.transform_data(self.with_token(lambda token: self.fetch_data(token, date_from, date_to)))])
 
+    @cached_schema()
     def bq_schema(self):
         schema_asa = [
             bigquery.SchemaField("date", "DATE", mode="NULLABLE"),
@@ -1,62 +1,67 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
-import requests
 
 class CurrencyRates(AbstractSource):
+    # The timeframe endpoint accepts at most 365 days
+    max_days_per_request = 365
+    parallel_chunks = True
+    required_fields = required_fields_of('currency')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "date_from", "date_to", "from_currency", "to_currency", "api_key"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         pass
 
-    def fetch_data(self):
-        pass
-
-    def transform_data(self):
-        pass
-    
-    def fetch_all_data(self):
+    def fetch_data(self, date_from, date_to):
         """
-        Fetches currency data from an external API and returns it in a specific format.
+        Fetches currency rates for the date range from an external API.
         """
-        self.validate_input()
         endpoint = 'https://api.apilayer.com/currency_data/timeframe'
 
         params = {'currencies': self.config['to_currency'],
                   'source': self.config['from_currency'],
-                  'start_date': self.config['date_from'],
-                  'end_date': self.config['date_to']
+                  'start_date': date_from,
+                  'end_date': date_to
                   }
         headers = {'apikey': self.config['api_key']}
 
-        r = requests.get(endpoint, params=params, headers=headers)
+        r = self.http.get(endpoint, params=params, headers=headers)
+
+        if r.json().get("success"):
+            return r.json()
+        else:
+            raise Exception(f"API request failed: {r.text}")
 
-        # Parse exchange rates from the response, dynamically based on the 'to_currency' field
+    def transform_data(self, response):
+        """
+        Parses exchange rates from the response, dynamically based on the 'to_currency' field.
+        """
         to_currencies = self.config['to_currency'].split(',')
         from_currency = self.config['from_currency']
 
-        if r.json().get("success"):
-            data = []
-            quotes = r.json().get('quotes', {})
-            for date, quote in quotes.items():
-                entry = {'date': date}
-                for to_currency in to_currencies:
-                    currency_pair = f'{from_currency}{to_currency}'
-                    entry[currency_pair] = quote.get(currency_pair, None)
-                data.append(entry)
-                
+        data = []
+        quotes = response.get('quotes', {})
+        for date, quote in quotes.items():
+            entry = {'date': date}
+            for to_currency in to_currencies:
+                currency_pair = f'{from_currency}{to_currency}'
+                entry[currency_pair] = quote.get(currency_pair, None)
+            data.append(entry)
+
         return data
     
+    def fetch_batches(self):
+        """
+        Fetches currency data from an external API and yields it in a specific format.
+        """
+        self.validate_input()
+
+        yield from self.map_date_chunks(lambda date_from, date_to: [self.transform_data(self.fetch_data(date_from, date_to))])
+    
+    @cached_schema('from_currency', 'to_currency')
     def bq_schema(self):
         to_currencies = self.config['to_currency'].split(',')
         from_currency = self.config['from_currency']
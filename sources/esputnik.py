@@ -1,25 +1,19 @@
-import requests
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
+from columnar import row_converter
 import re
 from datetime import datetime, timedelta
 
 class eSputnik(AbstractSource):
+    required_fields = required_fields_of('esputnik')
+
     def __init__(self, config):
         super().__init__(config)
         self.config.setdefault('date_from', datetime.strftime(datetime.now() - timedelta(days=4), '%Y-%m-%d'))
         self.config.setdefault('date_to', datetime.strftime(datetime.now() - timedelta(days=0), '%Y-%m-%d'))
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "username", "token", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         pass
 
@@ -32,15 +26,15 @@ class eSputnik(AbstractSource):
         creds = (self.config['username'], self.config['token'])
         headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
         
-        response = requests.get(endpoint, auth=creds, headers=headers, timeout=120)
+        response = self.http.get(endpoint, auth=creds, headers=headers, timeout=120)
         print(response.status_code)
         print(response.text)
         content = response.json() if response else []  # Parse JSON if the response is not None
         return content
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """"
-        Fetches all data from the Esputnik API
+        Fetches all data from the Esputnik API, page by page
         """
         
         self.validate_input()
@@ -53,16 +47,13 @@ class eSputnik(AbstractSource):
                 offset = content[-1].get('offset', '')
             return offset
     
-        data = []
-        content = self.fetch_data()  # Make the initial API request
+        content = self.fetch_data(self.resume_cursor(''))  # Make the initial API request (or continue a checkpointed run)
         
         while content: # If we have 0 results, we reached the end of the data
             offset = get_offset(content)
-            data.extend(content)  # Append all items from content to results
+            self.save_cursor(offset)
+            yield self.transform_data(content)  # Hand over the page before requesting the next one
             content = self.fetch_data(offset)  # Make subsequent requests with the new offset
-        transformed_data = self.transform_data(data)
-        
-        return transformed_data
     
     def transform_data(self, data):
         """
@@ -84,7 +75,8 @@ class eSputnik(AbstractSource):
             new_record = {camel_to_snake(k): v for k, v in record.items()}
             return new_record
         
-        transformed_data = [transform_record(record) for record in data]
+        convert = row_converter(self.bq_schema())
+        transformed_data = [convert(transform_record(record)) for record in data]
         
         # Remove all columns that are not in the schema
         #bq_columns = [column.name for column in self.bq_schema()]
@@ -92,6 +84,7 @@ class eSputnik(AbstractSource):
         
         return transformed_data
 
+    @cached_schema()
     def bq_schema(self):
         schema_esputnik = [
             bigquery.SchemaField('date', 'DATE', 'NULLABLE', None, None, (), None),
@@ -1,17 +1,22 @@
-from abstract_source import AbstractSource
-import requests
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
+from token_cache import get_access_token
 from google.cloud import bigquery
-from pandas import date_range
 
 # Each report has its own class and uses authentication and data fetching methods from the parent class, or replaces them with its own methods.
 # So in the end each report class has only custom settings and doesn't need to implement every method from scratch.
 # It's called factory pattern.
 
 class GoogleAds(AbstractSource):
+    parallel_chunks = True
+    required_fields = required_fields_of('google_ads')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         self.report = GoogleAds.get_report_class(self.config["report"])
+        # click_view can only be queried for a single day
+        self.max_days_per_request = 1 if self.config["report"] == 'click_view' else 31
 
     @staticmethod
     def get_report_class(report_type):
@@ -28,18 +33,9 @@ class GoogleAds(AbstractSource):
 
         return report_classes[report_type]
 
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "client_id", "client_secret", "customer_id", "developer_token", "login_customer_id", "refresh_token", "report", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
-    def authenticate(self):
+    def authenticate(self, refresh=False):
         '''
-        Refreshes the Google Ads request token
+        Refreshes the Google Ads request token, or takes it from the token cache while it's still valid (and not refresh)
         '''
 
         endpoint = 'https://oauth2.googleapis.com/token'
@@ -50,8 +46,14 @@ class GoogleAds(AbstractSource):
             'refresh_token': self.config["refresh_token"],
             'grant_type': 'refresh_token'
         }
-        r = requests.post(endpoint, data=body, headers=headers, timeout=45)
-        token = r.json()['access_token']
+
+        def request_token():
+            r = self.http.post(endpoint, data=body, headers=headers, timeout=45)
+            response = r.json()
+            return response['access_token'], response.get('expires_in')
+
+        token = get_access_token(endpoint, self.config["client_id"],
+                                 (self.config["client_secret"], self.config["refresh_token"]), request_token, refresh=refresh)
 
         return token
     
@@ -68,26 +70,28 @@ class GoogleAds(AbstractSource):
             'login-customer-id': self.config["login_customer_id"]
         }
                 
-        request = requests.post(url, json=query, headers=headers, timeout=45)
+        request = self.http.post(url, json=query, headers=headers, timeout=45)
         request.raise_for_status()
         
         result = request.json()
 
         return result
 
-    def fetch_all_data(self):
-        token = self.authenticate()
-        
+    def fetch_chunk(self, date_from, date_to):
         # For GoogleAdsClickViewReport we need to pass the date to the get_query method, 1 day at a time. This class is the only one that needs this.
         if self.config["report"] == 'click_view':
-            dates = date_range(start=self.config["date_from"], end=self.config["date_to"]).strftime("%Y-%m-%d").tolist()
-            data = [self.fetch_data(token, self.report.get_query(self, date)) for date in dates]
+            query = self.report.get_query(self, date_from)
+            yield self.report.transform_data(self, [self.with_token(lambda token: self.fetch_data(token, query))])
         else:
-            data = self.fetch_data(token, self.report.get_query(self)) 
-        
-        transformed_data = self.report.transform_data(self, data)
+            query = self.report.get_query(self, date_from, date_to)
+            data = self.with_token(lambda token: self.fetch_data(token, query))
+
+            # searchStream returns the rows split into batches, so we transform and hand them over one by one
+            for batch in data:
+                yield self.report.transform_data(self, [batch])
 
-        return transformed_data
+    def fetch_batches(self):
+        yield from self.map_date_chunks(self.fetch_chunk)
     
     @staticmethod
     def bq_schema(self):
@@ -123,7 +127,7 @@ class GoogleAdsCampaignsReport(GoogleAds):
                 
         return data_list
 
-    def get_query(self):
+    def get_query(self, date_from, date_to):
         query = {'query': f"""
             SELECT segments.date,
             customer.descriptive_name,
@@ -139,12 +143,13 @@ class GoogleAdsCampaignsReport(GoogleAds):
             metrics.clicks,
             metrics.cost_micros
             FROM ad_group_ad 
-            WHERE segments.date BETWEEN '{self.config["date_from"]}' AND '{self.config["date_to"]}'
+            WHERE segments.date BETWEEN '{date_from}' AND '{date_to}'
             """
             }
         
         return query
     
+    @cached_schema()
     def bq_schema(self):
         campaigns_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
@@ -188,7 +193,7 @@ class GoogleAdsCampaignPerformanceReport(GoogleAds):
                 
         return result_list
 
-    def get_query(self):       
+    def get_query(self, date_from, date_to):       
         query = {'query': f"""
             SELECT
             segments.date,
@@ -201,13 +206,14 @@ class GoogleAdsCampaignPerformanceReport(GoogleAds):
             metrics.clicks,
             metrics.cost_micros
             FROM campaign
-            WHERE segments.date BETWEEN '{self.config["date_from"]}' AND '{self.config["date_to"]}'
+            WHERE segments.date BETWEEN '{date_from}' AND '{date_to}'
             AND campaign.advertising_channel_type = 'PERFORMANCE_MAX'
             """
             }
         
         return query
     
+    @cached_schema()
     def bq_schema(self):
         campaigns_performance_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
@@ -253,7 +259,7 @@ class GoogleAdsKeywordsReport(GoogleAds):
 
         return result_list
         
-    def get_query(self):        
+    def get_query(self, date_from, date_to):        
         query = {'query': f"""
             SELECT
             segments.date,
@@ -274,12 +280,13 @@ class GoogleAdsKeywordsReport(GoogleAds):
             metrics.clicks,
             metrics.cost_micros
             FROM ad_group_ad
-            WHERE segments.date BETWEEN '{self.config["date_from"]}' AND '{self.config["date_to"]}'
+            WHERE segments.date BETWEEN '{date_from}' AND '{date_to}'
             """
             }
         
         return query
     
+    @cached_schema()
     def bq_schema(self):
         campaigns_keywords_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
@@ -329,7 +336,7 @@ class GoogleAdsCallsReport(GoogleAds):
 
         return data_list
 
-    def get_query(self):
+    def get_query(self, date_from, date_to):
         query = {'query': f"""
             SELECT
             segments.date,
@@ -347,13 +354,14 @@ class GoogleAdsCallsReport(GoogleAds):
             metrics.clicks,
             metrics.cost_micros
             FROM ad_group_ad
-            WHERE segments.date BETWEEN '{self.config["date_from"]}' AND '{self.config["date_to"]}'
+            WHERE segments.date BETWEEN '{date_from}' AND '{date_to}'
             and ad_group_ad.ad.type = 'CALL_AD'
             """
             }
         
         return query
     
+    @cached_schema()
     def bq_schema(self):
         calls_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
@@ -427,6 +435,7 @@ class GoogleAdsClickViewReport(GoogleAds):
         
         return query
     
+    @cached_schema()
     def bq_schema(self):
         click_view_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
@@ -1,32 +1,34 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import RunReportRequest, DateRange, Metric, Dimension
 from datetime import datetime
+from columnar import row_converter
+from resource_cache import resource_cache, google_credentials_usable
+import os
 
 
 class GoogleAnalytics4(AbstractSource):
+    # Requests go through the GA4 Data API client, not self.http
+    replayable = False
+    required_fields = required_fields_of('google_analytics_4')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
 
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "date_from", "date_to", "property_id", "dimensions", "metrics"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
-        client = BetaAnalyticsDataClient()
+        # One client (and gRPC channel) per credentials, reused by the runs of a warm instance
+        client = resource_cache.get('ga4', [os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '')], BetaAnalyticsDataClient,
+                                    health_check=google_credentials_usable)
         return client
 
     def fetch_data(self):
         pass
 
     def transform_data(self, response):
+        convert = row_converter(self.bq_schema())
         data = []
         for row in response.rows:
             row_data = {}
@@ -38,23 +40,13 @@ class GoogleAnalytics4(AbstractSource):
                     # Reformat value from 'YYYYMMDD' to 'YYYY-MM-DD'
                     value = datetime.strptime(value, '%Y%m%d').strftime('%Y-%m-%d')
                 row_data[dim_name] = value
-            # Process metrics
+            # Process metrics, typed by the schema converter
             for i in range(len(row.metric_values)):
-                metric_name = self.config["metrics"][i]
-                value = row.metric_values[i].value
-                # Convert metric values to int, then float, then keep as string
-                try:
-                    value = int(value)
-                except ValueError:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        pass  # Keep as string if conversion fails
-                row_data[metric_name] = value
-            data.append(row_data)
+                row_data[self.config["metrics"][i]] = row.metric_values[i].value
+            data.append(convert(row_data))
         return data
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
         Fetches data from the Google Analytics 4 API.
         """
@@ -78,10 +70,9 @@ class GoogleAnalytics4(AbstractSource):
         client = self.authenticate()
         response = client.run_report(request)
     
-        data = self.transform_data(response)
-        
-        return data
+        yield self.transform_data(response)
 
+    @cached_schema('dimensions', 'metrics')
     def bq_schema(self):
         schema_ga4 = []            
         for dim in self.config["dimensions"]:
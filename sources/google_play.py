@@ -1,33 +1,32 @@
 # Not tested on real projects. The code was written based on the previous Google Play connector.
 
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery, storage
 from datetime import datetime
 from io import StringIO
 import pandas as pd
-import simplejson
+from columnar import ColumnBatch
+from resource_cache import resource_cache, google_credentials_usable
 import numpy as np
 
 class GooglePlay(AbstractSource):
+    # Reports are read from a Cloud Storage bucket, which already keeps the raw files
+    replayable = False
+    required_fields = required_fields_of('google_play')
+
     def __init__(self, config):
         super().__init__(config)
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        
-        required_fields = ["netpeak_client", "source_project_id", "bucket_id", "date_from", "date_to", "report", "package_name"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-    
     def authenticate(self):
         """
         Authenticates the user with the Google Play API.
         """
         
-        storage_client = storage.Client(project=self.config['source_project_id'])
+        # One client per project, reused by the runs of a warm instance
+        storage_client = resource_cache.get('storage', [self.config['source_project_id']],
+                                            lambda: storage.Client(project=self.config['source_project_id']),
+                                            health_check=google_credentials_usable)
 
         return storage_client
 
@@ -62,7 +61,7 @@ class GooglePlay(AbstractSource):
                             'developer_reply_text': 'reply_text'}, inplace=True)
 
             df['submit_date'] = pd.to_datetime(df['submit_date'])
-            df['date'] = df['submit_date'].dt.date.strftime('%Y-%m-%d')
+            df['date'] = df['submit_date'].dt.strftime('%Y-%m-%d')
             df['update_date'] = pd.to_datetime(df['update_date'])
             df['reprly_date'] = pd.to_datetime(df['reprly_date'])
             df['review_title'] = df['review_title'].astype(str)
@@ -104,7 +103,7 @@ class GooglePlay(AbstractSource):
             
             df['submit_date'] = df['submit_date'].apply(lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S%z').strftime('%Y-%m-%d %H:%M:%S'))
             df['update_date'] = df['update_date'].apply(lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S%z').strftime('%Y-%m-%d %H:%M:%S'))
-            df['reprly_date'] = df['reprly_date'].apply(lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S%z').strftime('%Y-%m-%d %H:%M:%S') if x != 'NaT' else None)
+            df['reprly_date'] = df['reprly_date'].apply(lambda x: datetime.strptime(x, '%Y-%m-%d %H:%M:%S%z').strftime('%Y-%m-%d %H:%M:%S') if isinstance(x, str) and x != 'NaT' else None)
         else:
             if date_from is not None and date_to is not None:
                 df['date'] = pd.to_datetime(df['date'])
@@ -114,36 +113,29 @@ class GooglePlay(AbstractSource):
         df = df.replace('nan', pd.NA)
         df = df.replace('NaT', pd.NA)
 
-        dict_file = df.to_dict(orient='records')
-        
-        dict_file = simplejson.dumps(dict_file, ignore_nan=True)
-        dict_file = simplejson.loads(dict_file)
-
-        return dict_file
+        return ColumnBatch.from_frame(df, self.bq_schema())
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         '''
-        Fetches and transforms all data from the Google Play Console for the specified date range
+        Fetches and transforms all data from the Google Play Console for the specified date range, one monthly file at a time
         '''
         self.validate_input()
         
         storage_client = self.authenticate()
         year_months = pd.date_range(self.config['date_from'], self.config['date_to']).strftime('%Y%m').unique().tolist()
-        dataframes = [self.fetch_data(storage_client=storage_client,
-                                      bucket_id=self.config['bucket_id'],
-                                      report=self.config['report'],
-                                      package_name=self.config['package_name'],
-                                      year_month=year_month) for year_month in year_months]
-        data = pd.concat(dataframes, ignore_index=True)
-        del dataframes
+        for year_month in year_months:
+            df = self.fetch_data(storage_client=storage_client,
+                                 bucket_id=self.config['bucket_id'],
+                                 report=self.config['report'],
+                                 package_name=self.config['package_name'],
+                                 year_month=year_month)
         
-        data = self.transform_data(df=data,
-                                        date_from=self.config['date_from'],
-                                        date_to=self.config['date_to'],
-                                        report=self.config['report'])
-
-        return data
+            yield self.transform_data(df=df,
+                                      date_from=self.config['date_from'],
+                                      date_to=self.config['date_to'],
+                                      report=self.config['report'])
 
+    @cached_schema('report')
     def bq_schema(self):
         '''
         Returns the schema depending on which report is needed
@@ -1,34 +1,40 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
+from columnar import row_converter
 from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.adobjects.adreportrun import AdReportRun
 from facebook_business.adobjects.adsinsights import AdsInsights
 from facebook_business.api import FacebookAdsApi
+from facebook_business.session import FacebookSession
+from resource_cache import resource_cache
 import time
 
 class MetaAds(AbstractSource):
+    max_days_per_request = 31
+    parallel_chunks = True
+    # Requests go through the facebook_business SDK, not self.http
+    replayable = False
+    required_fields = required_fields_of('meta_ads')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
+    def authenticate(self):
         """
-        Validates the configuration file.
+        Returns the API object of the app and access token, reused by the runs of a warm instance.
         """
-        required_fields = ["netpeak_client", "access_token", "account_id", "app_id", "app_secret", "country", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
-    def authenticate(self):
-        pass
+        # Not FacebookAdsApi.init, which sets the default API of the process for all accounts
+        credentials = [self.config["app_id"], self.config["app_secret"], self.config["access_token"]]
+        return resource_cache.get('meta', credentials,
+                                  lambda: FacebookAdsApi(FacebookSession(*credentials), api_version='v20.0'))
 
-    def fetch_data(self):
+    def fetch_data(self, date_from, date_to):
         """
         Fetches data from the Meta API.
         """
-        FacebookAdsApi.init(self.config["app_id"], self.config["app_secret"], self.config["access_token"], api_version='v20.0')
-        account = AdAccount('act_'+str(self.config["account_id"]))
+        account = AdAccount('act_'+str(self.config["account_id"]), api=self.authenticate())
 
         job = account.get_insights(fields=[
                 AdsInsights.Field.account_id,
@@ -46,8 +52,8 @@ class MetaAds(AbstractSource):
             ], params={
                 'level': 'ad',
                 'time_range': {
-                    'since':  self.config["date_from"],
-                    'until': self.config["date_to"]
+                    'since':  date_from,
+                    'until': date_to
                 },
                 'time_increment': 1
             }, is_async=True)
@@ -65,6 +71,8 @@ class MetaAds(AbstractSource):
         """
         Transforms the given insights data into a BigQuery format.
         """
+        # Insights values come as strings, they are typed by the schema converter
+        convert = row_converter(self.bq_schema())
         meta_source = []
 
         for item in insights:
@@ -74,7 +82,7 @@ class MetaAds(AbstractSource):
             conversions = [{'action_type': value['action_type'], 'value': value['value']}
                         for value in item.get('conversions', [])]
 
-            meta_source.append({
+            meta_source.append(convert({
                 'date': item.get('date_start'),
                 'account_id': item.get('account_id'),
                 'ad_id': item.get('ad_id'),
@@ -88,20 +96,32 @@ class MetaAds(AbstractSource):
                 'spend': item.get('spend', 0.0),
                 'conversions': conversions,
                 'actions': actions
-            })
+            }))
 
         return meta_source
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """"
         Fetches all data from the Meta API
         """
         self.validate_input()        
-        insights = self.fetch_data()
-        meta_report = self.transform_data(insights)
-        
-        return meta_report
+
+        def fetch_chunk(date_from, date_to):
+            insights = self.fetch_data(date_from, date_to)
+
+            # The insights cursor loads pages lazily, so rows are handed over in batches as they are read
+            batch = []
+            for item in insights:
+                batch.append(item)
+                if len(batch) >= int(self.config['batch_size']):
+                    yield self.transform_data(batch)
+                    batch = []
+            if batch:
+                yield self.transform_data(batch)
+
+        yield from self.map_date_chunks(fetch_chunk)
     
+    @cached_schema()
     def bq_schema(self):
         schema_meta_ads = [
             bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
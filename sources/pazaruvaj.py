@@ -1,23 +1,16 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
-import requests
 import csv
 import datetime
 
 class Pazaruvaj(AbstractSource):
+    required_fields = required_fields_of('pazaruvaj')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "api_key", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-        
     def authenticate(self):
         pass
     
@@ -30,14 +23,14 @@ class Pazaruvaj(AbstractSource):
             url = 'https://ppapi.arukereso.com/v1.0/Stat/GenerateExport'
             headers = {'Api-Key': api_key}
             params = {'DateFrom': date_from, 'DateTill': date_to}
-            response = requests.get(url, headers=headers, params=params, timeout=30)
+            response = self.http.get(url, headers=headers, params=params, timeout=30)
             response.raise_for_status()
             return response.json()
 
         def list_generated_csv():
             url = 'https://ppapi.arukereso.com/v1.0/Stat/ListExport'
             headers = {'Api-Key': api_key}
-            response = requests.get(url, headers=headers, timeout=30)
+            response = self.http.get(url, headers=headers, timeout=30)
             response.raise_for_status()
             data = response.json()
 
@@ -64,7 +57,7 @@ class Pazaruvaj(AbstractSource):
         def download_csv(hash_value):
             url = f'https://ppapi.arukereso.com/v1.0/Stat/Download?Hash={hash_value}'
             headers = {'Api-Key': api_key}
-            response = requests.get(url, headers=headers, timeout=30)
+            response = self.http.get(url, headers=headers, timeout=30)
             response.raise_for_status()
             return response.content.decode('utf-8')
 
@@ -76,13 +69,11 @@ class Pazaruvaj(AbstractSource):
                 return csv_content
         return None
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         self.validate_input()
         data = self.fetch_data()
         
-        transformed_data = self.transform_data(data)
-        
-        return transformed_data
+        yield self.transform_data(data)
     
     def transform_data(self, data):
         def process_csv_data(csv_data):
@@ -104,6 +95,7 @@ class Pazaruvaj(AbstractSource):
 
         return process_csv_data(data)
 
+    @cached_schema()
     def bq_schema(self):
         pazaruvaj_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
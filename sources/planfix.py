@@ -1,7 +1,7 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
 from datetime import datetime
-import requests
 import json
 import re
 from bs4 import BeautifulSoup
@@ -20,28 +20,19 @@ class Planfix:
         return instance
 
 class PlanfixContactsReport(AbstractSource):
+    required_fields = required_fields_of('planfix') + ["netpeak_client"]
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "date_from", "date_to", "access_token"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-        
     def authenticate(self):
         pass
     
-    def fetch_data(self, date_from, date_to, access_token):
+    def fetch_data(self, date_from, date_to, access_token, offset=0):
         url_contact = 'https://gremi.planfix.com/rest/contact/list'
         headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + access_token}
-        offset = 0
         page_size = 100
-        all_data_contacts = []
 
         while True:
             query = {
@@ -61,12 +52,13 @@ class PlanfixContactsReport(AbstractSource):
                 "fields": "id,group,dateOfLastUpdate"
             }
 
-            response = requests.post(url_contact, data=json.dumps(query), headers=headers, timeout=45)
+            response = self.http.post(url_contact, data=json.dumps(query), headers=headers, timeout=45)
             data = response.json()
 
             if not data.get("contacts"):
                 break
             
+            page_contacts = []
             for contact in data["contacts"]:
                 formatted_lastDate = datetime.strptime(contact['dateOfLastUpdate']['date'], "%d-%m-%Y").strftime("%Y-%m-%d")
                 contact_data = {'id': contact['id'],
@@ -81,24 +73,27 @@ class PlanfixContactsReport(AbstractSource):
                         contact_data['lead_status'] = group_name
 
                 if 'lead_status' in contact_data:
-                    all_data_contacts.append(contact_data)
+                    page_contacts.append(contact_data)
+
+            self.save_cursor(offset + page_size)
+            yield page_contacts
 
             if len(data["contacts"]) < page_size:
                 break
 
             offset += page_size
 
-        return all_data_contacts
-
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         self.validate_input()
         
-        return self.fetch_data(self.config["date_from"], self.config["date_to"], self.config["access_token"])
+        yield from self.fetch_data(self.config["date_from"], self.config["date_to"], self.config["access_token"],
+                                   offset=self.resume_cursor(0))
     
     def transform_data(self):
         pass
 
+    @cached_schema()
     def bq_schema(self):
         planfix_schema = [
             bigquery.SchemaField('date', 'DATE', mode='NULLABLE'),
@@ -110,19 +105,12 @@ class PlanfixContactsReport(AbstractSource):
         return planfix_schema
 
 class PlanfixLeadsReport(AbstractSource):
+    required_fields = required_fields_of('planfix')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["date_from", "date_to", "access_token"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         pass
 
@@ -156,7 +144,7 @@ class PlanfixLeadsReport(AbstractSource):
             ],
             "fields": "id,name,description,dateTime,counterparty"
         }
-        response = requests.post(url, data=json.dumps(query), headers=headers, timeout=45)
+        response = self.http.post(url, data=json.dumps(query), headers=headers, timeout=45)
         response.raise_for_status()
         
         return response.json()
@@ -213,30 +201,28 @@ class PlanfixLeadsReport(AbstractSource):
         
         return all_formatted_data
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
-        Fetches all task data within the specified date range and transforms it.
+        Fetches all task data within the specified date range and transforms it page by page.
         """
         token = self.config['access_token']
         date_from = self.config['date_from']
         date_to = self.config['date_to']
-        offset = 0
+        offset = self.resume_cursor(0)
         page_size = 100
-        all_tasks = []
 
         while True:
             data = self.fetch_data(offset, page_size, date_from, date_to, token)
             tasks = data.get("tasks", [])
-            all_tasks.extend(tasks)
+            self.save_cursor(offset + page_size)
+            yield self.transform_data(tasks)
 
             if len(tasks) < page_size:
                 break
 
             offset += page_size
 
-        all_formatted_data = self.transform_data(all_tasks)
-        return all_formatted_data
-
+    @cached_schema()
     def bq_schema(self):
         planfix_leads_schema = [
             bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
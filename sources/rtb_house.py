@@ -1,30 +1,30 @@
 from rtbhouse_sdk.client import BasicAuth, Client as RTBClient
 from rtbhouse_sdk.schema import CountConvention, StatsGroupBy, StatsMetric
 from google.cloud import bigquery
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 import pandas as pd
-import json
+from columnar import ColumnBatch
+from resource_cache import resource_cache, rtb_house_client_usable
 
 class RTBHouse(AbstractSource):
+    # Requests go through the rtbhouse_sdk client, not self.http
+    replayable = False
+    required_fields = required_fields_of('rtb_house')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "login", "password", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         """
         Authenticates the RTBHouse API client using the provided login and password.
         """
         
-        api_client = RTBClient(auth=BasicAuth(self.config["login"], self.config["password"]))
+        # One client (and HTTP connection pool) per login, reused by the runs of a warm instance
+        api_client = resource_cache.get('rtb_house', [self.config["login"], self.config["password"]],
+                                        lambda: RTBClient(auth=BasicAuth(self.config["login"], self.config["password"])),
+                                        health_check=rtb_house_client_usable)
         return api_client
 
     def fetch_data(self, api_client, advertiser_hash, dimensions, metrics):
@@ -81,15 +81,11 @@ class RTBHouse(AbstractSource):
             'conversions_cost', 'ctr', 'cr', 'ecpa', 'ecps']
         
         df = pd.DataFrame(data_frame, columns=new_columns)
-        ress = df.to_json(orient="records", date_format = 'iso')
-        parsed = json.loads(ress)
-
-        for row in parsed:
-            row['date'] = pd.to_datetime(row['date']).strftime("%Y-%m-%d")
+        df['date'] = pd.to_datetime(df['date'])
 
-        return parsed
+        return ColumnBatch.from_frame(df, self.bq_schema())
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
         Fetches all data from the RTBHouse API for the configured advertiser, dimensions, and metrics.
         """
@@ -115,10 +111,9 @@ class RTBHouse(AbstractSource):
 
         data = self.fetch_data(api_client, advertiser, dimensions, metrics)
         if data:
-            data = self.transform_data(data, dimensions, metrics)
-
-        return data
+            yield self.transform_data(data, dimensions, metrics)
 
+    @cached_schema()
     def bq_schema(self):
         schema_rtb = [
             bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
@@ -1,35 +1,30 @@
-from abstract_source import AbstractSource
-import requests
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
+from columnar import row_converter
 import json
 from urllib.parse import urlencode, urlunparse
 
 class TikTok(AbstractSource):
+    # The reporting API accepts up to 30 days per request for daily stats
+    max_days_per_request = 30
+    parallel_chunks = True
+    required_fields = required_fields_of('tiktok')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "advertiser_id", "access_token", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
     def authenticate(self):
         """
         Authentication is not needed as access_token is provided in the config.
         """
         return self.config['access_token']
 
-    def fetch_data(self):
+    def fetch_data(self, date_from, date_to):
         """
         Fetches campaign data from the TikTok API for the specified date range.
         """
-        date_from = self.config['date_from']
-        date_to = self.config['date_to']
         metrics = [
             'campaign_name', 'campaign_id', 'adgroup_name', 'adgroup_id', 
             'ad_name', 'impressions', 'clicks', 'spend', 'reach', 
@@ -59,20 +54,18 @@ class TikTok(AbstractSource):
             "Access-Token": self.config['access_token'],
         }
         
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
         data = response.json()
 
         return data
     
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
         Fetches all campaign data within the specified date range.
         """
         self.validate_input()
-        data = self.fetch_data()        
-        transformed_data = self.transform_data(data)
         
-        return transformed_data
+        yield from self.map_date_chunks(lambda date_from, date_to: [self.transform_data(self.fetch_data(date_from, date_to))])
 
     def transform_data(self, data):
         """
@@ -82,6 +75,9 @@ class TikTok(AbstractSource):
         if data['data']['page_info']['total_number'] == 0:
             return result_list
 
+        # The metrics come as strings
+        convert = row_converter(self.bq_schema())
+
         for row in data['data']['list']:
             result_row = {
                 'date': row['dimensions']['stat_time_day'].split(' ')[0],
@@ -102,10 +98,11 @@ class TikTok(AbstractSource):
                 'video_views_p100': row['metrics']['video_views_p100'],
                 'frequency': row['metrics']['frequency']
             }
-            result_list.append(result_row)
+            result_list.append(convert(result_row))
 
         return result_list
 
+    @cached_schema()
     def bq_schema(self):
         """
         Returns the BigQuery schema for the campaign data.
@@ -1,26 +1,22 @@
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
 from google.cloud import bigquery
 import json
-import requests
 import pandas as pd
+from columnar import ColumnBatch
 import io
 import random
 import time
 
 class YandexDirect(AbstractSource):
+    max_days_per_request = 31
+    parallel_chunks = True
+    required_fields = required_fields_of('yandex_direct')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
-        """
-        Validates the configuration file.
-        """
-        required_fields = ["netpeak_client", "date_from", "date_to", "access_token", "client_login"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-        
     def authenticate(self):
         pass
     
@@ -61,7 +57,7 @@ class YandexDirect(AbstractSource):
                         "AdId",
                         "Conversions"
                     ],
-                    "ReportName": u(f"Report_{self.config['date_from']}_{self.config['date_to']}_{random.randint(0, 100000)}"),
+                    "ReportName": u(f"Report_{date_from}_{date_to}_{random.randint(0, 100000)}"),
                     "ReportType": "AD_PERFORMANCE_REPORT",
                     "DateRangeType": "CUSTOM_DATE",
                     "Format": "TSV",
@@ -71,7 +67,7 @@ class YandexDirect(AbstractSource):
                 }
         body = json.dumps(body, indent=4)
         
-        req = requests.post(endpoint, body, headers=headers)
+        req = self.http.post(endpoint, body, headers=headers)
         
         # The data is requested from Yandex Direct in 3 steps:
         # 1. Request the data
@@ -82,7 +78,7 @@ class YandexDirect(AbstractSource):
                 break
             else:
                 time.sleep(30)
-                req = requests.post(endpoint, body, headers=headers)
+                req = self.http.post(endpoint, body, headers=headers)
         
         req.encoding = 'utf-8'  # Forcing the response to be processed in UTF-8 encoding
         format(u(req.text))
@@ -91,12 +87,14 @@ class YandexDirect(AbstractSource):
         
         return result
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         self.validate_input()
-        data = self.fetch_data(self.config['date_from'], self.config['date_to'], self.config['access_token'], self.config['client_login'])
-        transformed_data = self.transform_data(data)
         
-        return transformed_data
+        def fetch_chunk(date_from, date_to):
+            data = self.fetch_data(date_from, date_to, self.config['access_token'], self.config['client_login'])
+            return [self.transform_data(data)]
+
+        yield from self.map_date_chunks(fetch_chunk)
     
     def transform_data(self, data):    
         data.drop(data.tail(1).index, inplace=True)
@@ -119,13 +117,10 @@ class YandexDirect(AbstractSource):
             'Conversions': 'conversions'
         }, inplace=True)
         
-        # Convert DataFrame to JSON
-        data = data.to_json(orient="records", date_format='iso')
-        data = json.loads(data)
-        
-        return data
+        return ColumnBatch.from_frame(data, self.bq_schema())
 
 
+    @cached_schema()
     def bq_schema(self):
         yandex_schema = [
             bigquery.SchemaField("date", "DATE", mode="NULLABLE"),
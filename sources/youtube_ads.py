@@ -1,24 +1,22 @@
-import requests
-from abstract_source import AbstractSource
+from abstract_source import AbstractSource, cached_schema
+from connector_specs import required_fields_of
+from token_cache import get_access_token
 from google.cloud import bigquery
-from pandas import date_range
 import re
 
 class YouTubeAds(AbstractSource):
+    max_days_per_request = 1
+    parallel_chunks = True
+    required_fields = required_fields_of('youtube_ads')
+
     def __init__(self, config):
         super().__init__(config)
         self.partition_by = 'date'
         
-    def validate_input(self):
+    def authenticate(self, refresh=False):
         """
-        Validates the configuration file.
+        Refreshes the access token, or takes it from the token cache while it's still valid (and not refresh).
         """
-        required_fields = ["netpeak_client", "client_id", "client_secret", "channel_id", "refresh_token", "date_from", "date_to"]
-        for field in required_fields:
-            if field not in self.config:
-                raise ValueError(f"Missing required field: {field}")
-
-    def authenticate(self):
         endpoint = 'https://oauth2.googleapis.com/token'
         headers = {'content-type': 'application/x-www-form-urlencoded'}
         data = {
@@ -27,8 +25,14 @@ class YouTubeAds(AbstractSource):
             'refresh_token': self.config["refresh_token"],
             'grant_type': 'refresh_token'
         }
-        r = requests.post(endpoint, data=data, headers=headers, timeout=45)
-        token = r.json()['access_token']
+
+        def request_token():
+            r = self.http.post(endpoint, data=data, headers=headers, timeout=45)
+            response = r.json()
+            return response['access_token'], response.get('expires_in')
+
+        token = get_access_token(endpoint, self.config["client_id"],
+                                 (self.config["client_secret"], self.config["refresh_token"]), request_token, refresh=refresh)
 
         return token
 
@@ -39,8 +43,8 @@ class YouTubeAds(AbstractSource):
         
         params = {
             'ids': f'channel==MINE',
-            'startDate': self.config["date_from"],
-            'endDate': self.config["date_to"],
+            'startDate': date,
+            'endDate': date,
             'metrics': metrics,
             'dimensions': 'video',  
             'sort': '-views', 
@@ -52,7 +56,7 @@ class YouTubeAds(AbstractSource):
         'Accept': 'application/json'
         }
         
-        response = requests.get(
+        response = self.http.get(
             'https://youtubeanalytics.googleapis.com/v2/reports',
             params=params,
             headers=headers
@@ -61,22 +65,15 @@ class YouTubeAds(AbstractSource):
         
         return response.json()
 
-    def fetch_all_data(self):
+    def fetch_batches(self):
         """
         YouTube API gives data without dates, so we fetch & transform data for each date separately.
         """
-        dates = date_range(start=self.config["date_from"],
-                           end=self.config["date_to"]).strftime("%Y-%m-%d").tolist()
-        token = self.authenticate()
         metrics = 'comments,dislikes,estimatedMinutesWatched,likes,shares,views'
         
-        # Fetch and transform data for each date
-        all_data = [self.transform_data(self.fetch_data(token, metrics, date), date, metrics) for date in dates]
-        
-        # Flatten results into a single list
-        data = [item for sublist in all_data for item in sublist]
-        
-        return data
+        # Fetch and transform data for each date (date chunks are 1 day long)
+        yield from self.map_date_chunks(
+            lambda date, _: [self.transform_data(self.with_token(lambda token: self.fetch_data(token, metrics, date)), date, metrics)])
     
     def transform_data(self, data, date, metrics):
         def camel_to_snake(name):
@@ -99,6 +96,7 @@ class YouTubeAds(AbstractSource):
 
         return result
 
+    @cached_schema()
     def bq_schema(self):
         schema_youtube_ads = [
             bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
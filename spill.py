@@ -0,0 +1,144 @@
+# Memory budget for runs that collect all rows before the load.
+# With the "memory_budget_mb" config field (or the MEMORY_BUDGET_MB environment variable) set, the batches of a
+# run are collected in a SpillBuffer instead of one list: when the process RSS goes over the budget, the collected
+# batches are written to gzip-compressed temp files and only read back, one by one, during the load. A run that would
+# have run out of memory then finishes, only slower.
+# RSS rarely drops after a spill (the allocator keeps the freed memory for the next batches), so the next spill comes
+# when RSS grows past what it was right after the last one, not on every batch while it's still over the budget.
+#
+# The temp files go to the "spill_dir" config field (or SPILL_DIR environment variable, default: the temp dir).
+# On Cloud Functions the temp dir is in memory too, so there the compression is what saves memory.
+
+import gzip
+import logging
+import os
+import pickle
+import resource
+import tempfile
+import weakref
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def current_rss_mb():
+    """
+    Returns the resident memory of the process now, or the peak where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+    except (OSError, IndexError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def memory_budget(config):
+    """
+    Returns the memory budget of a run in MB, None without one. A ValueError names a budget that isn't a positive number.
+    """
+    budget = config.get('memory_budget_mb') or os.environ.get('MEMORY_BUDGET_MB')
+    if not budget:
+        return None
+    try:
+        budget_mb = float(budget)
+    except (TypeError, ValueError):
+        budget_mb = None
+    if budget_mb is None or not budget_mb > 0:
+        raise ValueError(f"Invalid memory_budget_mb: '{budget}', expected a positive number of megabytes.")
+    return budget_mb
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class SpillBuffer:
+    """
+    Batches of a run in order, kept in memory until the process goes over the memory budget, then on disk.
+    """
+
+    def __init__(self, budget_mb, directory=None):
+        self.budget_mb = float(budget_mb)
+        self.directory = directory or os.environ.get('SPILL_DIR') or tempfile.gettempdir()
+        # In-memory batches and paths of spilled ones, in order
+        self.parts = []
+        self.rows = 0
+        self.spilled_rows = 0
+        self.files = []
+        # RSS that triggers the next spill: the budget, or the RSS after the last spill if that's still over it
+        self.spill_mb = self.budget_mb
+        # Temp files are removed when the buffer is dropped, also after a failed load
+        self.finalizer = weakref.finalize(self, remove_files, self.files)
+
+    def append(self, batch):
+        if not len(batch):
+            return
+        self.parts.append(batch)
+        self.rows += len(batch)
+        if current_rss_mb() > self.spill_mb:
+            self.spill()
+
+    def extend(self, batches):
+        for batch in batches:
+            self.append(batch)
+        return self
+
+    def spill(self):
+        """
+        Writes the batches held in memory to temp files.
+        """
+        rows = 0
+        for index, part in enumerate(self.parts):
+            if isinstance(part, str):
+                continue
+            fd, path = tempfile.mkstemp(prefix='connector_spill_', suffix='.pkl.gz', dir=self.directory)
+            self.files.append(path)
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                pickle.dump(part, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.parts[index] = path
+            rows += len(part)
+        rss_mb = current_rss_mb()
+        self.spill_mb = max(self.budget_mb, rss_mb)
+        if rows:
+            self.spilled_rows += rows
+            logger.info(f"Memory budget of {self.budget_mb:.0f} MB exceeded (RSS {rss_mb:.0f} MB after the spill): "
+                        f"{rows} rows spilled to disk, {self.spilled_rows} in total.")
+
+    def batches(self):
+        """
+        Yields the batches in order, once. Spilled batches are read back one at a time, and their files are removed.
+        """
+        for index, part in enumerate(self.parts):
+            if isinstance(part, str):
+                with gzip.open(part, 'rb') as f:
+                    batch = pickle.load(f)
+                remove_files([part])
+                self.files.remove(part)
+                # The batch is now only in the load, not in the buffer
+                self.parts[index] = None
+                yield batch
+            elif part is not None:
+                self.parts[index] = None
+                yield part
+
+    def read(self):
+        """
+        Yields the batches in order and keeps them, spilled batches are read back from their files one at a time.
+        """
+        for part in self.parts:
+            if isinstance(part, str):
+                with gzip.open(part, 'rb') as f:
+                    yield pickle.load(f)
+            elif part is not None:
+                yield part
+
+    def close(self):
+        self.finalizer()
+
+    def __len__(self):
+        return self.rows
@@ -0,0 +1,7 @@
+# Tests run from the repository root; the BigQuery stand-ins live in benchmarks/fake_client.py
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
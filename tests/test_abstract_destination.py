@@ -0,0 +1,33 @@
+# Loads of data_batches in chunks of chunk_size rows
+
+import pytest
+from google.cloud import bigquery
+from columnar import ColumnBatch, to_rows
+from destinations.abstract_destination import AbstractDestination
+
+SCHEMA = [bigquery.SchemaField('value', 'INTEGER')]
+
+class RecordingDestination(AbstractDestination):
+    """
+    Destination that keeps the chunks it's given.
+    """
+
+    def prepare(self, delete=True, loaded_partitions=None):
+        pass
+
+    def load_rows(self, rows):
+        self.chunks.append(to_rows(rows))
+
+def batch(start, stop, columnar):
+    rows = [{'value': value} for value in range(start, stop)]
+    return ColumnBatch.from_rows(rows, SCHEMA) if columnar else rows
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_batches_are_loaded_in_chunks(columnar):
+    batches = [batch(0, 7, columnar), batch(7, 7, columnar), batch(7, 30, columnar), batch(30, 32, columnar)]
+    destination = RecordingDestination('t', SCHEMA, None, '2024-01-01', '2024-01-01', None,
+                                       data_batches=iter(batches), chunk_size=5)
+    destination.chunks = []
+    destination.insert_data()
+    assert [len(chunk) for chunk in destination.chunks] == [5, 5, 5, 5, 5, 5, 2]
+    assert [row['value'] for chunk in destination.chunks for row in chunk] == list(range(32))
@@ -0,0 +1,94 @@
+# Load strategy choice and the Storage Write API path of BigQueryDestination, against the in-memory stand-ins
+
+import pytest
+from google.cloud import bigquery
+from destinations.bigquery import BigQueryDestination
+from destinations.metadata_cache import metadata_cache
+from fake_client import FakeClient, FakeWriteClient
+
+SCHEMA = [bigquery.SchemaField('date', 'DATE'), bigquery.SchemaField('value', 'INTEGER')]
+
+@pytest.fixture(autouse=True)
+def clear_metadata_cache():
+    # Stand-in clients are keyed by id(), which a new client of a later test can reuse
+    metadata_cache.clear()
+    yield
+    metadata_cache.clear()
+
+def make_rows(count, value=0):
+    return [{'date': f'2024-01-0{i % 3 + 1}', 'value': value + i} for i in range(count)]
+
+def destination(client, rows, **kwargs):
+    return BigQueryDestination('p', 'd', 't', SCHEMA, rows, 'US', '2024-01-01', '2024-01-03', 'date',
+                               client=client, write_client=FakeWriteClient(client), **kwargs)
+
+def methods(client):
+    return [method for method, _ in client.calls]
+
+@pytest.mark.parametrize('load_mode', [None, 'partition_overwrite', 'delete_append'])
+def test_small_loads_are_streamed(load_mode):
+    client = FakeClient()
+    dest = destination(client, make_rows(30), load_mode=load_mode)
+    dest.execute()
+    assert dest.strategy == 'stream'
+    assert 'batch_commit_write_streams' in methods(client)
+    assert not any(method.startswith('load_table') for method in methods(client))
+    assert len(client.rows('p.d.t')) == 30
+
+def test_default_mode_streams_without_dml():
+    client = FakeClient()
+    dest = destination(client, make_rows(30))
+    dest.execute()
+    assert dest.load_mode == 'partition_overwrite'
+    assert 'query' not in methods(client)
+
+def test_strategy_by_row_count():
+    client = FakeClient()
+    dest = destination(client, None, stream_max_rows=10, batch_min_rows=100)
+    dest.prepare()
+    assert dest.overwrite_partitions
+    assert dest.choose_strategy(make_rows(10)) == 'stream'
+    assert dest.choose_strategy(make_rows(11)) == 'parallel'
+    assert dest.choose_strategy(make_rows(100)) == 'batch'
+
+def test_unwritable_schema_is_not_streamed():
+    schema = [bigquery.SchemaField('date', 'DATE'), bigquery.SchemaField('ad group', 'STRING')]
+    dest = BigQueryDestination('p', 'd', 't', schema, None, 'US', '2024-01-01', '2024-01-03', 'date', client=FakeClient())
+    assert dest.choose_strategy([{'date': '2024-01-01', 'ad group': 'a'}]) == 'parallel'
+
+def test_stream_replaces_partitions():
+    client = FakeClient()
+    destination(client, make_rows(30)).execute()
+    dest = destination(client, make_rows(6, value=100))
+    dest.execute()
+    assert dest.strategy == 'stream'
+    assert sorted(row['value'] for row in client.rows('p.d.t')) == list(range(100, 106))
+
+def test_stream_deletes_empty_partitions():
+    client = FakeClient()
+    destination(client, make_rows(30)).execute()
+    destination(client, [{'date': '2024-01-02', 'value': 7}]).execute()
+    assert client.rows('p.d.t') == [{'date': '2024-01-02', 'value': 7}]
+
+def test_failed_commit_falls_back_to_load_jobs():
+    client = FakeClient()
+    dest = destination(client, make_rows(30))
+    dest.write_client.batch_commit_write_streams = lambda request, timeout=None: (_ for _ in ()).throw(Exception('unavailable'))
+    dest.execute()
+    assert dest.strategy == 'parallel'
+    assert any(method.startswith('load_table') for method in methods(client))
+    assert len(client.rows('p.d.t')) == 30
+
+def test_commit_error_after_commit_does_not_duplicate():
+    client = FakeClient()
+    dest = destination(client, make_rows(30))
+    commit = dest.write_client.batch_commit_write_streams
+
+    def commit_then_fail(request, timeout=None):
+        commit(request, timeout)
+        raise Exception('deadline exceeded')
+    dest.write_client.batch_commit_write_streams = commit_then_fail
+    dest.execute()
+    assert dest.strategy == 'stream'
+    assert not any(method.startswith('load_table') for method in methods(client))
+    assert len(client.rows('p.d.t')) == 30
@@ -0,0 +1,15 @@
+# Connector specs, shared by source_factory and the connector modules
+
+import subprocess
+import sys
+from conftest import REPO_DIR
+from source_factory import Source
+
+def test_connector_is_imported_without_the_factory():
+    code = "import sys, sources.esputnik; print('source_factory' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+def test_connector_classes_take_their_fields_from_the_specs():
+    for connector in ('esputnik', 'admitad', 'pazaruvaj'):
+        assert Source.connector_class(connector).required_fields == Source.required_fields(connector)
@@ -0,0 +1,54 @@
+# Rows counted by the spans of instrumented connector methods
+
+from google.cloud import bigquery
+from abstract_source import AbstractSource
+from columnar import ColumnBatch
+from instrumentation import row_count, start_trace
+
+SCHEMA = [bigquery.SchemaField('date', 'DATE'), bigquery.SchemaField('value', 'INTEGER')]
+
+class ColumnarSource(AbstractSource):
+    """
+    Connector that yields its pages as ColumnBatches, like AppsFlyer or RTBHouse.
+    """
+
+    def authenticate(self):
+        return 'token'
+
+    def fetch_data(self):
+        return {'data': [{'date': '2024-01-01', 'value': i} for i in range(5)]}
+
+    def transform_data(self, data):
+        return ColumnBatch.from_rows(data['data'], SCHEMA)
+
+    def fetch_batches(self):
+        self.authenticate()
+        for _ in range(3):
+            yield self.transform_data(self.fetch_data())
+
+    def bq_schema(self):
+        return SCHEMA
+
+def test_column_batches_are_counted():
+    with start_trace('test', enabled=True) as trace:
+        data = ColumnarSource({}).fetch_all_data()
+    spans = trace.summary()['spans']
+    assert len(data) == 15
+    assert spans['ColumnarSource.fetch_batches']['rows'] == 15
+    assert spans['ColumnarSource.transform_data']['rows'] == 15
+
+def test_non_batch_results_are_not_counted():
+    with start_trace('test', enabled=True) as trace:
+        source = ColumnarSource({})
+        source.authenticate()
+        source.fetch_data()
+    spans = trace.summary()['spans']
+    assert spans['ColumnarSource.authenticate']['rows'] == 0
+    assert spans['ColumnarSource.fetch_data']['rows'] == 0
+
+def test_row_count():
+    assert row_count([{'a': 1}, {'a': 2}]) == 2
+    assert row_count(ColumnBatch.from_rows([{'date': '2024-01-01', 'value': 1}], SCHEMA)) == 1
+    assert row_count(None) == 0
+    assert row_count('token') == 0
+    assert row_count(('rows', 'cursor')) == 0
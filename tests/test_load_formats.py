@@ -0,0 +1,32 @@
+# Values converted for the Parquet and Avro load formats
+
+import numpy as np
+import pytest
+from google.cloud import bigquery
+from columnar import ColumnBatch
+from destinations.load_formats import converted_columns, to_bool, to_int
+
+@pytest.mark.parametrize('value, expected', [(7, 7), ('12', 12), ('1.0', 1), (2.0, 2), (np.int64(3), 3)])
+def test_integers(value, expected):
+    assert to_int(value) == expected
+
+@pytest.mark.parametrize('value', ['1.5', 1.5, 'many', float('nan')])
+def test_non_integers_are_errors(value):
+    with pytest.raises(ValueError):
+        to_int(value)
+
+@pytest.mark.parametrize('value, expected', [('true', True), (' FALSE ', False), ('1', True), ('0', False),
+                                             (True, True), (np.bool_(False), False), (1, True), (0, False)])
+def test_booleans(value, expected):
+    assert to_bool(value) is expected
+
+@pytest.mark.parametrize('value', ['yes', 'no', '', 2, 0.5])
+def test_non_booleans_are_errors(value):
+    with pytest.raises(ValueError):
+        to_bool(value)
+
+def test_error_names_the_field():
+    schema = [bigquery.SchemaField('active', 'BOOLEAN')]
+    batch = ColumnBatch.from_rows([{'active': 'true'}, {'active': 'yes'}], schema)
+    with pytest.raises(ValueError, match="Field 'active' has a value that is not a BOOLEAN"):
+        list(converted_columns(batch, schema))
@@ -0,0 +1,25 @@
+# Splitting of digests into Telegram messages
+
+import re
+from notifications import MAX_MESSAGE_LENGTH, message_chunks
+
+def well_formed(message):
+    # Every tag is closed in the same message, and no entity or tag is cut
+    tags = re.findall(r'</?(\w+)[^>]*>', message)
+    return ('<' not in re.sub(r'</?\w+[^>]*>', '', message)
+            and tags.count('b') % 2 == 0
+            and not re.search(r'&\w*$', message))
+
+def test_lines_are_joined_up_to_the_limit():
+    lines = [f'<b>client</b>: message {i}' for i in range(1000)]
+    chunks = message_chunks(lines)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert '\n'.join(chunks).split('\n') == lines
+
+def test_long_line_is_cut_outside_tags_and_entities():
+    line = '<b>client</b>: Failed: ' + 'a &lt; b <i>x</i> ' * 1000
+    chunks = message_chunks([line], limit=100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(well_formed(chunk) for chunk in chunks)
+    assert ''.join(chunks).startswith('client: Failed: a &lt; b x a &lt; b')
@@ -0,0 +1,55 @@
+# Pre-load validation of rows against the schema
+
+import numpy as np
+from google.cloud import bigquery
+from columnar import ColumnBatch
+from schema_validation import validate_rows
+
+SCHEMA = [
+    bigquery.SchemaField('date', 'DATE', mode='REQUIRED'),
+    bigquery.SchemaField('name', 'STRING'),
+    bigquery.SchemaField('clicks', 'INTEGER'),
+    bigquery.SchemaField('cost', 'FLOAT'),
+    bigquery.SchemaField('event_time', 'TIMESTAMP'),
+]
+
+def rows(count):
+    return [{'date': '2024-01-01', 'name': f'campaign {i % 7}', 'clicks': i, 'cost': i / 4,
+             'event_time': '2024-01-01 10:00:00'} for i in range(count)]
+
+def test_valid_rows_have_no_problems():
+    data = rows(1000)
+    assert validate_rows(data, SCHEMA) == []
+    assert validate_rows(ColumnBatch.from_rows(data, SCHEMA), SCHEMA) == []
+
+def test_problems_point_to_the_rows():
+    data = rows(10)
+    data[3]['clicks'] = 'many'
+    data[5]['name'] = {'nested': True}
+    del data[7]['date']
+    problems = {item.column: item for item in validate_rows(data, SCHEMA)}
+    assert set(problems) == {'date', 'name', 'clicks'}
+    assert problems['clicks'].rows == [3] and problems['clicks'].values == ['many']
+    assert problems['name'].rows == [5]
+    assert problems['date'].rows == [7]
+
+def test_timestamps_can_be_numpy_numbers():
+    data = rows(4)
+    data[0]['event_time'] = np.int64(1704103200)
+    data[1]['event_time'] = np.float64(1704103200.5)
+    data[2]['event_time'] = 1704103200
+    assert validate_rows(data, SCHEMA) == []
+    data[3]['event_time'] = True
+    problems = validate_rows(data, SCHEMA)
+    assert [(item.column, item.rows) for item in problems] == [('event_time', [3])]
+
+def test_sample_is_spread_over_the_batch():
+    data = rows(100000)
+    for row in data:
+        row['cost'] = 'n/a'
+    problems = validate_rows(data, SCHEMA, sample_rows=100)
+    assert len(problems) == 1
+    assert problems[0].count == 100
+    # Rows of the batch, not of the sample
+    assert problems[0].rows == [0, 1010, 2020]
+    assert validate_rows(data[:50], SCHEMA, sample_rows=100)[0].count == 50
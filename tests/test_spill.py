@@ -0,0 +1,29 @@
+# Spilling of the batches of a run over the memory budget
+
+import pytest
+import spill
+from spill import SpillBuffer, memory_budget
+
+def test_spills_again_only_when_memory_grows(monkeypatch, tmp_path):
+    # RSS stays over the budget after the first spill, as it does when the allocator keeps the freed memory
+    rss = iter([50, 120, 130, 130, 130, 130, 130, 160, 160])
+    monkeypatch.setattr(spill, 'current_rss_mb', lambda: next(rss))
+    buffer = SpillBuffer(100, str(tmp_path))
+    for value in range(6):
+        buffer.append([{'value': value}])
+    assert buffer.spilled_rows == 2
+    assert buffer.spill_mb == 130
+    buffer.append([{'value': 6}])
+    assert buffer.spilled_rows == 7
+    assert [row['value'] for batch in buffer.batches() for row in batch] == list(range(7))
+    assert not list(tmp_path.iterdir())
+
+@pytest.mark.parametrize('budget', ['lots', '-5', '0'])
+def test_invalid_budget_is_named(budget):
+    with pytest.raises(ValueError, match='memory_budget_mb'):
+        memory_budget({'memory_budget_mb': budget})
+
+def test_budget_is_optional(monkeypatch):
+    monkeypatch.delenv('MEMORY_BUDGET_MB', raising=False)
+    assert memory_budget({}) is None
+    assert memory_budget({'memory_budget_mb': '512'}) == 512
@@ -0,0 +1,72 @@
+# Access tokens rejected by the API are dropped and requested again; a misconfigured file layer doesn't break imports
+
+import pytest
+import requests
+from abstract_source import AbstractSource
+import token_cache
+from token_cache import KEY_LOCK_BUCKETS, TokenCache, default_token_cache, get_access_token
+
+class OAuthSource(AbstractSource):
+    """
+    Connector whose API rejects the first token it sees, like an API after the token was revoked.
+    """
+
+    def __init__(self, config, rejected_status=401):
+        super().__init__(config)
+        self.rejected_status = rejected_status
+        self.issued = 0
+        self.seen = []
+
+    def authenticate(self, refresh=False):
+        def request_token():
+            self.issued += 1
+            return f'token-{self.issued}', 3600
+        return get_access_token('https://oauth.example/token', 'client', ('secret',), request_token, refresh=refresh)
+
+    def fetch_data(self, token):
+        self.seen.append(token)
+        if token == 'token-1':
+            response = requests.Response()
+            response.status_code = self.rejected_status
+            raise requests.HTTPError(f'{self.rejected_status} rejected', response=response)
+        return [{'token': token}]
+
+    def transform_data(self, data):
+        return data
+
+    def fetch_batches(self):
+        yield self.with_token(self.fetch_data)
+
+    def bq_schema(self):
+        return []
+
+@pytest.fixture(autouse=True)
+def memory_token_cache(monkeypatch):
+    monkeypatch.setattr(token_cache, 'token_cache', TokenCache())
+
+def test_rejected_token_is_refreshed_once():
+    source = OAuthSource({})
+    assert source.fetch_all_data() == [{'token': 'token-2'}]
+    assert source.seen == ['token-1', 'token-2']
+    # The new token replaced the rejected one in the cache
+    assert source.authenticate() == 'token-2'
+    assert source.issued == 2
+
+def test_other_errors_are_not_retried():
+    source = OAuthSource({}, rejected_status=500)
+    with pytest.raises(requests.HTTPError):
+        source.fetch_all_data()
+    assert source.issued == 1
+
+def test_file_layer_without_key_falls_back_to_memory(monkeypatch, tmp_path):
+    monkeypatch.setenv('TOKEN_CACHE_FILE', str(tmp_path / 'tokens'))
+    monkeypatch.delenv('TOKEN_CACHE_KEY', raising=False)
+    cache = default_token_cache()
+    assert cache.file_path is None
+    assert cache.get_token('endpoint', 'client', ('secret',), lambda: ('token', 3600)) == 'token'
+
+def test_key_locks_are_bounded():
+    cache = TokenCache()
+    for index in range(KEY_LOCK_BUCKETS * 4):
+        cache.get_token('endpoint', f'client-{index}', ('secret',), lambda: ('token', 3600))
+    assert len(cache.key_locks) == KEY_LOCK_BUCKETS
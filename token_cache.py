@@ -0,0 +1,166 @@
+# Access-token cache for OAuth connectors.
+# Tokens are cached per (token endpoint, client id, credential hash) until shortly before they expire:
+# in process memory for warm instances and, optionally, in an encrypted file shared between invocations.
+# Concurrent callers for the same key wait for one in-flight refresh instead of requesting their own token.
+# A token the API rejects (401/403) is dropped and requested again once, see AbstractSource.with_token.
+#
+# The file layer is enabled with the TOKEN_CACHE_FILE and TOKEN_CACHE_KEY (Fernet key) environment variables;
+# without a usable key it is disabled with a warning, and tokens are only cached in memory.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import raw_archive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPIRES_IN = 3600  # seconds, when the token endpoint doesn't return expires_in
+REFRESH_MARGIN = 300  # seconds before expiry when a token is refreshed
+REPLAY_TOKEN = 'replay'  # placeholder token of replayed runs
+REJECTED_STATUS_CODES = (401, 403)  # responses to a request with an expired, revoked or otherwise rejected token
+KEY_LOCK_BUCKETS = 64
+
+class TokenCache:
+    def __init__(self, file_path=None, encryption_key=None, refresh_margin=REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self.tokens = {}
+        self.lock = threading.Lock()
+        # Striped: refreshes of keys in the same bucket wait for each other, the number of locks stays fixed
+        self.key_locks = [threading.Lock() for _ in range(KEY_LOCK_BUCKETS)]
+        self.file_lock = threading.Lock()
+        self.file_path = file_path
+        self.fernet = None
+        if file_path:
+            if not encryption_key:
+                raise ValueError("An encryption key is required for the file-backed token cache")
+            # Imported here, so cryptography is only needed when the file layer is used
+            from cryptography.fernet import Fernet
+            self.fernet = Fernet(encryption_key)
+
+    @staticmethod
+    def cache_key(endpoint, client_id, credentials):
+        credential_hash = hashlib.sha256('\0'.join(str(value) for value in credentials).encode('utf-8')).hexdigest()
+        return f'{endpoint}|{client_id}|{credential_hash}'
+
+    def get_token(self, endpoint, client_id, credentials, request_token):
+        """
+        Returns a valid access token for the credentials, calling request_token() only when there is none.
+        request_token must return a tuple (access_token, expires_in).
+        """
+        key = self.cache_key(endpoint, client_id, credentials)
+        token = self.get_valid(key)
+        if token:
+            return token
+
+        with self.key_lock(key):
+            # Another caller could have refreshed the token while we were waiting
+            token = self.get_valid(key) or self.read_file(key)
+            if token:
+                return token
+
+            access_token, expires_in = request_token()
+            expires_in = int(expires_in or DEFAULT_EXPIRES_IN)
+            # Refresh early, but never later than halfway through the token lifetime
+            expires_at = time.time() + expires_in - min(self.refresh_margin, expires_in / 2)
+            with self.lock:
+                self.tokens[key] = (access_token, expires_at)
+            self.write_file(key, access_token, expires_at)
+            logger.info(f'TokenCache: New access token from {endpoint}, valid for {expires_in} seconds.')
+
+            return access_token
+
+    def key_lock(self, key):
+        # Keys end with a hex hash, see cache_key
+        return self.key_locks[int(key[-8:], 16) % len(self.key_locks)]
+
+    def get_valid(self, key):
+        with self.lock:
+            cached = self.tokens.get(key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        return None
+
+    def invalidate(self, endpoint, client_id, credentials):
+        """
+        Drops a token, e.g. after the API rejected it.
+        """
+        key = self.cache_key(endpoint, client_id, credentials)
+        with self.lock:
+            self.tokens.pop(key, None)
+        if self.file_path:
+            with self.file_lock:
+                entries = self.load_file()
+                if entries.pop(key, None):
+                    self.save_file(entries)
+
+    def read_file(self, key):
+        if not self.file_path:
+            return None
+        entry = self.load_file().get(key)
+        if entry and entry['expires_at'] > time.time():
+            with self.lock:
+                self.tokens[key] = (entry['access_token'], entry['expires_at'])
+            return entry['access_token']
+        return None
+
+    def write_file(self, key, access_token, expires_at):
+        if not self.file_path:
+            return
+        now = time.time()
+        with self.file_lock:
+            entries = {k: v for k, v in self.load_file().items() if v['expires_at'] > now}
+            entries[key] = {'access_token': access_token, 'expires_at': expires_at}
+            self.save_file(entries)
+
+    def load_file(self):
+        try:
+            with open(self.file_path, 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            # A corrupted file or a rotated key only costs a token refresh
+            logger.warning(f'TokenCache: Failed to read token cache file: {str(e)}')
+            return {}
+
+    def save_file(self, entries):
+        tmp_path = f'{self.file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            # Readable by the owner only
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(self.fernet.encrypt(json.dumps(entries).encode('utf-8')))
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            logger.warning(f'TokenCache: Failed to write token cache file: {str(e)}')
+
+def default_token_cache():
+    try:
+        return TokenCache(file_path=os.environ.get('TOKEN_CACHE_FILE'), encryption_key=os.environ.get('TOKEN_CACHE_KEY'))
+    except Exception as e:
+        # A misconfigured file layer must not break the import of the OAuth connectors
+        logger.warning(f'TokenCache: Token cache file disabled, tokens are cached in memory only: {str(e)}')
+        return TokenCache()
+
+token_cache = default_token_cache()
+
+def get_access_token(endpoint, client_id, credentials, request_token, refresh=False):
+    """
+    Returns a cached access token or requests a new one, see TokenCache.get_token.
+    With refresh, the cached token is dropped first, e.g. after the API rejected it.
+    """
+    # A replayed run doesn't call the API, and token responses are never archived
+    if raw_archive.replaying():
+        return REPLAY_TOKEN
+    with raw_archive.paused():
+        if refresh:
+            token_cache.invalidate(endpoint, client_id, credentials)
+        return token_cache.get_token(endpoint, client_id, credentials, request_token)
+
+def token_rejected(error):
+    """
+    Returns whether an error is the HTTP error (e.g. requests.HTTPError) of a request the API refused for its token.
+    """
+    return getattr(getattr(error, 'response', None), 'status_code', None) in REJECTED_STATUS_CODES